@@ -0,0 +1,530 @@
+import os
+import re
+import json
+import hashlib
+
+import numpy as np
+
+try:
+    import maya.cmds as cmds
+    import maya.api.OpenMaya as om
+except ImportError:
+    # Allows the module to be imported outside of Maya (fake scenes, benchmarks)
+    cmds = None
+    om = None
+
+#----------------------------------------------------------------
+
+""" Make sense of the currentUnit query command """
+def demystify(fpsQuery):
+    lookup = {
+        "game": 15,
+        "film": 24,
+        "pal": 25,
+        "ntsc": 30,
+        "show": 48,
+        "palf": 50,
+        "ntscf": 60
+    }
+    if fpsQuery in lookup:
+        return lookup[fpsQuery]
+    else:
+        return float(fpsQuery.replace("fps", ""))
+
+""" Scene backends """
+""" Everything the sampler needs from a scene goes through one of these """
+
+class SceneBackend(object):
+    """
+    Interface between the exporter and a scene.
+    Point queries return (verts, 3) float64 NumPy arrays in world space.
+    """
+    def open_scene(self, scene_path):
+        raise NotImplementedError
+
+    def get_scene_path(self):
+        # File other processes can open to get the same scene
+        raise NotImplementedError
+
+    def is_scene_modified(self):
+        # True when the open scene has edits that are not in the file of get_scene_path()
+        return False
+
+    def list_meshes(self, referenced=True):
+        # referenced=False leaves out meshes that come from referenced files
+        raise NotImplementedError
+
+    def get_shape(self, mesh):
+        # Node the per frame queries go to, backends without shape nodes use the mesh itself
+        return mesh
+
+    def get_intermediate_shape(self, mesh):
+        # Undeformed shape node of a mesh, None when there is none
+        return None
+
+    def get_playback_range(self):
+        # (first frame, last frame), both included
+        raise NotImplementedError
+
+    def get_fps(self):
+        raise NotImplementedError
+
+    def set_frame(self, frame):
+        raise NotImplementedError
+
+    def get_vertex_count(self, mesh):
+        raise NotImplementedError
+
+    def get_points(self, mesh):
+        raise NotImplementedError
+
+    def get_normals(self, mesh):
+        raise NotImplementedError
+
+    def get_triangles(self, mesh):
+        # (triangles, 3) int array of vertex indices, topology is static
+        raise NotImplementedError
+
+    def get_uvs(self, mesh):
+        # (verts, 2) float64 UVs of the current UV set, one per vertex, static
+        raise NotImplementedError
+
+    def get_world_matrices(self, nodes):
+        # (nodes, 4, 4) float64 world matrices at the current frame, row vectors like Maya
+        raise NotImplementedError
+
+    def get_rest_points(self, mesh):
+        # Undeformed positions (the intermediate shape in Maya), None when there are none
+        raise NotImplementedError
+
+    def get_animation_hash(self, mesh):
+        # Changes whenever anything that drives the mesh over time changes
+        raise NotImplementedError
+
+
+""" Reads the scene through maya.cmds """
+class MayaBackend(SceneBackend):
+    def __init__(self):
+        if cmds is None:
+            raise RuntimeError("maya.cmds is not available, run inside Maya or mayapy.")
+
+    def open_scene(self, scene_path):
+        cmds.file(scene_path, open=True, force=True)
+
+    def get_scene_path(self):
+        return cmds.file(query=True, sceneName=True) or None
+
+    def is_scene_modified(self):
+        return bool(cmds.file(query=True, modified=True))
+
+    def list_meshes(self, referenced=True):
+        # Deformed shapes only, intermediate (Orig) shapes are left out whatever they are called
+        mesh_list = cmds.ls(type="mesh", noIntermediate=True, long=True) or []
+        if referenced:
+            return mesh_list
+        return [mesh for mesh in mesh_list if not cmds.referenceQuery(mesh, isNodeReferenced=True)]
+
+    def get_playback_range(self):
+        time_min = int(cmds.playbackOptions(q=True, min=True))
+        time_max = int(cmds.playbackOptions(q=True, max=True))
+        return time_min, time_max
+
+    def get_fps(self):
+        return demystify(cmds.currentUnit(query=True, time=True))
+
+    def set_frame(self, frame):
+        cmds.currentTime(frame)
+
+    def get_vertex_count(self, mesh):
+        return cmds.polyEvaluate(mesh, vertex=True)
+
+    def get_points(self, mesh):
+        # One xform call for the whole mesh instead of one pointPosition per vertex
+        points = cmds.xform(f"{mesh}.vtx[*]", q=True, ws=True, t=True)
+        return np.array(points, dtype=np.float64).reshape(-1, 3)
+
+    def get_normals(self, mesh):
+        # One call for every vertex normal of the mesh (averaged over the faces)
+        normals = get_mfn_mesh(mesh).getVertexNormals(False, om.MSpace.kWorld)
+        return np.array(normals, dtype=np.float64).reshape(-1, 3)
+
+    def get_triangles(self, mesh):
+        _, triangle_vertices = get_mfn_mesh(mesh).getTriangles()
+        return np.array(triangle_vertices, dtype=np.int64).reshape(-1, 3)
+
+    def get_uvs(self, mesh):
+        # UVs are stored per face-vertex, on a seam the last face written wins
+        mfn_mesh = get_mfn_mesh(mesh)
+        us, vs = mfn_mesh.getUVs()
+        uv_counts, uv_ids = mfn_mesh.getAssignedUVs()
+        vertex_counts, vertex_list = mfn_mesh.getVertices()
+        uvs = np.zeros((mfn_mesh.numVertices, 2), dtype=np.float64)
+        if not len(uv_ids):
+            return uvs
+
+        # Faces without UVs have a uv count of 0, skip their face-vertices
+        uv_counts = np.array(uv_counts, dtype=np.int64)
+        vertex_counts = np.array(vertex_counts, dtype=np.int64)
+        has_uvs = np.repeat(uv_counts == vertex_counts, vertex_counts)
+        vertex_list = np.array(vertex_list, dtype=np.int64)[has_uvs]
+        uv_ids = np.array(uv_ids, dtype=np.int64)
+        uvs[vertex_list, 0] = np.array(us, dtype=np.float64)[uv_ids]
+        uvs[vertex_list, 1] = np.array(vs, dtype=np.float64)[uv_ids]
+        return uvs
+
+    def get_world_matrices(self, nodes):
+        # One selection list for all nodes instead of one xform call each
+        selection = om.MSelectionList()
+        for node in nodes:
+            selection.add(node)
+        matrices = [selection.getDagPath(i).inclusiveMatrix() for i in range(len(nodes))]
+        return np.array(matrices, dtype=np.float64).reshape(-1, 4, 4)
+
+    def get_shape(self, mesh):
+        # Meshes can be given as transforms, the deformed shape is the visible one
+        shapes = cmds.listRelatives(mesh, shapes=True, noIntermediate=True, fullPath=True) or []
+        return shapes[0] if shapes else mesh
+
+    def get_intermediate_shape(self, mesh):
+        # list_meshes() returns shape nodes, their intermediate shapes are siblings under the transform
+        transform = mesh
+        if cmds.nodeType(mesh) == "mesh":
+            parents = cmds.listRelatives(mesh, parent=True, fullPath=True) or []
+            transform = parents[0] if parents else mesh
+        shapes = cmds.listRelatives(transform, shapes=True, fullPath=True) or []
+        for shape in shapes:
+            if cmds.getAttr(shape + ".intermediateObject"):
+                return shape
+        print(f"[Warning] No Intermediate shape found for {mesh}")
+        return None
+
+    def get_rest_points(self, mesh):
+        intermediate_shape = self.get_intermediate_shape(mesh)
+        if not intermediate_shape:
+            return None
+        return self.get_points(intermediate_shape)
+
+    def get_animation_hash(self, mesh):
+        # Keys and tangents of every animCurve upstream of the mesh (skin joints, controls, blendShapes)
+        digest = hashlib.sha1()
+        history = cmds.listHistory(mesh) or []
+        for curve in sorted(cmds.ls(history, type="animCurve") or []):
+            digest.update(curve.encode("utf-8"))
+            for flag in ("timeChange", "valueChange"):
+                values = cmds.keyframe(curve, query=True, **{flag: True}) or []
+                digest.update(repr(values).encode("utf-8"))
+            for flag in ("inAngle", "outAngle", "inWeight", "outWeight"):
+                values = cmds.keyTangent(curve, query=True, **{flag: True}) or []
+                digest.update(repr(values).encode("utf-8"))
+        # Node names catch rig changes such as added or removed deformers
+        for node in sorted(set(history)):
+            digest.update(node.encode("utf-8"))
+        return digest.hexdigest()
+
+
+""" Returns an MFnMesh for a mesh transform or shape """
+def get_mfn_mesh(mesh):
+    selection = om.MSelectionList()
+    selection.add(mesh)
+    dag_path = selection.getDagPath(0)
+    if dag_path.node().hasFn(om.MFn.kTransform):
+        dag_path.extendToShape()
+    return om.MFnMesh(dag_path)
+
+
+""" Procedural scene for running the exporter without Maya """
+class SyntheticBackend(SceneBackend):
+    """
+    A flat grid per mesh that ripples over time.
+    Only uses NumPy, so it works for benchmarks on headless machines.
+    lag > 0 acts like a simulation: the points only move part of the way to
+    the ripple every frame, so they depend on the frames evaluated before.
+    Jumping to a frame that does not follow the last one starts cold.
+    rigid: the grids do not ripple, every mesh spins around +Y and drifts
+    along +X instead, the same motion get_world_matrices() returns.
+    """
+    def __init__(self, vertex_counts, fps=24, playback_range=(0, 23), lag=0.0, rigid=False):
+        # vertex_counts: {mesh name: number of vertices}
+        self.vertex_counts = dict(vertex_counts)
+        self.fps = fps
+        self.playback_range = tuple(playback_range)
+        self.lag = lag
+        self.rigid = rigid
+        self.scene_path = None
+        self.frame = 0
+        self.sim_state = {}
+        self.rest_points = {}
+        self.triangles = {}
+        for mesh, count in self.vertex_counts.items():
+            side = max(int(np.ceil(np.sqrt(count))), 1)
+            idx = np.arange(count)
+            rest = np.zeros((count, 3), dtype=np.float64)
+            rest[:, 0] = idx % side
+            rest[:, 2] = idx // side
+            self.rest_points[mesh] = rest
+            self.triangles[mesh] = make_grid_triangles(count, side)
+
+    def open_scene(self, scene_path):
+        # Every "scene" holds the same procedural meshes
+        self.scene_path = scene_path
+        self.frame = 0
+        self.sim_state = {}
+
+    def get_scene_path(self):
+        return self.scene_path
+
+    def list_meshes(self, referenced=True):
+        return list(self.vertex_counts)
+
+    def get_playback_range(self):
+        return self.playback_range
+
+    def get_fps(self):
+        return self.fps
+
+    def set_frame(self, frame):
+        self.frame = frame
+
+    def get_vertex_count(self, mesh):
+        return self.vertex_counts[mesh]
+
+    def get_points(self, mesh):
+        rest = self.rest_points[mesh]
+        phase = self.frame / float(self.fps)
+        if self.rigid:
+            matrix = self.get_world_matrices([mesh])[0]
+            points = np.matmul(rest, matrix[:3, :3]) + matrix[3, :3]
+        else:
+            points = rest.copy()
+            points[:, 1] = np.sin(rest[:, 0] * 0.5 + phase) * np.cos(rest[:, 2] * 0.5 + phase)
+        if not self.lag:
+            return points
+
+        last = self.sim_state.get(mesh)
+        if last is not None and last[0] == self.frame:
+            return last[1].copy()
+        if last is not None and last[0] == self.frame - 1:
+            points = self.lag * last[1] + (1.0 - self.lag) * points
+        self.sim_state[mesh] = (self.frame, points)
+        return points.copy()
+
+    def get_normals(self, mesh):
+        rest = self.rest_points[mesh]
+        if self.rigid:
+            # The flat grid faces +Y, a spin around +Y keeps it that way
+            normals = np.zeros_like(rest)
+            normals[:, 1] = 1.0
+            return np.matmul(normals, self.get_world_matrices([mesh])[0, :3, :3])
+
+        # Normal of the height field y = sin(a) * cos(b)
+        phase = self.frame / float(self.fps)
+        a = rest[:, 0] * 0.5 + phase
+        b = rest[:, 2] * 0.5 + phase
+        normals = np.empty_like(rest)
+        normals[:, 0] = -0.5 * np.cos(a) * np.cos(b)
+        normals[:, 1] = 1.0
+        normals[:, 2] = 0.5 * np.sin(a) * np.sin(b)
+        normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+        return normals
+
+    def get_triangles(self, mesh):
+        return self.triangles[mesh]
+
+    def get_world_matrices(self, nodes):
+        # Identity while the grids ripple, the points are deformed in object space then
+        matrices = np.tile(np.eye(4), (len(nodes), 1, 1))
+        if not self.rigid:
+            return matrices
+        phase = self.frame / float(self.fps)
+        meshes = list(self.vertex_counts)
+        for matrix, node in zip(matrices, nodes):
+            # Every mesh spins at its own speed, row vectors like Maya
+            index = meshes.index(node)
+            angle = phase * (index + 1)
+            matrix[0, 0] = matrix[2, 2] = np.cos(angle)
+            matrix[0, 2] = -np.sin(angle)
+            matrix[2, 0] = np.sin(angle)
+            matrix[3, :3] = [phase * 2.0, 0.0, index * 10.0]
+        return matrices
+
+    def get_uvs(self, mesh):
+        # The grid spread over the 0-1 square, u along x and v along z
+        rest = self.rest_points[mesh]
+        size = max(float(rest[:, [0, 2]].max()), 1.0)
+        return rest[:, [0, 2]] / size
+
+    def get_rest_points(self, mesh):
+        return self.rest_points[mesh].copy()
+
+    def get_animation_hash(self, mesh):
+        return f"{mesh}:{self.vertex_counts[mesh]}:{self.fps}"
+
+
+""" Reads baked point caches, bakes VATs without Maya """
+class PointCacheBackend(SceneBackend):
+    """
+    scene_path is either
+        <name>.npz: one archive, "<mesh>.points" (frames, verts, 3) per mesh and
+                    optional "<mesh>.normals" (frames, verts, 3), "<mesh>.triangles",
+                    "<mesh>.rest", "<mesh>.uvs", plus "fps" and "frame_start" scalars.
+        <folder>  : "<mesh>/points.<frame>.npy" per frame, optional
+                    "<mesh>/normals.<frame>.npy", "<mesh>/triangles.npy",
+                    "<mesh>/rest.npy", "<mesh>/uvs.npy" and "cache.json" with "fps".
+    Points are expected in world space. Like Alembic, frames before the first
+    or after the last sample hold that sample.
+    """
+    def __init__(self, scene_path=None, fps=24):
+        self.default_fps = fps
+        self.scene_path = None
+        self.frame = 0
+        if scene_path is not None:
+            self.open_scene(scene_path)
+
+    def get_scene_path(self):
+        return self.scene_path
+
+    def open_scene(self, scene_path):
+        self.scene_path = scene_path
+        self.fps = self.default_fps
+        self.frame_start = 0
+        self.frame_count = 0
+        # (mesh, name) -> per frame samples (array rows or .npy paths) or a single array
+        self.samples = {}
+        self.static = {}
+        if os.path.isdir(scene_path):
+            self._open_folder(scene_path)
+        else:
+            self._open_archive(scene_path)
+        if not self.list_meshes():
+            raise ValueError(f"No point cache found in {scene_path}")
+        self.frame = self.frame_start
+
+    def _open_archive(self, scene_path):
+        with np.load(scene_path) as data:
+            for key in data.files:
+                if key == "fps":
+                    self.fps = float(data[key])
+                elif key == "frame_start":
+                    self.frame_start = int(data[key])
+                elif "." in key:
+                    mesh, name = key.rsplit(".", 1)
+                    if name in ("points", "normals"):
+                        self.samples[(mesh, name)] = data[key]
+                    else:
+                        self.static[(mesh, name)] = data[key]
+        self.frame_count = min(len(s) for s in self.samples.values()) if self.samples else 0
+
+    def _open_folder(self, scene_path):
+        settings_path = os.path.join(scene_path, "cache.json")
+        if os.path.exists(settings_path):
+            with open(settings_path) as f:
+                self.fps = json.load(f).get("fps", self.fps)
+
+        frame_pattern = re.compile(r"^(points|normals)\.(-?\d+)\.npy$")
+        frame_sets = []
+        for mesh in sorted(os.listdir(scene_path)):
+            mesh_dir = os.path.join(scene_path, mesh)
+            if not os.path.isdir(mesh_dir):
+                continue
+            files = {"points": {}, "normals": {}}
+            for filename in os.listdir(mesh_dir):
+                match = frame_pattern.match(filename)
+                if match:
+                    files[match.group(1)][int(match.group(2))] = os.path.join(mesh_dir, filename)
+                elif filename in ("triangles.npy", "rest.npy", "uvs.npy"):
+                    self.static[(mesh, filename[:-4])] = np.load(os.path.join(mesh_dir, filename))
+            for name, paths in files.items():
+                if paths:
+                    frame_sets.append(sorted(paths))
+                    self.samples[(mesh, name)] = paths
+
+        if not frame_sets:
+            return
+        frames = frame_sets[0]
+        if any(f != frames for f in frame_sets) or frames != list(range(frames[0], frames[-1] + 1)):
+            raise ValueError(f"The frames of {scene_path} are not the same unbroken range for every mesh")
+        self.frame_start = frames[0]
+        # Index the files by sample, like the rows of an archive
+        for key, paths in self.samples.items():
+            self.samples[key] = [paths[f] for f in frames]
+        self.frame_count = len(frames)
+
+    def _read_sample(self, mesh, name):
+        samples = self.samples.get((mesh, name))
+        if samples is None:
+            return None
+        index = min(max(int(round(self.frame)) - self.frame_start, 0), self.frame_count - 1)
+        sample = samples[index]
+        if isinstance(sample, str):
+            sample = np.load(sample, mmap_mode="r")
+        return np.array(sample, dtype=np.float64).reshape(-1, 3)
+
+    def list_meshes(self, referenced=True):
+        return sorted(mesh for mesh, name in self.samples if name == "points")
+
+    def get_playback_range(self):
+        return self.frame_start, self.frame_start + self.frame_count - 1
+
+    def get_fps(self):
+        return self.fps
+
+    def set_frame(self, frame):
+        self.frame = frame
+
+    def get_vertex_count(self, mesh):
+        sample = self.samples[(mesh, "points")][0]
+        if isinstance(sample, str):
+            sample = np.load(sample, mmap_mode="r")
+        return int(np.prod(sample.shape) // 3)
+
+    def get_points(self, mesh):
+        return self._read_sample(mesh, "points")
+
+    def get_normals(self, mesh):
+        normals = self._read_sample(mesh, "normals")
+        if normals is None:
+            raise RuntimeError(f"The cache has no normals for {mesh}, export with normal_source=\"computed\".")
+        return normals
+
+    def get_triangles(self, mesh):
+        triangles = self.static.get((mesh, "triangles"))
+        if triangles is None:
+            raise RuntimeError(f"The cache has no triangles for {mesh}.")
+        return np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+
+    def get_uvs(self, mesh):
+        uvs = self.static.get((mesh, "uvs"))
+        if uvs is None:
+            raise RuntimeError(f"The cache has no uvs for {mesh}.")
+        return np.asarray(uvs, dtype=np.float64).reshape(-1, 2)
+
+    def get_rest_points(self, mesh):
+        rest = self.static.get((mesh, "rest"))
+        return None if rest is None else np.array(rest, dtype=np.float64).reshape(-1, 3)
+
+    def get_animation_hash(self, mesh):
+        # A cache only changes when it is written again
+        digest = hashlib.sha1()
+        samples = self.samples[(mesh, "points")]
+        paths = [self.scene_path] if not isinstance(samples[0], str) else samples
+        for path in paths:
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        return digest.hexdigest()
+
+
+""" Triangulates a row-major grid of vertices, skipping the incomplete last row """
+def make_grid_triangles(count, side):
+    rows = count // side
+    if side < 2 or rows < 2:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    col, row = np.meshgrid(np.arange(side - 1), np.arange(rows - 1))
+    v0 = (row * side + col).ravel()
+    v1 = v0 + 1
+    v2 = v0 + side
+    v3 = v2 + 1
+    # Wound so that the face normals point up (+Y)
+    first = np.stack([v0, v2, v1], axis=1)
+    second = np.stack([v1, v2, v3], axis=1)
+    return np.concatenate([first, second]).astype(np.int64)
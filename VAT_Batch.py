@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from . import VAT_Exporter as vat
+from .VAT_Backend import MayaBackend, SyntheticBackend, PointCacheBackend
+from .VAT_Cache import SampleCache
+from .VAT_Mesh import MeshContext
+
+#----------------------------------------------------------------
+
+""" Batch export """
+""" One VAT per mesh, for the open scene or for a list of scene files """
+
+""" Makes a file name out of a long mesh name, |grp|body:bodyShape -> body_bodyShape """
+def get_mesh_filename(mesh):
+    return mesh.split("|")[-1].replace(":", "_")
+
+""" Samples every mesh into a cache in one pass over the timeline, returns False when that failed """
+def cache_all_meshes(mesh_list, backend, cache, frame_range=None, normal_source="mesh",
+                     rest_source="bind_frame", rest_frame=None, **options):
+    try:
+        context = MeshContext(mesh_list, backend, rest_source, rest_frame)
+        time_min, time_max = frame_range or backend.get_playback_range()
+        frames = list(range(time_min, time_max + 1))
+        # The exports read their rest frame through the cache as well
+        if context.rest_frame is not None and context.rest_frame not in frames:
+            frames.insert(0, context.rest_frame)
+        for _ in vat.iter_cache_frames(context, frames, cache, normal_source):
+            pass
+    except Exception as e:
+        # A broken mesh is reported by its own export below
+        print(f"[Warning] Could not sample all meshes at once, exporting them one by one: {e}")
+        return False
+    return True
+
+""" Exports one VAT per mesh of the scene, returns a report entry per mesh """
+def export_all_meshes(output_dir, backend=None, mesh_list=None, **options):
+    """
+    Every mesh is sampled in the same pass over the timeline first, the
+    exports then read their frames from a sample cache, the one in options
+    or a temporary one that holds all frames of all meshes on disk until
+    the batch is done. Parallel sampling exports every mesh on its own.
+    """
+    if backend is None:
+        backend = MayaBackend()
+    if mesh_list is None:
+        mesh_list = backend.list_meshes()
+
+    temp_dir = None
+    if len(mesh_list) > 1 and options.get("parallel") is None:
+        if options.get("cache") is None:
+            temp_dir = tempfile.mkdtemp(prefix="vat_batch_")
+            options["cache"] = SampleCache(temp_dir, max_bytes=float("inf"))
+        print(f"Sampling {len(mesh_list)} meshes...")
+        cache_all_meshes(mesh_list, backend, **options)
+
+    results = []
+    try:
+        for mesh in mesh_list:
+            start_time = time.time()
+            result = {"mesh": mesh}
+            try:
+                result["files"] = vat.make_dat_texture(output_dir=output_dir,
+                                                       base_filename=get_mesh_filename(mesh),
+                                                       mesh_list=[mesh], backend=backend, **options)
+                result["status"] = "ok"
+            except Exception as e:
+                # One broken mesh should not stop the rest of the batch
+                result["status"] = "failed"
+                result["error"] = str(e)
+            result["elapsed"] = time.time() - start_time
+            results.append(result)
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return results
+
+""" Worker job: opens a scene and exports all of its meshes """
+def run_scene_job(scene_path, output_dir, backend=None, **options):
+    if backend is None:
+        backend = MayaBackend()
+
+    backend.open_scene(scene_path)
+    return export_all_meshes(output_dir, backend=backend, **options)
+
+#----------------------------------------------------------------
+""" Scheduler """
+#----------------------------------------------------------------
+
+""" Output folder of a scene inside the batch output folder """
+def get_scene_output_dir(output_dir, scene_path):
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(scene_path))[0])
+
+""" Command line that runs run_scene_job for one scene in a separate process """
+def build_worker_command(scene_path, output_dir, report_path, executable="mayapy", backend_name="maya",
+                         encoding="float32", normal_source="mesh"):
+    return [
+        executable, "-m", __package__ + ".VAT_Batch",
+        "--scene", scene_path,
+        "--output", output_dir,
+        "--report", report_path,
+        "--backend", backend_name,
+        "--encoding", encoding,
+        "--normal-source", normal_source,
+    ]
+
+""" Environment of a worker process, the package has to be importable from it """
+def get_worker_env():
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, env.get("PYTHONPATH")]))
+    return env
+
+def _run_worker(scene_path, output_dir, executable, backend_name, timeout, options):
+    scene_output_dir = get_scene_output_dir(output_dir, scene_path)
+    if not os.path.exists(scene_output_dir):
+        os.makedirs(scene_output_dir)
+    report_path = os.path.join(scene_output_dir, "vat_report.json")
+
+    command = build_worker_command(scene_path, scene_output_dir, report_path, executable, backend_name, **options)
+
+    start_time = time.time()
+    job = {"scene": scene_path, "output_dir": scene_output_dir}
+    try:
+        completed = subprocess.run(command, env=get_worker_env(), timeout=timeout, capture_output=True, text=True)
+        job["returncode"] = completed.returncode
+        job["status"] = "ok" if completed.returncode == 0 else "failed"
+        if completed.returncode != 0:
+            lines = completed.stderr.strip().splitlines()
+            job["error"] = lines[-1] if lines else f"Worker exited with code {completed.returncode}"
+    except subprocess.TimeoutExpired:
+        job["status"] = "timeout"
+        job["error"] = f"No result after {timeout} seconds"
+    job["elapsed"] = time.time() - start_time
+
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            job["meshes"] = json.load(f)
+        # A worker that exits cleanly can still have failed meshes
+        if job["status"] == "ok" and any(m["status"] != "ok" for m in job["meshes"]):
+            job["status"] = "failed"
+    return job
+
+""" Exports every scene file in its own headless worker, returns a summary report """
+def batch_export_scenes(scene_files, output_dir, workers=4, timeout=None, executable="mayapy",
+                        backend_name="maya", report_path=None, **options):
+    """
+    workers: number of scenes exported at the same time.
+    timeout: seconds a single scene may take before its worker is killed.
+    options: encoding / normal_source passed on to the workers.
+    """
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(_run_worker, scene, output_dir, executable, backend_name, timeout, options)
+                   for scene in scene_files]
+        jobs = [future.result() for future in futures]
+
+    report = {
+        "jobs": jobs,
+        "succeeded": sum(1 for job in jobs if job["status"] == "ok"),
+        "failed": sum(1 for job in jobs if job["status"] == "failed"),
+        "timed_out": sum(1 for job in jobs if job["status"] == "timeout"),
+        "elapsed": time.time() - start_time,
+    }
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=4)
+
+    print(f"[Batch] {report['succeeded']} ok, {report['failed']} failed, "
+          f"{report['timed_out']} timed out in {report['elapsed']:.1f} seconds")
+    return report
+
+#----------------------------------------------------------------
+""" Worker entry point """
+#----------------------------------------------------------------
+
+BACKEND_NAMES = ("maya", "synthetic", "cache")
+
+""" Returns the backend a worker process should use """
+def make_backend(backend_name, **backend_options):
+    if backend_name == "synthetic":
+        # backend_options: SyntheticBackend arguments, so workers can rebuild the same fake scene
+        backend_options.setdefault("vertex_counts", {"synthetic": 64})
+        return SyntheticBackend(**backend_options)
+    if backend_name == "cache":
+        # The "scene" is a point cache, see VAT_Backend.PointCacheBackend
+        return PointCacheBackend()
+
+    import maya.standalone
+    maya.standalone.initialize()
+    return MayaBackend()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exports one VAT per mesh of a scene.")
+    parser.add_argument("--scene", required=True)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--report")
+    parser.add_argument("--backend", default="maya", choices=BACKEND_NAMES)
+    parser.add_argument("--encoding", default="float32", choices=vat.ENCODINGS)
+    parser.add_argument("--normal-source", default="mesh", choices=("mesh", "computed"))
+    args = parser.parse_args(argv)
+
+    backend = make_backend(args.backend)
+    results = run_scene_job(args.scene, args.output, backend=backend,
+                            encoding=args.encoding, normal_source=args.normal_source)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=4)
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+
+import numpy as np
+
+from . import VAT_Exporter as vat
+from . import VAT_Stream as stream
+from .VAT_Backend import SyntheticBackend
+from .VAT_Compression import decimate_frames
+from .VAT_Parallel import ParallelSampling, split_frame_range
+from .VAT_Profile import ExportProfile, get_peak_rss
+
+#----------------------------------------------------------------
+
+""" Benchmarks that run on a synthetic scene, no Maya needed """
+""" python -m Maya_VAT_Exporter.VAT_Benchmark {memory,decimation,parallel,suite} [--vertices N] [--frames N] """
+
+MESH_NAME = "synthetic"
+
+""" The list based buffer building and EXR writing the exporter used before """
+def export_with_lists(backend, nr_of_frames, save_path):
+    import OpenEXR
+    import Imath
+
+    nr_of_vtx = backend.get_vertex_count(MESH_NAME)
+    backend.set_frame(0)
+    base = backend.get_points(MESH_NAME).tolist()
+
+    output_list = []
+    for frame in range(nr_of_frames):
+        backend.set_frame(frame)
+        for j, pos in enumerate(backend.get_points(MESH_NAME).tolist()):
+            offset = [pos[k] - base[j][k] for k in range(3)]
+            output_list.extend(offset + [1.0])
+
+    array = np.array(output_list, dtype=np.float32).reshape((nr_of_frames, nr_of_vtx, 4))
+    header = OpenEXR.Header(nr_of_vtx, nr_of_frames)
+    FLOAT = Imath.PixelType(Imath.PixelType.FLOAT)
+    header['channels'] = {name: Imath.Channel(FLOAT) for name in "RGBA"}
+    planes = {name: array[:, :, c].astype(np.float32).tobytes() for c, name in enumerate("RGBA")}
+    out = OpenEXR.OutputFile(save_path, header)
+    out.writePixels(planes)
+    out.close()
+
+""" The preallocated float32 buffer path used by make_dat_texture """
+def export_with_buffers(backend, nr_of_frames, save_path):
+    nr_of_vtx = backend.get_vertex_count(MESH_NAME)
+    base = vat.get_vertex_positions_at_frame([MESH_NAME], 0, backend=backend)
+
+    position_texture, position_buffer = vat.make_float32_buffer(nr_of_frames, nr_of_vtx)
+    vat.sample_frames([MESH_NAME], range(nr_of_frames), backend=backend,
+                      base_positions=base, position_out=position_buffer[:, :, :3],
+                      normal_out=np.empty((nr_of_frames, nr_of_vtx, 3), dtype=np.float32))
+    vat.save_exr(position_texture, save_path)
+
+""" The streaming writer, a block of frames at a time """
+def export_with_stream(backend, nr_of_frames, save_path):
+    backend.playback_range = (0, nr_of_frames - 1)
+    stream.stream_dat_texture(os.path.dirname(save_path), os.path.basename(save_path)[:-4],
+                              mesh_list=[MESH_NAME], backend=backend)
+
+MEMORY_CASES = {
+    "lists": export_with_lists,
+    "buffers": export_with_buffers,
+    "stream": export_with_stream,
+}
+
+def _run_memory_case(name, nr_of_vtx, nr_of_frames, queue):
+    backend = SyntheticBackend({MESH_NAME: nr_of_vtx})
+    export = MEMORY_CASES[name]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        export(backend, nr_of_frames, os.path.join(temp_dir, name + ".exr"))
+    queue.put(get_peak_rss())
+
+""" Compares peak RSS of the list, buffer and streaming paths, each in a fresh process """
+def benchmark_buffer_memory(nr_of_vtx=50000, nr_of_frames=500):
+    texture_bytes = nr_of_vtx * nr_of_frames * 4 * 4
+    results = {"texture_bytes": texture_bytes}
+    context = multiprocessing.get_context("spawn")
+
+    for name in MEMORY_CASES:
+        queue = context.Queue()
+        process = context.Process(target=_run_memory_case, args=(name, nr_of_vtx, nr_of_frames, queue))
+        process.start()
+        results[name] = queue.get()
+        process.join()
+
+    return results
+
+""" Offsets of an idle loop: holds, linear moves and a short wiggle """
+def make_idle_offsets(nr_of_vtx, nr_of_frames):
+    backend = SyntheticBackend({MESH_NAME: nr_of_vtx})
+    base = vat.get_vertex_positions_at_frame([MESH_NAME], 0, backend=backend)
+
+    offsets = np.empty((nr_of_frames, nr_of_vtx, 3), dtype=np.float32)
+    quarter = max(nr_of_frames // 4, 1)
+    for frame in range(nr_of_frames):
+        phase = frame % (4 * quarter)
+        if phase < quarter:
+            source_frame = 0                         # hold
+        elif phase < 2 * quarter:
+            source_frame = 0                         # linear drift
+        else:
+            source_frame = phase - 2 * quarter       # animated
+        backend.set_frame(source_frame)
+        offsets[frame] = backend.get_points(MESH_NAME) - base
+        if quarter <= phase < 2 * quarter:
+            offsets[frame, :, 0] += (phase - quarter) * 0.01
+    return offsets
+
+""" Times frame decimation on synthetic idle animation """
+def benchmark_frame_decimation(nr_of_vtx=20000, nr_of_frames=2000, tolerance=0.001):
+    offsets = make_idle_offsets(nr_of_vtx, nr_of_frames)
+    start_time = time.time()
+    result = decimate_frames(offsets, tolerance)
+    return {
+        "seconds": time.time() - start_time,
+        "kept_frames": len(result["kept_frames"]),
+        "compression_ratio": result["compression_ratio"],
+        "max_error": result["max_error"],
+    }
+
+""" Chunked sampling in worker processes against one process, on a scene that behaves like a simulation """
+def benchmark_parallel_sampling(nr_of_vtx=20000, nr_of_frames=240, workers=4, preroll=24, lag=0.5):
+    """
+    Without pre-roll every chunk starts cold, so the frames after each chunk
+    start differ from the single process result. With enough pre-roll the
+    stitched result matches it.
+    """
+    options = {"vertex_counts": {MESH_NAME: nr_of_vtx}, "playback_range": [0, nr_of_frames - 1], "lag": lag}
+    backend = SyntheticBackend(**options)
+    backend.open_scene("synthetic")
+    frames = range(nr_of_frames)
+
+    start_time = time.time()
+    serial, _ = vat.sample_frames([MESH_NAME], frames, backend=backend)
+    results = {"serial_seconds": time.time() - start_time,
+               "chunks": split_frame_range(nr_of_frames, workers)}
+
+    for name, preroll_frames in (("no_preroll", 0), ("preroll", preroll)):
+        parallel = ParallelSampling(workers, preroll=preroll_frames, executable=sys.executable,
+                                    backend_name="synthetic", backend_options=options)
+        start_time = time.time()
+        positions, _ = parallel.sample_frames([MESH_NAME], frames, backend=backend)
+        results[name + "_seconds"] = time.time() - start_time
+        results[name + "_max_error"] = float(np.abs(positions - serial).max())
+    return results
+
+""" Default sizes of the export suite, (vertices, frames) """
+SUITE_SIZES = ((1000, 100), (20000, 240), (100000, 60))
+
+""" Profiles whole exports of synthetic meshes, one case per size """
+def benchmark_export_suite(sizes=SUITE_SIZES, encoding="float32", normal_source="mesh", trace_memory=True):
+    cases = []
+    for nr_of_vtx, nr_of_frames in sizes:
+        backend = SyntheticBackend({MESH_NAME: nr_of_vtx}, playback_range=(0, nr_of_frames - 1))
+        profile = ExportProfile(trace_memory)
+        # The exporter prints a lot, only the profile matters here
+        with tempfile.TemporaryDirectory() as temp_dir, contextlib.redirect_stdout(io.StringIO()):
+            vat.make_dat_texture(temp_dir, MESH_NAME, normal_source, encoding, mesh_list=[MESH_NAME],
+                                 backend=backend, profile=profile)
+        cases.append({"vertices": nr_of_vtx, "frames": nr_of_frames, "profile": profile.get_report()})
+    return {"encoding": encoding, "normal_source": normal_source, "cases": cases}
+
+""" Returns the stages that got slower than the baseline, or call the backend more often """
+def compare_to_baseline(results, baseline, tolerance=0.25, min_seconds=0.01):
+    """
+    tolerance: allowed slow down, 0.25 = 25 %.
+    min_seconds: stages shorter than this in the baseline only count as slower
+                 when they pass this time, timer noise is bigger than them.
+    Backend call counts are exact, any increase is a regression.
+    """
+    regressions = []
+    baseline_cases = {(case["vertices"], case["frames"]): case for case in baseline["cases"]}
+    for case in results["cases"]:
+        old_case = baseline_cases.get((case["vertices"], case["frames"]))
+        if old_case is None:
+            continue
+        old_stages = {stage["name"]: stage for stage in old_case["profile"]["stages"]}
+        for stage in case["profile"]["stages"]:
+            old = old_stages.get(stage["name"])
+            if old is None:
+                continue
+            name = f"{case['vertices']} vtx x {case['frames']} frames, {stage['name']}"
+            limit = max(old["seconds"], min_seconds) * (1.0 + tolerance)
+            if stage["seconds"] > limit:
+                regressions.append(f"{name}: {stage['seconds']:.3f} s, was {old['seconds']:.3f} s")
+            old_calls = sum(old["backend_calls"].values())
+            calls = sum(stage["backend_calls"].values())
+            if calls > old_calls:
+                regressions.append(f"{name}: {calls} backend calls, was {old_calls}")
+    return regressions
+
+""" Parses "1000x100,20000x240" into ((1000, 100), (20000, 240)) """
+def parse_sizes(text):
+    return tuple(tuple(int(n) for n in size.lower().split("x")) for size in text.split(","))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VAT exporter benchmarks on a synthetic scene.")
+    parser.add_argument("benchmark", choices=("memory", "decimation", "parallel", "suite"))
+    parser.add_argument("--vertices", type=int, default=None)
+    parser.add_argument("--frames", type=int, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.001)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--preroll", type=int, default=24)
+    parser.add_argument("--sizes", type=parse_sizes, default=None,
+                        help="suite: vertices x frames per case, e.g. 1000x100,20000x240")
+    parser.add_argument("--output", help="suite: writes the results as JSON")
+    parser.add_argument("--baseline", help="suite: results of an earlier run, regressions exit with 1")
+    parser.add_argument("--max-slowdown", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    if args.benchmark == "memory":
+        nr_of_vtx = args.vertices or 50000
+        nr_of_frames = args.frames or 500
+        results = benchmark_buffer_memory(nr_of_vtx, nr_of_frames)
+        mb = 1024.0 * 1024.0
+        print(f"--- Peak RSS, {nr_of_vtx} vtx x {nr_of_frames} frames ---")
+        print(f"Texture size : {results['texture_bytes'] / mb:.1f} MB")
+        for name in MEMORY_CASES:
+            peak = results[name]
+            print(f"{name:<13}: " + ("n/a" if peak is None else f"{peak / mb:.1f} MB"))
+    elif args.benchmark == "suite":
+        sizes = args.sizes
+        if args.vertices or args.frames:
+            sizes = ((args.vertices or 20000, args.frames or 240),)
+        results = benchmark_export_suite(sizes or SUITE_SIZES)
+        mb = 1024.0 * 1024.0
+        for case in results["cases"]:
+            report = case["profile"]
+            print(f"--- Export, {case['vertices']} vtx x {case['frames']} frames: {report['total_seconds']:.3f} seconds ---")
+            for stage in report["stages"]:
+                peak = stage["peak_traced_bytes"]
+                print(f"{stage['name']:<13}: {stage['seconds']:.3f} s, "
+                      f"{sum(stage['backend_calls'].values())} backend calls, {stage['bytes'] / mb:.1f} MB, "
+                      + ("peak n/a" if peak is None else f"peak {peak / mb:.1f} MB"))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=4)
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare_to_baseline(results, json.load(f), args.max_slowdown)
+            for regression in regressions:
+                print("[Regression]", regression)
+            if regressions:
+                return 1
+    elif args.benchmark == "parallel":
+        nr_of_vtx = args.vertices or 20000
+        nr_of_frames = args.frames or 240
+        results = benchmark_parallel_sampling(nr_of_vtx, nr_of_frames, args.workers, args.preroll)
+        print(f"--- Parallel sampling, {nr_of_vtx} vtx x {nr_of_frames} frames, {args.workers} workers ---")
+        print(f"Chunks       : {results['chunks']}")
+        print(f"One process  : {results['serial_seconds']:.2f} seconds")
+        print(f"No pre-roll  : {results['no_preroll_seconds']:.2f} seconds, max error {results['no_preroll_max_error']:.6f}")
+        print(f"Pre-roll {args.preroll:<4}: {results['preroll_seconds']:.2f} seconds, max error {results['preroll_max_error']:.6f}")
+    else:
+        nr_of_vtx = args.vertices or 20000
+        nr_of_frames = args.frames or 2000
+        results = benchmark_frame_decimation(nr_of_vtx, nr_of_frames, args.tolerance)
+        print(f"--- Frame decimation, {nr_of_vtx} vtx x {nr_of_frames} frames ---")
+        print(f"Time         : {results['seconds']:.2f} seconds")
+        print(f"Kept frames  : {results['kept_frames']}")
+        print(f"Ratio        : {results['compression_ratio']:.2f}")
+        print(f"Max error    : {results['max_error']:.6f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
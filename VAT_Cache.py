@@ -0,0 +1,108 @@
+import os
+import hashlib
+
+import numpy as np
+
+#----------------------------------------------------------------
+
+""" Sample cache """
+""" Per frame positions and normals on disk as .npy files, reused between exports.
+    Independent of maya.cmds, the backend supplies the hashes.
+"""
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+""" Returns a hash of the vertex count and triangle list of a mesh """
+def hash_topology(vtx_count, triangles):
+    digest = hashlib.sha1()
+    digest.update(str(int(vtx_count)).encode("utf-8"))
+    digest.update(np.ascontiguousarray(triangles, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+class SampleCache(object):
+    """
+    Files are named <key>_<frame>_points.npy / <key>_<frame>_normals.npy.
+    Reads are memory-mapped. When the cache grows over max_bytes the least
+    recently used files are deleted, file mtimes are used as access times.
+    """
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.total_bytes = sum(size for _, _, size in self._list_files())
+
+    """ Key of one mesh in one state of the scene, shared by all of its frames """
+    def make_key(self, mesh, topology_hash, animation_hash, normal_source="mesh"):
+        digest = hashlib.sha1()
+        for part in (mesh, topology_hash, animation_hash, normal_source):
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _get_paths(self, key, frame):
+        # repr() tells every frame apart, :g would write 1000000 and 1000001 as 1e+06
+        name = f"{key}_{float(frame)!r}"
+        return (os.path.join(self.cache_dir, name + "_points.npy"),
+                os.path.join(self.cache_dir, name + "_normals.npy"))
+
+    def _list_files(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path, stat.st_size))
+        return files
+
+    """ Returns memory-mapped (points, normals) of a frame, or None when not cached """
+    def get(self, key, frame):
+        points_path, normals_path = self._get_paths(key, frame)
+        try:
+            points = np.load(points_path, mmap_mode="r")
+            normals = np.load(normals_path, mmap_mode="r")
+            os.utime(points_path, None)
+            os.utime(normals_path, None)
+        except (OSError, ValueError):
+            # Missing, evicted or half written
+            return None
+        return points, normals
+
+    """ Stores the (verts, 3) points and normals of a frame """
+    def put(self, key, frame, points, normals):
+        for path, array in zip(self._get_paths(key, frame), (points, normals)):
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                np.save(f, np.asarray(array))
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            # Replace in one step so a reader never sees a partial file
+            os.replace(temp_path, path)
+            self.total_bytes += os.path.getsize(path) - old_size
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    """ Deletes least recently used files until the cache fits into max_bytes """
+    def evict(self):
+        files = sorted(self._list_files())
+        self.total_bytes = sum(size for _, _, size in files)
+        for _, path, size in files:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+
+    """ Deletes every cached frame """
+    def clear(self):
+        for _, path, _ in self._list_files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.total_bytes = 0
@@ -0,0 +1,137 @@
+import sys
+import json
+import time
+import argparse
+
+from .VAT_Spec import load_spec, validate_spec, get_export_options, estimate_job
+
+#----------------------------------------------------------------
+
+""" Command line """
+""" python -m Maya_VAT_Exporter job.json [--dry-run] [--report report.json]
+    The spec is loaded and checked before anything else, Maya is only
+    imported once a job needs the real backend.
+"""
+
+""" Creates the backend the first time a job needs it """
+class LazyBackend(object):
+    def __init__(self, backend_name):
+        self.backend_name = backend_name
+        self.backend = None
+
+    def get(self):
+        if self.backend is None:
+            from .VAT_Batch import make_backend
+            self.backend = make_backend(self.backend_name)
+        return self.backend
+
+""" Returns [(mesh, vertex count), ...] and the frame range of a job """
+def get_job_scene_info(job, lazy_backend):
+    counts = job.get("vertex_counts") or {}
+    meshes = job.get("meshes") or list(counts)
+    frame_range = job.get("frame_range")
+
+    # Only open the scene for what the spec does not say, no frame gets evaluated
+    if not meshes or any(mesh not in counts for mesh in meshes) or frame_range is None:
+        backend = lazy_backend.get()
+        backend.open_scene(job["scene"])
+        meshes = meshes or backend.list_meshes()
+        counts = dict(counts)
+        for mesh in meshes:
+            if mesh not in counts:
+                counts[mesh] = backend.get_vertex_count(mesh)
+        if frame_range is None:
+            frame_range = backend.get_playback_range()
+
+    return [(mesh, counts[mesh]) for mesh in meshes], tuple(frame_range)
+
+""" Exports one job, returns a report entry per written texture """
+def run_job(job, backend):
+    from . import VAT_Exporter as vat
+    from .VAT_Batch import export_all_meshes
+
+    backend.open_scene(job["scene"])
+    options = get_export_options(job)
+    if not job["atlas"]:
+        return export_all_meshes(job["output"], backend=backend, mesh_list=job.get("meshes"), **options)
+
+    start_time = time.time()
+    mesh_list = job.get("meshes") or backend.list_meshes()
+    result = {"mesh": mesh_list}
+    try:
+        result["files"] = vat.make_dat_texture(output_dir=job["output"], base_filename=job["base_filename"] or "atlas",
+                                               mesh_list=mesh_list, backend=backend, atlas=True, **options)
+        result["status"] = "ok"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+    result["elapsed"] = time.time() - start_time
+    return [result]
+
+""" Prints the dry run estimate of a job """
+def print_estimate(estimate):
+    mb = 1024.0 * 1024.0
+    print(f"--- {estimate['scene']} ({estimate['frame_count']} frames) ---")
+    for texture in estimate["textures"]:
+        if "error" in texture:
+            print(f"  {texture['name']}: {texture['error']}")
+        else:
+            print(f"  {texture['name']}: {texture['vertex_count']} vtx, "
+                  f"{texture['width']} x {texture['height']}, {texture['bytes'] / mb:.1f} MB")
+    print(f"  Texture size   : {estimate['texture_bytes'] / mb:.1f} MB")
+    print(f"  Sample buffers : {estimate['peak_sample_bytes'] / mb:.1f} MB")
+    print(f"  Evaluations    : {estimate['scene_evaluations']} frames, {estimate['backend_calls']} backend calls")
+    if estimate["seconds"] is not None:
+        print(f"  Sampling time  : {estimate['seconds']:.0f} seconds")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Maya_VAT_Exporter",
+                                     description="Exports the VATs listed in a JSON or YAML job spec.")
+    parser.add_argument("spec", help="job spec, .json or .yaml")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="validate the spec and estimate texture sizes and sampling cost, nothing is evaluated")
+    parser.add_argument("--backend", default="maya", choices=("maya", "synthetic", "cache"),
+                        help="cache: the scenes of the spec are .npz / .npy point caches, no Maya needed")
+    parser.add_argument("--report", help="writes the results or estimates as JSON")
+    parser.add_argument("--seconds-per-frame", type=float, default=None,
+                        help="measured cost of one scene evaluation, turns the dry run into a time estimate")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = validate_spec(load_spec(args.spec))
+    except (OSError, ValueError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    lazy_backend = LazyBackend(args.backend)
+    report = []
+    failed = False
+    for job in jobs:
+        # A scene that is missing or does not open fails its own job, the others still run
+        if args.dry_run:
+            try:
+                vertex_counts, frame_range = get_job_scene_info(job, lazy_backend)
+            except Exception as e:
+                print(f"--- {job['scene']} ---\n  {e}", file=sys.stderr)
+                failed = True
+                report.append({"scene": job["scene"], "error": str(e)})
+                continue
+            estimate = estimate_job(job, vertex_counts, frame_range, args.seconds_per_frame)
+            print_estimate(estimate)
+            failed = failed or any("error" in t for t in estimate["textures"])
+            report.append(estimate)
+        else:
+            start_time = time.time()
+            try:
+                results = run_job(job, lazy_backend.get())
+            except Exception as e:
+                print(f"[Failed] {job['scene']}: {e}", file=sys.stderr)
+                results = [{"mesh": job.get("meshes"), "status": "failed", "error": str(e),
+                            "elapsed": time.time() - start_time}]
+            failed = failed or any(result["status"] != "ok" for result in results)
+            report.append({"scene": job["scene"], "output": job["output"], "results": results})
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=4)
+    return 1 if failed else 0
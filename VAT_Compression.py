@@ -0,0 +1,130 @@
+import numpy as np
+
+#----------------------------------------------------------------
+
+""" Frame decimation """
+""" Drops frames that linear interpolation between their neighbours reproduces """
+
+""" Returns the largest position error of frames start..end when interpolated linearly """
+def get_interpolation_error(offsets, start, end, chunk_frames=16):
+    if end - start < 2:
+        return 0.0
+
+    first = offsets[start].astype(np.float64)
+    last = offsets[end].astype(np.float64)
+    max_error = 0.0
+    # A few frames at a time, spans grow up to the whole range
+    for chunk_start in range(start + 1, end, chunk_frames):
+        chunk_end = min(chunk_start + chunk_frames, end)
+        t = (np.arange(chunk_start, chunk_end, dtype=np.float64) - start) / (end - start)
+        t = t[:, None, None]
+        interpolated = first * (1.0 - t) + last * t
+        error = np.linalg.norm(offsets[chunk_start:chunk_end] - interpolated, axis=-1)
+        max_error = max(max_error, float(error.max()))
+    return max_error
+
+""" Returns the kept frame indices, every dropped frame stays within tolerance """
+def find_key_frames(offsets, tolerance):
+    """
+    offsets: (frames, verts, 3) sampled offsets or positions.
+    Greedy: from each kept frame, the next one is pushed as far as the
+    error allows, found by doubling the span and then bisecting it.
+    """
+    nr_of_frames = offsets.shape[0]
+    kept = [0]
+    start = 0
+
+    while start < nr_of_frames - 1:
+        last = nr_of_frames - 1
+        good = start + 1
+        span = 2
+        bad = None
+        while start + span <= last:
+            if get_interpolation_error(offsets, start, start + span) <= tolerance:
+                good = start + span
+                span *= 2
+            else:
+                bad = start + span
+                break
+        if bad is None and good < last:
+            if get_interpolation_error(offsets, start, last) <= tolerance:
+                good = last
+            else:
+                bad = last
+
+        if bad is not None:
+            while bad - good > 1:
+                middle = (good + bad) // 2
+                if get_interpolation_error(offsets, start, middle) <= tolerance:
+                    good = middle
+                else:
+                    bad = middle
+
+        kept.append(good)
+        start = good
+
+    return np.array(kept, dtype=np.int64)
+
+""" Returns for every original frame its fractional row in the decimated texture """
+def build_frame_remap(kept_frames, nr_of_frames):
+    """
+    The runtime reads row = floor(r) and row + 1 and blends by r - row,
+    so playback stays at the original fps.
+    """
+    return np.interp(np.arange(nr_of_frames), kept_frames, np.arange(len(kept_frames), dtype=np.float64))
+
+""" Finds redundant frames and returns the kept frames, remap table and stats """
+def decimate_frames(offsets, tolerance):
+    nr_of_frames = offsets.shape[0]
+    kept_frames = find_key_frames(offsets, tolerance)
+
+    max_error = 0.0
+    for start, end in zip(kept_frames[:-1], kept_frames[1:]):
+        max_error = max(max_error, get_interpolation_error(offsets, int(start), int(end)))
+
+    return {
+        "kept_frames": kept_frames,
+        "frame_remap": build_frame_remap(kept_frames, nr_of_frames),
+        "compression_ratio": nr_of_frames / float(len(kept_frames)),
+        "max_error": max_error,
+    }
+
+#----------------------------------------------------------------
+
+""" Static vertex elimination """
+""" Vertices that never leave their rest position get no texture column,
+    the runtime keeps their rest position and normal.
+"""
+
+""" Returns the largest offset length of every vertex over all frames """
+def get_max_offsets(offsets, chunk_frames=64):
+    max_offsets = np.zeros(offsets.shape[1], dtype=np.float64)
+    # A few frames at a time, so the lengths never exist for all frames at once
+    for start in range(0, offsets.shape[0], chunk_frames):
+        lengths = np.linalg.norm(offsets[start:start + chunk_frames], axis=-1)
+        np.maximum(max_offsets, lengths.max(axis=0), out=max_offsets)
+    return max_offsets
+
+""" Finds the moving vertices and returns them, the vertex to column map and stats """
+def find_moving_vertices(offsets, tolerance, triangles=None):
+    """
+    offsets: (frames, verts, 3) offsets from the rest pose.
+    triangles: when given, vertices that share a triangle with a moving vertex
+               are kept too, their normals change even if they do not move.
+    column_map: (verts,) int32 texture column of every vertex, -1 when static.
+    """
+    max_offsets = get_max_offsets(offsets)
+    moving = max_offsets > tolerance
+    if triangles is not None and len(triangles):
+        touched = moving[triangles].any(axis=1)
+        moving[triangles[touched].ravel()] = True
+
+    moving_vertices = np.flatnonzero(moving)
+    column_map = np.full(offsets.shape[1], -1, dtype=np.int32)
+    column_map[moving_vertices] = np.arange(len(moving_vertices), dtype=np.int32)
+    return {
+        "moving_vertices": moving_vertices,
+        "column_map": column_map,
+        "moving_ratio": len(moving_vertices) / float(max(offsets.shape[1], 1)),
+        "max_static_offset": float(max_offsets[~moving].max()) if not moving.all() else 0.0,
+    }
@@ -1,6 +1,24 @@
 import os
-import time
-import maya.cmds as cmds
+import json
+import concurrent.futures
+import numpy as np
+
+try:
+    import maya.cmds as cmds
+except ImportError:
+    # Lets the sampling code run against a fake scene outside of Maya
+    cmds = None
+
+from .VAT_Backend import MayaBackend, demystify
+from .VAT_Layout import build_atlas_table, compute_layout, make_texture
+from .VAT_Layout import FLOAT_ENCODINGS, INTEGER_ENCODINGS, ENCODINGS
+from .VAT_Compression import decimate_frames, find_moving_vertices
+from .VAT_Cache import hash_topology
+from .VAT_Mesh import MeshContext
+from .VAT_Tangent import FRAME_OUTPUTS, QUATERNION_PACKING, iter_tangent_frames
+from .VAT_Validate import iter_validate, print_report, save_report
+from .VAT_Job import ExportJob, tag_stage
+from .VAT_Profile import ExportProfile
 
 #----------------------------------------------------------------
 
@@ -37,16 +55,7 @@ def select_all_meshes():
 """ Returns a list of all meshes in the scene """    
 def get_list_of_all_meshes():
     #Get all non-referenced meshes in the scene.  
-    mesh_list = cmds.ls(type="mesh", long=True)
-
-    mesh_no_ref_list = []
-    for mesh in mesh_list:
-        if cmds.referenceQuery(mesh, isNodeReferenced=True):
-            continue
-        if "Orig" not in mesh:
-            mesh_no_ref_list.append(mesh)
-
-    return mesh_no_ref_list
+    return MayaBackend().list_meshes(referenced=False)
 
 """ Returns a list of all selected meshes in the scene """   
 def get_list_of_selected_meshes():
@@ -68,333 +77,688 @@ def get_list_of_all_ctrl_nurbs():
 
     return ctrl_list
     
-""" Make sense of the currentUnit query command """
-def demystify(fpsQuery):
-    lookup = {
-        "game": 15,
-        "film": 24,
-        "pal": 25,
-        "ntsc": 30,
-        "show": 48,
-        "palf": 50,
-        "ntscf": 60
-    }
-    if fpsQuery in lookup:
-        return lookup[fpsQuery]
-    else:
-        return float(fpsQuery.replace("fps", ""))
-    
-def get_vertex_positions_at_frame(mesh_list, frame):
-    cmds.currentTime(frame)
-    base_positions = []
-    for mesh in mesh_list:
-        vtx_count = cmds.polyEvaluate(mesh, vertex=True)
-        for i in range(vtx_count):
-            pos = cmds.pointPosition(f"{mesh}.vtx[{i}]", world=True)
-            base_positions.append(pos)
-    return base_positions
+def get_vertex_positions_at_frame(mesh_list, frame, backend=None):
+    if backend is None:
+        backend = MayaBackend()
+
+    backend.set_frame(frame)
+    return np.concatenate([backend.get_points(mesh) for mesh in mesh_list])
 
 def get_intermediate_shape(mesh):
-    shapes = cmds.listRelatives(mesh, shapes=True, fullPath=True) or []
-    for shape in shapes:
-        if cmds.getAttr(shape + ".intermediateObject"):
-            return shape
-    print(f"[Warning] No Intermediate shape found for {mesh}")
-    return None
+    return MayaBackend().get_intermediate_shape(mesh)
 
 """" Returns vertex positions of intermediate object """
-def get_unanimated_vertex_positions(mesh):
-    intermediate_shape = get_intermediate_shape(mesh)
-    if not intermediate_shape:
-        return []
+def get_unanimated_vertex_positions(mesh, backend=None):
+    if backend is None:
+        backend = MayaBackend()
 
-    count = cmds.polyEvaluate(intermediate_shape, vertex=True)
-    positions = []
-    # for i in range(count):
-    #     vtx = f"{intermediate_shape}.vtx[{i}]"
-    #     pos = cmds.pointPosition(vtx, world=True)
-    #     positions.append(pos)
-    positions = cmds.xform(f"{intermediate_shape}.vtx[*]", q=True, ws=True, t=True)
-    positions = [positions[i:i+3] for i in range(0, len(positions), 3)]
-    return positions
+    positions = backend.get_rest_points(mesh)
+    if positions is None:
+        return []
+    return positions.tolist()
 
 """" Returns vertex normals of intermediate object """
-def get_ununimated_vertex_normals(mesh):
-    intermediate_shape = get_intermediate_shape(mesh)
+def get_ununimated_vertex_normals(mesh, backend=None):
+    if backend is None:
+        backend = MayaBackend()
+
+    intermediate_shape = backend.get_intermediate_shape(mesh)
     if not intermediate_shape:
         return []
+    return backend.get_normals(intermediate_shape).tolist()
 
-    count = cmds.polyEvaluate(intermediate_shape, vertex=True)
-    normals = []
-    for i in range(count):
-        vtx = f"{intermediate_shape}.vtx[{i}]"
-        n = cmds.polyNormalPerVertex(vtx, query=True, xyz=True)
-        normals.append(n[:3])  # First one normal vector
+""" Returns area weighted vertex normals computed from positions and triangles """
+def compute_vertex_normals(positions, triangles):
+    """
+    positions: (..., verts, 3), any leading axes (e.g. frames) are kept.
+    triangles: (tris, 3) vertex indices into the verts axis.
+    """
+    p0 = positions[..., triangles[:, 0], :]
+    p1 = positions[..., triangles[:, 1], :]
+    p2 = positions[..., triangles[:, 2], :]
+    # The cross product length is twice the triangle area, so bigger faces weigh more
+    face_normals = np.cross(p1 - p0, p2 - p0)
+
+    normals = np.zeros(positions.shape, dtype=np.float64)
+    for corner in range(3):
+        np.add.at(normals, (Ellipsis, triangles[:, corner], slice(None)), face_normals)
+
+    length = np.linalg.norm(normals, axis=-1, keepdims=True)
+    # Vertices without faces fall back to +Z like the old per-vertex query did
+    normals = np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+    normals[..., 2] = np.where(length[..., 0] > 0, normals[..., 2], 1.0)
     return normals
 
 """ Returns min and max of relative positions """
-def get_min_max_of_relative_positions(mesh_list, time_stamps, margin=0.0):
-    vtx_orig_pos = []
+def get_min_max_of_relative_positions(mesh_list, time_stamps, margin=0.0, backend=None):
+    if backend is None:
+        backend = MayaBackend()
 
     pos_max = 0
     pos_min = 0    
     
     # Get original vtx positions from intermediate object
-    for mesh in mesh_list:
-        static_positions = get_unanimated_vertex_positions(mesh)
-        vtx_orig_pos.extend(static_positions)
+    vtx_orig_pos = np.concatenate([backend.get_rest_points(mesh) for mesh in mesh_list])
 
     #Compare the difference with the vertex positions during the animation of each frame.
     for frame in time_stamps:
-        cmds.currentTime(frame)
-        global_vtx_index = 0
-
-        for mesh in mesh_list:
-            vtx_count = cmds.polyEvaluate(mesh, vertex=True)
-            for i in range(vtx_count):
-                vtx = f"{mesh}.vtx[{i}]"
-                pos = cmds.pointPosition(vtx, world=True)
-                base = vtx_orig_pos[global_vtx_index]
-
-                offset_x = pos[0] - base[0]
-                offset_y = pos[1] - base[1]
-                offset_z = pos[2] - base[2]
-
-                pos_max = max(pos_max, offset_x, offset_y, offset_z)
-                pos_min = min(pos_min, offset_x, offset_y, offset_z)
-
-                global_vtx_index += 1    
+        offsets = get_vertex_positions_at_frame(mesh_list, frame, backend=backend) - vtx_orig_pos
+        pos_max = max(pos_max, float(offsets.max()))
+        pos_min = min(pos_min, float(offsets.min()))
     
     pos_max += margin
     pos_min -= margin
      
     return pos_min, pos_max
 
-""" Returns min and max of relative normals """
-def get_min_max_of_relative_normals(mesh_list, time_stamps, margin=0.0):
-    normal_max = [1.0, 1.0, 1.0]
-    normal_min = [-1.0, -1.0, -1.0]
-    
-    #Compare the difference with the vertex positions during the animation of each frame.
-    for frame in time_stamps:
-        cmds.currentTime(frame)
-
-        for mesh in mesh_list:
-            vtx_count = cmds.polyEvaluate(mesh, vertex=True)
-            for i in range(vtx_count):
-                vtx = f"{mesh}.vtx[{i}]"
-                normal = cmds.polyNormalPerVertex(vtx, query=True, xyz=True)
-                if normal:
-                    nx, ny, nz = normal[:3]
-                    normal_min[0] = min(normal_min[0], nx)
-                    normal_min[1] = min(normal_min[1], ny)
-                    normal_min[2] = min(normal_min[2], nz)
-                    normal_max[0] = max(normal_max[0], nx)
-                    normal_max[1] = max(normal_max[1], ny)
-                    normal_max[2] = max(normal_max[2], nz)
-
-    # 3軸それぞれに margin を加える
-    return [v - margin for v in normal_min], [v + margin for v in normal_max]
-
-
-""" Returns a list with appended and scaled vertex positions relative to first frame """
-def append_vertex_positions_float32(mesh_list, time_stamps, base_position,  scale_min, scale_max, progress_fn=None):
+""" Returns a preallocated float32 texture and its (frames, verts, 4) view with alpha set to 1.0 """
+def make_float32_buffer(nr_of_frames, nr_of_vtx, layout=None):
+    if layout is None:
+        layout = compute_layout(nr_of_vtx, nr_of_frames)
+    texture, buffer = make_texture(layout, 4, np.float32)
+    buffer[:, :, 3] = 1.0
+    return texture, buffer
+
+""" Copies the kept frames of a buffer into a new, shorter texture """
+def take_frames(buffer, kept_frames, layout):
+    texture, kept_buffer = make_float32_buffer(len(kept_frames), buffer.shape[1], layout)
+    # Row by row, so there is no temporary copy of all kept frames
+    for row, frame in enumerate(kept_frames):
+        kept_buffer[row] = buffer[frame]
+    return texture, kept_buffer
+
+""" Copies the kept vertices of a buffer into a new, narrower texture of the same dtype """
+def take_vertices(buffer, kept_vertices, layout):
+    texture, kept_buffer = make_texture(layout, buffer.shape[2], buffer.dtype)
+    for row in range(buffer.shape[0]):
+        kept_buffer[row] = buffer[row, kept_vertices]
+    return texture, kept_buffer
+
+""" Samples positions and normals of every vertex, visiting each frame only once """
+def sample_frames(mesh_list, time_stamps, backend=None, normal_source="mesh",
+                  base_positions=None, position_out=None, normal_out=None, cache=None, progress_fn=None,
+                  context=None):
+    sampler = iter_sample_frames(mesh_list, time_stamps, backend, normal_source,
+                                 base_positions, position_out, normal_out, cache, context)
+    while True:
+        try:
+            fraction = next(sampler)
+        except StopIteration as done:
+            return done.value
+        if progress_fn:
+            progress_fn(int(fraction * 100))
+
+""" Generator version of sample_frames(), yields the done fraction after every frame """
+def iter_sample_frames(mesh_list, time_stamps, backend=None, normal_source="mesh",
+                       base_positions=None, position_out=None, normal_out=None, cache=None,
+                       context=None):
     """
-    Returns a list of vertex position offsets (relative to the bind pose),
-    scaled between scale_min and scale_max, and stored as flat float32 values.
-    Output format: [X, Y, Z, 1.0,  X, Y, Z, 1.0,  ...] (per vertex per frame)
+    Scrubs the timeline a single time and captures world positions and
+    vertex normals into preallocated arrays of shape (frames, verts, 3).
+    normal_source: "mesh" reads the normals from the scene every frame,
+                   "computed" derives area weighted normals from the sampled
+                   positions and the triangles, which are read only once.
+    base_positions: when given, offsets from it are stored instead of positions.
+    position_out / normal_out: (frames, verts, 3) arrays to fill in place,
+                   e.g. the RGB of a buffer view from make_float32_buffer().
+    cache: VAT_Cache.SampleCache, frames cached for the same mesh state are
+           read from disk and the scene is only evaluated for the others.
+    context: VAT_Mesh.MeshContext of mesh_list, shapes, vertex counts and
+             triangles are then not asked from the scene again.
     """
-    output_list = []
-    # original_pos_list = []
+    if normal_source not in ("mesh", "computed"):
+        raise ValueError(f"Unknown normal source: {normal_source}")
 
-    # # Get unanimated positions from intermediate object
-    # for mesh in mesh_list:
-    #     original_pos_list.extend(get_unanimated_vertex_positions(mesh))
-    
+    if backend is None:
+        backend = MayaBackend()
+    if context is None:
+        context = MeshContext(mesh_list, backend)
+
+    nr_of_vtx = context.nr_of_vtx
     total_frames = len(time_stamps)
-    # base_idx = 0
-    
-    # Loop through each frame
-    for i, frame in enumerate(time_stamps):
-        cmds.currentTime(frame)
-        idx = 0
-
-        for mesh in mesh_list:
-            vtx_count = cmds.polyEvaluate(mesh, vertex=True)
-            for j in range(vtx_count):
-                vtx = f"{mesh}.vtx[{j}]"
-                pos = cmds.pointPosition(vtx, world=True)
-                base = base_position[idx]
-                offset = [pos[k] - base[k] for k in range(3)]
-
-                output_list.extend(offset+[1.0])
-                idx += 1
-        #base_idx += vtx_count     
-        if progress_fn:
-            percent = int((i + 1) / total_frames * 50) 
-            progress_fn(percent)
-    
-    return output_list
 
-def get_min_max_of_relative_positions_per_axis(mesh_list, time_stamps, base_position, margin=0.0):
-    vtx_orig_pos = []
-    idx = 0
+    positions = position_out
+    if positions is None:
+        positions = np.empty((total_frames, nr_of_vtx, 3), dtype=np.float64)
+    normals = normal_out
+    if normals is None:
+        normals = np.empty((total_frames, nr_of_vtx, 3), dtype=np.float64)
 
-    x_min = y_min = z_min = float("inf")
-    x_max = y_max = z_max = float("-inf")
-    
-    for mesh in mesh_list:
-        static_positions = get_unanimated_vertex_positions(mesh)
-        vtx_orig_pos.extend(static_positions)
+    cache_keys = get_cache_keys(context, cache, normal_source) if cache is not None else {}
 
-    for frame in time_stamps:
-        cmds.currentTime(frame)
-        global_idx = 0 
-        for mesh in mesh_list:
-            vtx_count = cmds.polyEvaluate(mesh, vertex=True)
-            for i in range(vtx_count):
-                vtx = f"{mesh}.vtx[{i}]"
-                pos = cmds.pointPosition(vtx, world=True)
-                base = base_position[global_idx]
-
-                offset = [pos[j] - base[j] for j in range(3)]
-                
-                x_min = min(x_min, offset[0])
-                x_max = max(x_max, offset[0])
-                y_min = min(y_min, offset[1])
-                y_max = max(y_max, offset[1])
-                z_min = min(z_min, offset[2])
-                z_max = max(z_max, offset[2])
-
-                global_idx += 1
-
-    return (
-        [x_min - margin, y_min - margin, z_min - margin],
-        [x_max + margin, y_max + margin, z_max + margin]
-    )
-
-
-""" Returns a list with appended and scaled vertex normalz """
-def append_normals_float32(mesh_list, time_stamps, scale_min, scale_max, progress_fn=None):
-    output_list = []
+    for i, frame in enumerate(time_stamps):
+        frame_is_set = False
+
+        for mesh, shape, idx, vtx_count in context.iter_meshes():
+            cached = cache.get(cache_keys[mesh], frame) if cache is not None else None
+            if cached is not None:
+                points, mesh_normals = cached
+            else:
+                # Only evaluate the scene when something is missing from the cache
+                if not frame_is_set:
+                    backend.set_frame(frame)
+                    frame_is_set = True
+                points, mesh_normals = read_mesh_frame(context, mesh, shape, normal_source)
+                if cache is not None:
+                    cache.put(cache_keys[mesh], frame, points, mesh_normals)
+
+            if base_positions is None:
+                positions[i, idx:idx + vtx_count] = points
+            else:
+                positions[i, idx:idx + vtx_count] = points - base_positions[idx:idx + vtx_count]
+            normals[i, idx:idx + vtx_count] = mesh_normals
+
+        yield (i + 1) / float(total_frames)
+
+    return positions, normals
+
+""" Returns the sample cache key of every mesh of a context """
+def get_cache_keys(context, cache, normal_source="mesh"):
+    # Topology is static, so the triangles are read only once
+    cache_keys = {}
+    for mesh, _, _, vtx_count in context.iter_meshes():
+        topology_hash = hash_topology(vtx_count, context.get_triangles(mesh))
+        cache_keys[mesh] = cache.make_key(mesh, topology_hash, context.backend.get_animation_hash(mesh),
+                                          normal_source)
+    return cache_keys
+
+""" Returns the points and normals of a mesh at the current frame """
+def read_mesh_frame(context, mesh, shape, normal_source="mesh"):
+    points = context.backend.get_points(shape)
+    if normal_source == "mesh":
+        return points, context.backend.get_normals(shape)
+    return points, compute_vertex_normals(points, context.get_triangles(mesh))
+
+""" Samples every mesh of a context into a sample cache, visiting each frame only once """
+def iter_cache_frames(context, time_stamps, cache, normal_source="mesh"):
+    """
+    Nothing is kept in memory, later exports of any of the meshes read
+    their frames back from the cache instead of scrubbing the timeline again.
+    Yields the done fraction after every frame.
+    """
+    if normal_source not in ("mesh", "computed"):
+        raise ValueError(f"Unknown normal source: {normal_source}")
 
+    cache_keys = get_cache_keys(context, cache, normal_source)
     total_frames = len(time_stamps)
-    
-    """ Go through every frame """   
-    first_frame = int(time_stamps[0])
-    last_frame = int(time_stamps[-1])+1
     for i, frame in enumerate(time_stamps):
-        cmds.currentTime(frame)
-        for mesh in mesh_list:   
-            vtx_count = cmds.polyEvaluate(mesh, vertex=True)
-            for j in range(vtx_count):
-                vtx = f"{mesh}.vtx[{j}]"
-                normal = cmds.polyNormalPerVertex(vtx, query=True, xyz=True)
-                if normal:
-                    nx, ny, nz = normal[:3]
-                else:
-                    nx, ny, nz = 0.0, 0.0, 1.0
-
-                # Dynamic scaling (different min/max per channel)
-                norm_x = remap(scale_min[0], scale_max[0], 0.0, 1.0, nx)
-                norm_y = remap(scale_min[1], scale_max[1], 0.0, 1.0, ny)
-                norm_z = remap(scale_min[2], scale_max[2], 0.0, 1.0, nz)
-
-                output_list.extend([norm_x, norm_y, norm_z, 1.0])  
-            
-            if progress_fn:
-                percent = 50 + int((i + 1) / total_frames * 50) 
-                progress_fn(percent)
-                        
-    return output_list
-
-def save_float32_exr(buffer_list, width, height, save_path):
+        missing = [(mesh, shape) for mesh, shape, _, _ in context.iter_meshes()
+                   if cache.get(cache_keys[mesh], frame) is None]
+        if missing:
+            context.backend.set_frame(frame)
+        for mesh, shape in missing:
+            points, normals = read_mesh_frame(context, mesh, shape, normal_source)
+            cache.put(cache_keys[mesh], frame, points, normals)
+        yield (i + 1) / float(total_frames)
+
+""" Returns per axis min and max of the sampled offsets with padding """
+def get_min_max_of_relative_positions_per_axis(offsets, margin=0.0):
+    offset_min = offsets.min(axis=(0, 1)).astype(np.float64) - margin
+    offset_max = offsets.max(axis=(0, 1)).astype(np.float64) + margin
+    return offset_min.tolist(), offset_max.tolist()
+
+""" Returns per axis min and max of the sampled normals """
+def get_min_max_of_relative_normals(normals, margin=0.0):
+    # The range always covers at least [-1, 1] on every axis
+    normal_min = np.minimum(normals.min(axis=(0, 1)), -1.0).astype(np.float64) - margin
+    normal_max = np.maximum(normals.max(axis=(0, 1)), 1.0).astype(np.float64) + margin
+    return normal_min.tolist(), normal_max.tolist()
+
+""" Scales sampled values per axis into 0-1 in place """
+def remap_float32(values, scale_min, scale_max):
+    """
+    values: (frames, verts, 3) view into a buffer, modified in place.
+    """
+    scale_min = np.asarray(scale_min, dtype=np.float32)
+    scale_range = np.asarray(scale_max, dtype=np.float32) - scale_min
+    # Same as remap(): a zero range maps to the lower bound
+    safe_range = np.where(scale_range == 0, 1.0, scale_range).astype(np.float32)
+
+    values -= scale_min
+    values /= safe_range
+    values[..., scale_range == 0] = 0.0
+    return values
+
+""" Converts a float32 RGBA buffer into the array that gets written for an encoding """
+def encode_buffer(buffer, encoding="float32", rgb_only=False, chunk_rows=256):
+    """
+    Float encodings keep the values as they are. Integer encodings expect
+    the RGB values to be remapped into 0-1 already and quantize them.
+    rgb_only drops the constant alpha channel.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding: {encoding}")
+
+    # The EXR writers read the array as contiguous memory, a channel slice is not
+    source = np.ascontiguousarray(buffer[..., :3]) if rgb_only else buffer
+    if encoding == "float32":
+        return source
+    if encoding == "float16":
+        return source.astype(np.float16)
+
+    dtype = np.uint16 if encoding == "uint16" else np.uint8
+    max_value = np.iinfo(dtype).max
+    encoded = np.empty(source.shape, dtype=dtype)
+    # Quantize a few rows at a time so the float temporaries stay small
+    for start in range(0, source.shape[0], chunk_rows):
+        block = np.clip(source[start:start + chunk_rows], 0.0, 1.0) * max_value
+        encoded[start:start + chunk_rows] = np.rint(block)
+    return encoded
+
+""" Writes a (height, width, 3 or 4) float32 or float16 buffer to an EXR """
+def save_exr(buffer, save_path, metadata=None):
     import OpenEXR
-    import Imath
-    import numpy as np
-
-    array = np.array(buffer_list, dtype=np.float32).reshape((height, width, 4))
-
-    header = OpenEXR.Header(width, height)
-    FLOAT = Imath.PixelType(Imath.PixelType.FLOAT)
-    header['channels'] = {
-        'R': Imath.Channel(FLOAT),
-        'G': Imath.Channel(FLOAT),
-        'B': Imath.Channel(FLOAT),
-        'A': Imath.Channel(FLOAT)
-    }
 
-    r = array[:, :, 0].astype(np.float32).tobytes()
-    g = array[:, :, 1].astype(np.float32).tobytes()
-    b = array[:, :, 2].astype(np.float32).tobytes()
-    a = array[:, :, 3].astype(np.float32).tobytes()
+    height, width, nr_of_channels = buffer.shape
+    channel_names = "RGBA"[:nr_of_channels]
 
-    out = OpenEXR.OutputFile(save_path, header)
-    out.writePixels({'R': r, 'G': g, 'B': b, 'A': a})
-    out.close()
+    if hasattr(OpenEXR, "File"):
+        # OpenEXR 3.x reads the channels straight out of the interleaved array
+        header = {"compression": OpenEXR.ZIP_COMPRESSION, "type": OpenEXR.scanlineimage}
+        if metadata:
+            header["vatMetadata"] = json.dumps(metadata)
+        with OpenEXR.File(header, {channel_names: buffer}) as out:
+            out.write(save_path)
+    else:
+        import Imath
+
+        header = OpenEXR.Header(width, height)
+        if buffer.dtype == np.float16:
+            pixel_type = Imath.PixelType(Imath.PixelType.HALF)
+        else:
+            pixel_type = Imath.PixelType(Imath.PixelType.FLOAT)
+        header['channels'] = {name: Imath.Channel(pixel_type) for name in channel_names}
+        if metadata:
+            # The legacy bindings only take string attributes as bytes
+            header['vatMetadata'] = json.dumps(metadata).encode("utf-8")
+        # The legacy bindings only take bytes, so each plane is copied once
+        planes = {name: np.ascontiguousarray(buffer[:, :, c]).tobytes() for c, name in enumerate(channel_names)}
+
+        out = OpenEXR.OutputFile(save_path, header)
+        out.writePixels(planes)
+        out.close()
     print(f"[Success] EXR file saved to: {save_path}")
 
+""" Writes a (height, width, 3 or 4) uint16 or uint8 buffer to a PNG """
+def save_png(buffer, save_path):
+    import cv2
+
+    # OpenCV expects BGR(A) channel order
+    order = [2, 1, 0, 3][:buffer.shape[2]]
+    if not cv2.imwrite(save_path, buffer[:, :, order]):
+        raise IOError(f"Could not write PNG file: {save_path}")
+    print(f"[Success] PNG file saved to: {save_path}")
+
+""" Writes an encoded buffer with the file format that fits the encoding, returns the path """
+def save_texture(buffer, save_path_base, encoding="float32", metadata=None):
+    if encoding in FLOAT_ENCODINGS:
+        save_path = save_path_base + ".exr"
+        save_exr(buffer, save_path, metadata)
+    else:
+        save_path = save_path_base + ".png"
+        save_png(buffer, save_path)
+    return save_path
+
+""" Writes the remap ranges and playback info next to the textures """
+def save_metadata(metadata, save_path):
+    with open(save_path, "w") as f:
+        json.dump(metadata, f, indent=4)
+    print(f"[Success] Metadata saved to: {save_path}")
+
+""" Encodes and writes the textures and the metadata, returns the written paths """
+def write_textures(position_texture, normal_texture, metadata, output_dir, base_filename,
+                   encoding="float32", rgb_only=False, progress_fn=None, frame_texture=None,
+                   column_map=None):
+    """
+    normal_texture: None when packed quaternions replace the normals.
+    frame_texture: float32 tangents, written like the other textures but always
+                   with alpha (the handedness), or uint16 packed quaternions,
+                   always written as a 16 bit PNG.
+    column_map: (verts,) int32 texture column of every vertex, -1 for static
+                vertices, written as raw little-endian int32 to <name>_columns.bin.
+    """
+    # Does not touch the scene, so it can run on a worker thread
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    paths = {}
+
+    #save position texture
+    pos_path = save_texture(encode_buffer(position_texture, encoding, rgb_only),
+                            os.path.join(output_dir, base_filename + "_position"), encoding, metadata)
+    print("Position texture saved to:", pos_path)
+    if progress_fn:
+        progress_fn(0.5)
+
+    #save normal texture
+    nor_path = None
+    if normal_texture is not None:
+        nor_path = save_texture(encode_buffer(normal_texture, encoding, rgb_only),
+                                os.path.join(output_dir, base_filename + "_normal"), encoding, metadata)
+        print("Normal texture saved to:", nor_path)
+    if progress_fn:
+        progress_fn(0.75)
+
+    #save tangent or rotation texture
+    if frame_texture is not None:
+        if metadata.get("frame_output") == "quaternion":
+            name = "rotation"
+            frame_path = os.path.join(output_dir, base_filename + "_rotation.png")
+            save_png(frame_texture, frame_path)
+        else:
+            name = "tangent"
+            frame_path = save_texture(encode_buffer(frame_texture, encoding, False),
+                                      os.path.join(output_dir, base_filename + "_tangent"), encoding, metadata)
+        print(f"{name.capitalize()} texture saved to:", frame_path)
+        paths[name] = frame_path
+    if progress_fn:
+        progress_fn(0.95)
+
+    #save vertex to column map
+    if column_map is not None:
+        paths["columns"] = os.path.join(output_dir, base_filename + "_columns.bin")
+        np.asarray(column_map, dtype="<i4").tofile(paths["columns"])
+        print("Column map saved to:", paths["columns"])
+
+    #save remap ranges
+    meta_path = os.path.join(output_dir, base_filename + "_vat.json")
+    save_metadata(metadata, meta_path)
+
+    paths.update({"position": pos_path, "normal": nor_path, "metadata": meta_path})
+    return paths
+
+""" Deletes every file write_textures() writes for a base filename, returns the deleted paths """
+def remove_textures(output_dir, base_filename, encoding="float32"):
+    extension = ".exr" if encoding in FLOAT_ENCODINGS else ".png"
+    names = [name + extension for name in ("_position", "_normal", "_tangent")]
+    names += ["_rotation.png", "_columns.bin", "_vat.json"]
+    removed = []
+    for name in names:
+        path = os.path.join(output_dir, base_filename + name)
+        if os.path.exists(path):
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+""" Resolves what every export needs before it samples, shared by the vertex, stream and rigid exports """
+def prepare_export(output_dir=None, mesh_list=None, backend=None, atlas=False, frame_range=None,
+                   rest_source="bind_frame", rest_frame=None, layout_mode=None, max_width=None,
+                   normal_source="mesh", cache=None):
+    """
+    Creates the output folder, picks the meshes and reads their context, the
+    frame range and the rest pose. Returns a dict with output_dir, backend,
+    mesh_list, context, time_min, frame_range (every frame), base_positions
+    and layout_mode (defaulted like make_dat_texture()).
+    """
+    if output_dir is None:
+        output_dir = "C:/Textures/VAT/"
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    if backend is None:
+        backend = MayaBackend()
+    if mesh_list is None:
+        mesh_list = get_list_of_selected_meshes() if Selected_Meshes else get_list_of_all_meshes()
+
+    if not mesh_list:
+        raise RuntimeError("Please select a mesh.")
+    if not atlas and len(mesh_list) != 1:
+        raise RuntimeError("Please select exactly one mesh, or export in atlas mode.")
+
+    # Shapes, vertex counts and the rest pose are asked from the scene only here
+    context = MeshContext(mesh_list, backend, rest_source, rest_frame)
+
+    time_min, time_max = frame_range or backend.get_playback_range()
+
+    if cache is not None and context.rest_frame is not None:
+        context.rest_points = sample_frames(mesh_list, [context.rest_frame], backend=backend,
+                                            normal_source=normal_source, cache=cache, context=context)[0][0]
+
+    if layout_mode is None:
+        layout_mode = "wrap" if max_width else "raw"
+
+    return {
+        "output_dir": output_dir,
+        "backend": backend,
+        "mesh_list": mesh_list,
+        "context": context,
+        "time_min": time_min,
+        "frame_range": list(range(time_min, time_max + 1)),
+        "base_positions": context.get_rest_points(),
+        "layout_mode": layout_mode,
+    }
+
 #----------------------------------------------------------------
 #----------------------------------------------------------------
 """ Main program """
 #----------------------------------------------------------------
 #----------------------------------------------------------------
-def make_dat_texture(output_dir=None, base_filename="output", progress_fn=None):
-    if output_dir is None:
-        output_dir = "C:/Textures/VAT/"
+def make_dat_texture(output_dir=None, base_filename="output", normal_source="mesh",
+                     encoding="float32", rgb_only=False, mesh_list=None, backend=None,
+                     atlas=False, layout_mode=None, max_width=None, frame_tolerance=None,
+                     cache=None, frame_range=None, parallel=None, profile=None,
+                     rest_source="bind_frame", rest_frame=None, frame_output=None, static_tolerance=None,
+                     validate=False, max_error=None, progress_fn=None):
+    """
+    atlas: bakes all meshes of mesh_list side by side into one texture,
+           the offset/length of each mesh is written to the metadata.
+    layout_mode: "raw", "pow2" or "wrap", see VAT_Layout.compute_layout().
+                 Defaults to "wrap" when max_width is given, "raw" otherwise.
+    max_width: widest texture allowed, wrap splits frame rows over several texture rows.
+    frame_tolerance: drops frames that linear interpolation reproduces within this
+                     distance, the metadata "frame_remap" maps every frame to a texture row.
+    cache: VAT_Cache.SampleCache that keeps sampled frames between exports.
+    frame_range: (start, end) frames to export, the playback range by default.
+    parallel: VAT_Parallel.ParallelSampling, samples chunks of the frame range in
+              separate processes that open the saved scene. The cache is not used then.
+    profile: VAT_Profile.ExportProfile, records time, backend calls, bytes and memory per stage.
+             Without one only the time and backend calls are recorded for the printed summary.
+    rest_source: base pose of the offsets, "bind_frame" (frame 0), "frame" (rest_frame)
+                 or "intermediate" (the intermediate shape), see VAT_Mesh.MeshContext.
+    frame_output: also bakes the tangent frame of every vertex from the normals and UVs,
+                  see VAT_Tangent. "tangent" writes a _tangent texture (xyz + handedness),
+                  "quaternion" writes a 16 bit _rotation PNG that replaces the normal texture.
+    static_tolerance: vertices whose offset never gets longer than this, and whose
+                      neighbours do not move either, get no texture column. The
+                      layout only covers the moving vertices, _columns.bin maps
+                      every vertex to its column (-1 = keep the rest pose).
+    validate: reads the written textures back, see VAT_Validate, and writes the per
+              frame max and RMS position and normal error to <name>_validation.json.
+              The samples from before frame decimation and static vertex elimination
+              are kept for it, so those use twice the sample memory then.
+    max_error: validates and fails the export when an error is larger than this.
+    progress_fn: called with the overall percent, weighted over all stages.
+    """
+    if profile is None:
+        # Always timed, tracing memory is left to callers that ask for a profile
+        profile = ExportProfile(trace_memory=False)
+    backend = profile.wrap_backend(backend or MayaBackend())
+    export = iter_export(output_dir, base_filename, normal_source, encoding, rgb_only, mesh_list, backend,
+                         atlas, layout_mode, max_width, frame_tolerance, cache, frame_range, parallel,
+                         rest_source, rest_frame, frame_output, static_tolerance, validate, max_error)
+    paths = ExportJob(profile.track(export)).run(progress_fn)
+    profile.print_summary()
+    return paths
+
+""" Generator version of make_dat_texture(), see VAT_Job.ExportJob """
+def iter_export(output_dir=None, base_filename="output", normal_source="mesh",
+                encoding="float32", rgb_only=False, mesh_list=None, backend=None,
+                atlas=False, layout_mode=None, max_width=None, frame_tolerance=None,
+                cache=None, frame_range=None, parallel=None, rest_source="bind_frame", rest_frame=None,
+                frame_output=None, static_tolerance=None, validate=False, max_error=None, executor=None):
+    """
+    Yields (stage, fraction) between frames and returns the written paths.
+    executor: concurrent.futures executor, encoding and writing the files
+              runs there while the generator keeps yielding.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding: {encoding}")
+    if frame_output is not None and frame_output not in FRAME_OUTPUTS:
+        raise ValueError(f"Unknown frame output: {frame_output}")
 
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
     print("Start generating VAT...")
     print()
-    start_time = time.time() 
     
     print("Collecting information...")
+    yield "prepare", 0.0
 
-    mesh_list = get_list_of_selected_meshes() if Selected_Meshes else get_list_of_all_meshes()
-    
-    if len(mesh_list) != 1:
-        cmds.error("Please select exactly one mesh.")
-    
-    nr_of_vtx = sum(cmds.polyEvaluate(m, vertex=True) for m in mesh_list)
+    setup = prepare_export(output_dir, mesh_list, backend, atlas, frame_range, rest_source, rest_frame,
+                           layout_mode, max_width, normal_source, cache)
+    output_dir, backend, mesh_list = setup["output_dir"], setup["backend"], setup["mesh_list"]
+    context = setup["context"]
+    vtx_counts = context.vertex_counts.tolist()
+    nr_of_vtx = context.nr_of_vtx
 
-    time_min = int(cmds.playbackOptions(q=True, min=True))
-    time_max = int(cmds.playbackOptions(q=True, max=True))
-    frame_range = list(range(time_min, time_max + 1))
+    time_min, frame_range = setup["time_min"], setup["frame_range"]
     nr_of_frames = len(frame_range)
-
-    base_frame = 0
-    base_positions = get_vertex_positions_at_frame(mesh_list, base_frame)
+    base_positions = setup["base_positions"]
+    layout_mode = setup["layout_mode"]
+    yield "prepare", 1.0
     
-    fps = demystify(cmds.currentUnit(query=True, time=True))
+    fps = backend.get_fps()
 
-    """ Derive next power of 2 to get width and height of texture """
-    buffer_width = nr_of_vtx
-    buffer_height = nr_of_frames
+    """ Derive width and height of texture """
+    layout = compute_layout(nr_of_vtx, nr_of_frames, layout_mode, max_width)
     
 #-----------------------------------------------------------------------
+    # 全フレームを一度だけ評価して頂点位置と法線を取得
+    print("Sampling vertex positions and normals...")
+    # 頂点位置と法線は RGBA バッファへ直接書き込む
+    position_texture, position_buffer = make_float32_buffer(nr_of_frames, nr_of_vtx, layout)
+    normal_texture, normal_buffer = make_float32_buffer(nr_of_frames, nr_of_vtx, layout)
+    yield "sample", 0.0
+    if parallel is None:
+        sampler = iter_sample_frames(mesh_list, frame_range, backend=backend, normal_source=normal_source,
+                                     base_positions=base_positions,
+                                     position_out=position_buffer[:, :, :3],
+                                     normal_out=normal_buffer[:, :, :3],
+                                     cache=cache, context=context)
+    else:
+        sampler = parallel.iter_sample_frames(mesh_list, frame_range, backend=backend, normal_source=normal_source,
+                                              base_positions=base_positions,
+                                              position_out=position_buffer[:, :, :3],
+                                              normal_out=normal_buffer[:, :, :3],
+                                              context=context)
+    offsets, normals = yield from tag_stage("sample", sampler)
+    # 検証は圧縮前のサンプルと比べる (間引きと静止頂点の誤差も測るため)
+    validating = validate or max_error is not None
+    sampled_offsets, sampled_normals = (offsets, normals) if validating else (None, None)
+
+    # 線形補間で再現できるフレームを削除
+    compression = None
+    if frame_tolerance is not None:
+        print("Dropping redundant frames...")
+        yield "compress", 0.0
+        compression = decimate_frames(offsets, frame_tolerance)
+        kept_frames = compression["kept_frames"]
+        layout = compute_layout(nr_of_vtx, len(kept_frames), layout_mode, max_width)
+        position_texture, position_buffer = take_frames(position_buffer, kept_frames, layout)
+        normal_texture, normal_buffer = take_frames(normal_buffer, kept_frames, layout)
+        offsets = position_buffer[:, :, :3]
+        normals = normal_buffer[:, :, :3]
+        print(f"Kept {len(kept_frames)} of {nr_of_frames} frames, "
+              f"ratio {compression['compression_ratio']:.2f}, max error {compression['max_error']:.6f}")
+
+    # 法線と UV から接線フレームを計算 (正規化の前の値を使う)
+    frame_texture = None
+    if frame_output is not None:
+        print("Computing tangent frames...")
+        yield "tangents", 0.0
+        frame_dtype = np.uint16 if frame_output == "quaternion" else np.float32
+        frame_texture, frame_buffer = make_texture(layout, 4, frame_dtype)
+        yield from tag_stage("tangents", iter_tangent_frames(offsets, normals, base_positions, context.get_uvs(),
+                                                             context.get_all_triangles(), frame_output,
+                                                             frame_buffer))
+        if frame_output == "tangent" and encoding in INTEGER_ENCODINGS:
+            frame_buffer *= 0.5
+            frame_buffer += 0.5
+
+    # 動かない頂点を除き、動く頂点だけに列を割り当てる
+    sparse = None
+    if static_tolerance is not None:
+        print("Dropping static vertices...")
+        yield "sparse", 0.0
+        sparse = find_moving_vertices(offsets, static_tolerance, context.get_all_triangles())
+        moving_vertices = sparse["moving_vertices"]
+        if not len(moving_vertices):
+            raise RuntimeError(f"No vertex moves more than the static tolerance of {static_tolerance}.")
+        full_width = layout["width"]
+        layout = compute_layout(len(moving_vertices), layout["frame_count"], layout_mode, max_width)
+        position_texture, position_buffer = take_vertices(position_buffer, moving_vertices, layout)
+        yield "sparse", 0.4
+        normal_texture, normal_buffer = take_vertices(normal_buffer, moving_vertices, layout)
+        yield "sparse", 0.8
+        if frame_texture is not None:
+            frame_texture, frame_buffer = take_vertices(frame_buffer, moving_vertices, layout)
+        offsets = position_buffer[:, :, :3]
+        normals = normal_buffer[:, :, :3]
+        sparse["width_ratio"] = layout["width"] / float(full_width)
+        print(f"Kept {len(moving_vertices)} of {nr_of_vtx} vertices, texture width {full_width} -> "
+              f"{layout['width']} ({sparse['width_ratio'] * 100.0:.1f}%), "
+              f"largest static offset {sparse['max_static_offset']:.6f}")
+
     """ Get min & max position relative to first frame for normalize vertex positions with padding """
     print("Getting min and max positions for optimized scaling...")
-    #scale_min, scale_max = get_min_max_of_relative_positions(mesh_list, frame_range, 0.1)
-    scale_min, scale_max = get_min_max_of_relative_positions_per_axis(mesh_list, frame_range,base_positions,  0.1)
+    yield "normalize", 0.0
+    scale_min, scale_max = get_min_max_of_relative_positions_per_axis(offsets, 0.1)
 
 #-----------------------------------------------------------------------
-    # 頂点位置バッファの取得
-    print("Appending vertex positions...")
-    position_buffer = append_vertex_positions_float32(mesh_list, frame_range, base_positions, scale_min, scale_max, progress_fn=progress_fn)
-
-    # 法線バッファの取得
-    print("Appending normals...")
-    normal_min, normal_max = get_min_max_of_relative_normals(mesh_list, frame_range, 0.0)
-    normal_buffer = append_normals_float32(mesh_list, frame_range, normal_min, normal_max, progress_fn=progress_fn)
+    # 法線バッファを 0-1 にスケーリング
+    normal_min = normal_max = None
+    if frame_output == "quaternion":
+        # The rotation texture carries the normals
+        normal_texture = None
+    else:
+        print("Scaling normals...")
+        normal_min, normal_max = get_min_max_of_relative_normals(normals, 0.0)
+        remap_float32(normals, normal_min, normal_max)
+
+    # 整数フォーマットではオフセットも軸ごとの範囲で 0-1 に正規化
+    position_remapped = encoding in INTEGER_ENCODINGS
+    if position_remapped:
+        remap_float32(offsets, scale_min, scale_max)
+
+    metadata = {
+        "encoding": encoding,
+        "channels": "RGB" if rgb_only else "RGBA",
+        "fps": fps,
+        "frame_start": time_min,
+        "frame_count": nr_of_frames,
+        "vertex_count": nr_of_vtx,
+        "position_remapped": position_remapped,
+        "rest_source": context.rest_source,
+        "rest_frame": context.rest_frame,
+        "position_min": scale_min,
+        "position_max": scale_max,
+        "normal_min": normal_min,
+        "normal_max": normal_max,
+        "layout": layout,
+        "meshes": build_atlas_table(mesh_list, vtx_counts),
+        "frame_remap": None,
+        "frame_output": frame_output,
+    }
+    if frame_output == "tangent":
+        metadata["tangent_remapped"] = encoding in INTEGER_ENCODINGS
+    elif frame_output == "quaternion":
+        metadata["quaternion_packing"] = QUATERNION_PACKING
+    if compression:
+        metadata["frame_remap"] = compression["frame_remap"].tolist()
+        metadata["compression_ratio"] = compression["compression_ratio"]
+        metadata["max_frame_error"] = compression["max_error"]
+    if sparse:
+        metadata["static_tolerance"] = static_tolerance
+        metadata["moving_vertex_count"] = len(sparse["moving_vertices"])
+        metadata["width_ratio"] = sparse["width_ratio"]
+        metadata["max_static_offset"] = sparse["max_static_offset"]
+        metadata["column_map"] = base_filename + "_columns.bin"
 
 
 #------------------------------------------
     """ Write data to file in EXR format """
 
     print("--- Analiiiizing ---")
-    print("Buffer width :", buffer_width)
-    print("Buffer height:", buffer_height)
+    print("Buffer width :", layout["width"])
+    print("Buffer height:", layout["height"])
+    print("Rows / frame :", layout["rows_per_frame"])
     print("no of VTXs   :", nr_of_vtx)
     print("no of frames :", nr_of_frames)
     print("fps          :", fps)
@@ -403,23 +767,46 @@ def make_dat_texture(output_dir=None, base_filename="output", progress_fn=None):
     print()
     print("--- List lengths ---")
     
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    scene_name = cmds.file(q=True, sn=True, shortName=True).split('.')[0]
-
-    #save position EXR
-    pos_path = os.path.join(output_dir, base_filename + "_position.exr")
-    save_float32_exr(position_buffer, buffer_width, nr_of_frames, pos_path)
-    print("Position texture saved to:", pos_path)
-
-    #save normal EXR
-    nor_path = os.path.join(output_dir, base_filename + "_normal.exr")
-    save_float32_exr(normal_buffer, buffer_width, nr_of_frames, nor_path)
-    print("Normal texture saved to:", nor_path)
-    
-    elapsedTime = time.time() - start_time
-    if (elapsedTime < 1) : sec = "of a second!!"
-    if (elapsedTime == 1) : sec = "second!!"
-    if (elapsedTime > 1) : sec = "seconds!! CALL YOUR LOCAL OPTIMIZER - 555-345345"
-    print("It'sa done!! everything took just", elapsedTime, sec)
\ No newline at end of file
+    yield "write", 0.0
+    column_map = sparse["column_map"] if sparse else None
+    write_args = (position_texture, normal_texture, metadata, output_dir, base_filename, encoding, rgb_only)
+    if executor is None:
+        paths = write_textures(*write_args, frame_texture=frame_texture, column_map=column_map)
+    else:
+        write_state = {"fraction": 0.0}
+        def write_progress(fraction):
+            write_state["fraction"] = fraction
+        future = executor.submit(write_textures, *write_args, progress_fn=write_progress,
+                                 frame_texture=frame_texture, column_map=column_map)
+        # Keep yielding so the caller stays responsive while the files are written
+        try:
+            while not future.done():
+                concurrent.futures.wait([future], timeout=0.01)
+                yield "write", write_state["fraction"]
+        except GeneratorExit:
+            # Cancelled while writing: a file that is being written cannot be stopped,
+            # wait for it and delete the set so no half written VAT is left behind
+            if not future.cancel():
+                concurrent.futures.wait([future])
+            for path in remove_textures(output_dir, base_filename, encoding):
+                print("Removed partial output:", path)
+            raise
+        paths = future.result()
+
+    # 書き出したテクスチャを読み戻して誤差を測る
+    if validating:
+        print("Validating written textures...")
+        yield "validate", 0.0
+        # Without decimation and elimination the samples were remapped in place
+        remapped = np.may_share_memory(sampled_offsets, offsets)
+        report = yield from tag_stage("validate", iter_validate(paths, metadata, sampled_offsets, sampled_normals,
+                                                                max_error, reference_remapped=remapped))
+        print_report(report)
+        paths["validation"] = os.path.join(output_dir, base_filename + "_validation.json")
+        save_report(report, paths["validation"])
+        if not report["passed"]:
+            raise RuntimeError(f"The written textures are off by more than {max_error}, "
+                               f"see {paths['validation']}")
+
+    print("Done.")
+    return paths
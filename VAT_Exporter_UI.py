@@ -1,7 +1,12 @@
 from . import VAT_Exporter as vat
+from .VAT_Backend import MayaBackend
+from .VAT_Cache import SampleCache
+from .VAT_Job import ExportJob, DONE, CANCELLED
+from .VAT_Profile import ExportProfile
 import maya.cmds as cmds
 from PySide6 import QtWidgets, QtCore
 from maya.app.general.mayaMixin import MayaQWidgetBaseMixin
+from concurrent.futures import ThreadPoolExecutor
 import os
 
 class VATExporterUI(MayaQWidgetBaseMixin, QtWidgets.QMainWindow):
@@ -9,7 +14,7 @@ class VATExporterUI(MayaQWidgetBaseMixin, QtWidgets.QMainWindow):
         ### initial setting for window
         super(VATExporterUI, self).__init__()
         self.setWindowTitle("VAT Exporter")
-        self.setFixedSize(360, 250)
+        self.setFixedSize(360, 330)
 
         project_dir = cmds.workspace(q=True, rootDirectory=True)
         images_dir = cmds.workspace(fileRuleEntry="images")
@@ -17,6 +22,19 @@ class VATExporterUI(MayaQWidgetBaseMixin, QtWidgets.QMainWindow):
         
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
+
+        # Sampled frames can be kept between exports, only changed frames get re-evaluated.
+        # The cache key only sees keyed animation, so it is off unless the artist turns it on
+        self.sample_cache = SampleCache(os.path.join(project_dir, "cache", "vat_samples"))
+
+        # The scene is sampled on the main thread in small steps driven by a timer,
+        # encoding and writing the files runs on the worker thread
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.export_job = None
+        self.export_profile = None
+        self.export_timer = QtCore.QTimer(self)
+        self.export_timer.setInterval(0)
+        self.export_timer.timeout.connect(self.step_export)
         
         self.init_ui()
     
@@ -45,12 +63,28 @@ class VATExporterUI(MayaQWidgetBaseMixin, QtWidgets.QMainWindow):
         self.export_btn = QtWidgets.QPushButton("Export VAT")
         self.export_btn.clicked.connect(self.export_vat)
 
+        # === Sample cache ===
+        cache_layout = QtWidgets.QHBoxLayout()
+        self.cache_checkbox = QtWidgets.QCheckBox("Reuse sampled frames")
+        self.cache_checkbox.setChecked(False)
+        self.cache_checkbox.setToolTip("Only keyed animation is detected. Clear the cache after editing "
+                                       "skin weights, deformers or the rest shape.")
+        self.clear_cache_btn = QtWidgets.QPushButton("Clear Cache")
+        self.clear_cache_btn.clicked.connect(self.clear_cache)
+        cache_layout.addWidget(self.cache_checkbox)
+        cache_layout.addWidget(self.clear_cache_btn)
+
         # === Progress bar ===
         self.progress_bar = QtWidgets.QProgressBar()
         self.progress_bar.setMinimum(0)
         self.progress_bar.setMaximum(100)
         self.progress_bar.setValue(0)
 
+        # === Cancel button ===
+        self.cancel_btn = QtWidgets.QPushButton("Cancel")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_export)
+
         # === Reset button ===
         self.reset_btn = QtWidgets.QPushButton("Reset")
         self.reset_btn.clicked.connect(self.reset_ui)
@@ -60,8 +94,10 @@ class VATExporterUI(MayaQWidgetBaseMixin, QtWidgets.QMainWindow):
         layout.addLayout(path_layout)
         layout.addWidget(QtWidgets.QLabel("Base filename:"))
         layout.addWidget(self.filename_input)
+        layout.addLayout(cache_layout)
         layout.addWidget(self.export_btn)
         layout.addWidget(self.progress_bar)
+        layout.addWidget(self.cancel_btn)
         layout.addWidget(self.reset_btn)
 
         self.setCentralWidget(central_widget)
@@ -73,21 +109,66 @@ class VATExporterUI(MayaQWidgetBaseMixin, QtWidgets.QMainWindow):
             self.output_path_label.setText(f"Output directry:<br>{self.output_dir}")
 
     def export_vat(self):
-        try:
-            self.progress_bar.setValue(0)
-            base_name = self.filename_input.text().strip()
-            if not base_name:
-                QtWidgets.QMessageBox.warning(self, "Missing Filename", "Please enter a base filename.")
-                return
-            def progress_callback(percent):
-                self.progress_bar.setValue(percent)
-            vat.make_dat_texture(output_dir=self.output_dir, base_filename=base_name, progress_fn=progress_callback)
+        if self.export_job is not None:
+            return
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
+        base_name = self.filename_input.text().strip()
+        if not base_name:
+            QtWidgets.QMessageBox.warning(self, "Missing Filename", "Please enter a base filename.")
+            return
+
+        self.export_profile = ExportProfile(trace_memory=False)
+        export = vat.iter_export(output_dir=self.output_dir, base_filename=base_name,
+                                 backend=self.export_profile.wrap_backend(MayaBackend()),
+                                 cache=self.sample_cache if self.cache_checkbox.isChecked() else None,
+                                 executor=self.executor)
+        self.export_job = ExportJob(self.export_profile.track(export))
+        self.set_running(True)
+        self.export_timer.start()
+
+    def step_export(self):
+        ### advance the export for a short time slice, then hand control back to Maya
+        job = self.export_job
+        running = job.step(0.05)
+
+        self.progress_bar.setValue(job.progress.get_percent())
+        eta = job.progress.get_eta()
+        if eta is not None:
+            self.progress_bar.setFormat(f"%p%  ({job.stage}, {eta:.0f}s left)")
+
+        if running:
+            return
+
+        self.export_timer.stop()
+        self.export_job = None
+        self.set_running(False)
+        self.progress_bar.setFormat("%p%")
+
+        if job.status == DONE:
             self.progress_bar.setValue(100)
-            
+            self.export_profile.print_summary()
             QtWidgets.QMessageBox.information(self, "Export Complete", "VAT export finished successfully.")
-            
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Export Failed", str(e))
+        elif job.status == CANCELLED:
+            self.progress_bar.setValue(0)
+            QtWidgets.QMessageBox.information(self, "Export Cancelled", "VAT export was cancelled.")
+        else:
+            QtWidgets.QMessageBox.critical(self, "Export Failed", str(job.error))
+
+    def cancel_export(self):
+        if self.export_job is not None:
+            # The job stops at its next step, which is when step_export runs again
+            self.export_job.cancel()
+
+    def clear_cache(self):
+        self.sample_cache.clear()
+        QtWidgets.QMessageBox.information(self, "Cache Cleared", "All sampled frames were deleted.")
+
+    def set_running(self, running):
+        self.export_btn.setEnabled(not running)
+        self.reset_btn.setEnabled(not running)
+        self.clear_cache_btn.setEnabled(not running)
+        self.cancel_btn.setEnabled(running)
 
     def choose_output_folder(self):
         folder = QtWidgets.QFileDialog.getExistingDirectory(self, "Select Output Folder", self.output_dir)
@@ -0,0 +1,135 @@
+import time
+
+#----------------------------------------------------------------
+
+""" Export jobs """
+""" Pure Python, no Maya or Qt: an export is a generator that yields
+    (stage, fraction) after every small piece of work, and a job steps it
+    for a limited time, so a UI timer can drive it without freezing.
+"""
+
+""" Stages of an export and their share of the total time """
+EXPORT_STAGES = (
+    ("prepare", 0.02),
+    ("sample", 0.63),
+    ("compress", 0.05),
+    ("tangents", 0.05),
+    ("sparse", 0.02),
+    ("normalize", 0.03),
+    ("write", 0.15),
+    ("validate", 0.05),
+)
+
+""" Job states """
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+""" Yields (stage, fraction) for every fraction of a generator and returns its result """
+def tag_stage(stage, generator):
+    while True:
+        try:
+            fraction = next(generator)
+        except StopIteration as done:
+            return done.value
+        yield stage, fraction
+
+""" Weighted progress over the stages, with a time estimate """
+class ProgressModel(object):
+    def __init__(self, stages=EXPORT_STAGES, clock=time.time):
+        self.names = [name for name, _ in stages]
+        self.weights = [float(weight) for _, weight in stages]
+        self.total_weight = sum(self.weights)
+        self.clock = clock
+        self.start_time = None
+        self.stage_index = 0
+        self.stage_fraction = 0.0
+
+    def update(self, stage, fraction):
+        if self.start_time is None:
+            self.start_time = self.clock()
+        # Stages that were skipped count as done
+        self.stage_index = self.names.index(stage)
+        self.stage_fraction = min(max(float(fraction), 0.0), 1.0)
+
+    def finish(self):
+        self.stage_index = len(self.names) - 1
+        self.stage_fraction = 1.0
+
+    def get_fraction(self):
+        done = sum(self.weights[:self.stage_index])
+        done += self.weights[self.stage_index] * self.stage_fraction
+        return done / self.total_weight
+
+    def get_percent(self):
+        return int(self.get_fraction() * 100)
+
+    """ Seconds left, extrapolated from the time spent so far, None before any progress """
+    def get_eta(self):
+        fraction = self.get_fraction()
+        if self.start_time is None or fraction <= 0.0:
+            return None
+        elapsed = self.clock() - self.start_time
+        return elapsed * (1.0 - fraction) / fraction
+
+""" Steps an export generator in time slices """
+class ExportJob(object):
+    def __init__(self, generator, progress=None, clock=time.time):
+        self.generator = generator
+        self.progress = progress if progress is not None else ProgressModel(clock=clock)
+        self.clock = clock
+        self.status = PENDING
+        self.stage = None
+        self.result = None
+        self.error = None
+
+    def is_finished(self):
+        return self.status in (DONE, CANCELLED, FAILED)
+
+    """ Runs the export for about budget seconds (one event when None), returns False once finished """
+    def step(self, budget=0.05):
+        if self.is_finished():
+            return False
+
+        self.status = RUNNING
+        deadline = None if budget is None else self.clock() + budget
+        while True:
+            try:
+                self.stage, fraction = next(self.generator)
+            except StopIteration as done:
+                self.result = done.value
+                self.status = DONE
+                self.progress.finish()
+                return False
+            except Exception as e:
+                self.error = e
+                self.status = FAILED
+                return False
+
+            self.progress.update(self.stage, fraction)
+            if deadline is None or self.clock() >= deadline:
+                return True
+
+    """ Stops the export at its next yield """
+    def cancel(self):
+        if self.is_finished():
+            return
+        self.generator.close()
+        self.status = CANCELLED
+
+    """ Runs the export to the end in one go and returns its result """
+    def run(self, progress_fn=None):
+        last_percent = None
+        while self.step(None):
+            percent = self.progress.get_percent()
+            if progress_fn and percent != last_percent:
+                progress_fn(percent)
+                last_percent = percent
+
+        if self.status == FAILED:
+            raise self.error
+        if progress_fn:
+            progress_fn(100)
+        return self.result
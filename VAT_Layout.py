@@ -0,0 +1,102 @@
+import math
+
+import numpy as np
+
+#----------------------------------------------------------------
+
+""" Texture layout """
+""" Pure functions, vertex v of frame f lives at texel (x, y) with
+        i = offset + v
+        x = i % width
+        y = f * rows_per_frame + i // width
+    and is sampled at uv = ((x + 0.5) / width, (y + 0.5) / height)
+"""
+
+""" Layout modes """
+LAYOUT_MODES = ("raw", "pow2", "wrap")
+DEFAULT_MAX_WIDTH = 8192
+
+""" Texel encodings: float modes are written as EXR, normalized integer modes as PNG """
+FLOAT_ENCODINGS = ("float32", "float16")
+INTEGER_ENCODINGS = ("uint16", "uint8")
+ENCODINGS = FLOAT_ENCODINGS + INTEGER_ENCODINGS
+
+""" Returns the smallest power of two >= value """
+def next_power_of_two(value):
+    return 1 << max(int(value) - 1, 0).bit_length()
+
+""" Returns the texture layout of nr_of_vtx vertices over nr_of_frames frames """
+def compute_layout(nr_of_vtx, nr_of_frames, mode="raw", max_width=None):
+    """
+    raw : one texture row per frame, width = vertex count.
+    pow2: like raw, with width and height padded to the next power of two.
+    wrap: frame rows wider than max_width continue on the next texture rows.
+    The returned dict has everything the runtime needs to address a vertex.
+    """
+    if mode not in LAYOUT_MODES:
+        raise ValueError(f"Unknown layout mode: {mode}")
+    if nr_of_vtx < 1 or nr_of_frames < 1:
+        raise ValueError("A layout needs at least one vertex and one frame.")
+
+    rows_per_frame = 1
+    if mode == "raw":
+        width = nr_of_vtx
+        height = nr_of_frames
+    elif mode == "pow2":
+        width = next_power_of_two(nr_of_vtx)
+        height = next_power_of_two(nr_of_frames)
+    else:
+        max_width = max_width or DEFAULT_MAX_WIDTH
+        width = min(nr_of_vtx, max_width)
+        rows_per_frame = int(math.ceil(nr_of_vtx / float(width)))
+        height = nr_of_frames * rows_per_frame
+
+    if max_width and width > max_width:
+        raise ValueError(f"Texture width {width} is over the limit of {max_width}, use the wrap layout.")
+
+    return {
+        "mode": mode,
+        "vertex_count": nr_of_vtx,
+        "frame_count": nr_of_frames,
+        "width": width,
+        "height": height,
+        "rows_per_frame": rows_per_frame,
+        # uv = ((x + 0.5) * texel_size[0], (y + 0.5) * texel_size[1])
+        "texel_size": [1.0 / width, 1.0 / height],
+        # v distance between the first rows of two frames
+        "frame_v_step": rows_per_frame / float(height),
+    }
+
+""" Returns the per mesh offset/length table of an atlas, in mesh_list order """
+def build_atlas_table(mesh_list, vtx_counts):
+    table = []
+    offset = 0
+    for mesh, count in zip(mesh_list, vtx_counts):
+        table.append({"mesh": mesh, "offset": offset, "length": int(count)})
+        offset += int(count)
+    return table
+
+""" Returns the texel (x, y) of a vertex, same math as the runtime shader """
+def get_texel(vertex_index, frame_index, width, rows_per_frame=1, offset=0):
+    i = offset + vertex_index
+    return i % width, frame_index * rows_per_frame + i // width
+
+""" Returns the uv at the center of a vertex texel """
+def get_uv(vertex_index, frame_index, layout, offset=0):
+    x, y = get_texel(vertex_index, frame_index, layout["width"], layout["rows_per_frame"], offset)
+    return (x + 0.5) / layout["width"], (y + 0.5) / layout["height"]
+
+""" Returns a zero filled texture for a layout and its (frames, verts, channels) view """
+def make_texture(layout, channels=4, dtype=np.float32):
+    """
+    The view shares memory with the texture, so filling it fills the
+    texture in place. Padding texels stay zero and are written as they are.
+    """
+    nr_of_frames = layout["frame_count"]
+    rows_per_frame = layout["rows_per_frame"]
+    width = layout["width"]
+
+    texture = np.zeros((layout["height"], width, channels), dtype=dtype)
+    used_rows = texture[:nr_of_frames * rows_per_frame]
+    view = used_rows.reshape(nr_of_frames, rows_per_frame * width, channels)[:, :layout["vertex_count"]]
+    return texture, view
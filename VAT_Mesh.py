@@ -0,0 +1,98 @@
+import numpy as np
+
+#----------------------------------------------------------------
+
+""" Mesh context """
+""" What an export needs to know about its meshes, asked from the scene
+    once and reused by every stage instead of being queried again per frame.
+"""
+
+""" Where the rest pose, the base of the offsets, comes from """
+REST_SOURCES = ("bind_frame", "frame", "intermediate")
+BIND_FRAME = 0
+
+class MeshContext(object):
+    """
+    rest_source: "bind_frame"  : the pose at frame 0, where the bind pose is keyed.
+                 "frame"       : the pose at rest_frame.
+                 "intermediate": the undeformed intermediate shape, no frame is evaluated.
+    All meshes share one vertex order, mesh i covers the vertices
+    offsets[i] to offsets[i] + vertex_counts[i].
+    """
+    def __init__(self, mesh_list, backend, rest_source="bind_frame", rest_frame=None):
+        if rest_source not in REST_SOURCES:
+            raise ValueError(f"Unknown rest source: {rest_source}")
+        if rest_source == "frame" and rest_frame is None:
+            raise ValueError("The 'frame' rest source needs a rest_frame.")
+
+        self.meshes = list(mesh_list)
+        self.backend = backend
+        self.rest_source = rest_source
+        self.rest_frame = None
+        if rest_source == "bind_frame":
+            self.rest_frame = BIND_FRAME
+        elif rest_source == "frame":
+            self.rest_frame = rest_frame
+
+        self.shapes = [backend.get_shape(mesh) for mesh in self.meshes]
+        self.intermediate_shapes = [None] * len(self.meshes)
+        if rest_source == "intermediate":
+            self.intermediate_shapes = [backend.get_intermediate_shape(mesh) for mesh in self.meshes]
+
+        self.vertex_counts = np.array([backend.get_vertex_count(shape) for shape in self.shapes], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.vertex_counts)[:-1]]).astype(np.int64)
+        self.nr_of_vtx = int(self.vertex_counts.sum())
+        self.triangles = {}
+        self.uvs = None
+        # (verts, 3) float64, filled by get_rest_points() or set by the caller
+        self.rest_points = None
+
+    """ Yields (mesh, shape, first vertex, vertex count) of every mesh """
+    def iter_meshes(self):
+        for mesh, shape, offset, count in zip(self.meshes, self.shapes, self.offsets, self.vertex_counts):
+            yield mesh, shape, int(offset), int(count)
+
+    """ Triangles of a mesh, read from the scene the first time only """
+    def get_triangles(self, mesh):
+        if mesh not in self.triangles:
+            self.triangles[mesh] = self.backend.get_triangles(self.shapes[self.meshes.index(mesh)])
+        return self.triangles[mesh]
+
+    """ Triangles of all meshes, indexing the shared vertex order """
+    def get_all_triangles(self):
+        parts = [self.get_triangles(mesh) + offset for mesh, _, offset, _ in self.iter_meshes()]
+        return np.concatenate(parts).astype(np.int64) if parts else np.zeros((0, 3), dtype=np.int64)
+
+    """ Per vertex UVs of all meshes, read from the scene the first time only """
+    def get_uvs(self):
+        if self.uvs is None:
+            parts = [self.backend.get_uvs(shape) for shape in self.shapes]
+            self.uvs = np.concatenate(parts).astype(np.float64)
+            if len(self.uvs) != self.nr_of_vtx:
+                raise RuntimeError("The UVs do not have the same vertex count as the meshes.")
+        return self.uvs
+
+    """ Rest positions of all meshes, resolved the first time only """
+    def get_rest_points(self):
+        if self.rest_points is not None:
+            return self.rest_points
+
+        if self.rest_source == "intermediate":
+            parts = []
+            for mesh, intermediate_shape in zip(self.meshes, self.intermediate_shapes):
+                # Backends without shape nodes know the rest pose of the mesh itself
+                if intermediate_shape is not None:
+                    points = self.backend.get_points(intermediate_shape)
+                else:
+                    points = self.backend.get_rest_points(mesh)
+                if points is None:
+                    raise RuntimeError(f"{mesh} has no intermediate shape, use the bind_frame or frame rest source.")
+                parts.append(points)
+        else:
+            self.backend.set_frame(self.rest_frame)
+            parts = [self.backend.get_points(shape) for shape in self.shapes]
+
+        self.rest_points = np.concatenate(parts).astype(np.float64)
+        if len(self.rest_points) != self.nr_of_vtx:
+            raise RuntimeError("The rest pose does not have the same vertex count as the meshes.")
+        return self.rest_points
@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import subprocess
+import concurrent.futures
+
+import numpy as np
+
+from . import VAT_Exporter as vat
+from .VAT_Batch import get_worker_env, make_backend
+from .VAT_Mesh import MeshContext
+
+#----------------------------------------------------------------
+
+""" Parallel sampling """
+""" Rig evaluation is single threaded inside one Maya session, so long
+    ranges are split into contiguous chunks and every chunk is sampled by
+    its own headless process that opens the same scene file. The processes
+    write their rows into shared memory-mapped arrays and the main process
+    stitches them into the sample buffers.
+"""
+
+""" Returns the (first row, end row) of every chunk, contiguous and in order """
+def split_frame_range(nr_of_frames, nr_of_chunks):
+    nr_of_chunks = max(1, min(int(nr_of_chunks), nr_of_frames))
+    bounds = np.linspace(0, nr_of_frames, nr_of_chunks + 1).round().astype(int)
+    return [(int(bounds[i]), int(bounds[i + 1])) for i in range(nr_of_chunks)]
+
+""" Frames evaluated and thrown away before a chunk, the ones right before its first frame """
+def get_preroll_frames(time_stamps, row_start, preroll):
+    # The first chunk starts where a single process would start
+    if row_start == 0 or preroll <= 0:
+        return []
+    return list(time_stamps[max(row_start - preroll, 0):row_start])
+
+""" Worker processes of one sampling run, stopped together on cancel or failure """
+class WorkerProcesses(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processes = []
+        self.stopped = False
+
+    """ Starts a worker, unless the run was stopped already """
+    def start(self, command, env=None):
+        with self.lock:
+            if self.stopped:
+                raise RuntimeError("Sampling was stopped.")
+            process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            self.processes.append(process)
+        return process
+
+    """ Kills every worker that is still running and keeps new ones from starting """
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            for process in self.processes:
+                if process.poll() is None:
+                    process.kill()
+
+class ParallelSampling(object):
+    """
+    workers   : processes sampling at the same time.
+    chunks    : pieces the frame range is split into, workers by default.
+                More chunks give smoother progress, every chunk opens the scene once.
+    preroll   : frames evaluated before every chunk but the first, for rigs with
+                simulations that have to settle.
+    executable: mayapy, or any Python that can import this package.
+    backend_name / backend_options: passed to VAT_Batch.make_backend() in the workers.
+    """
+    def __init__(self, workers=4, chunks=None, preroll=0, executable="mayapy", backend_name="maya",
+                 backend_options=None, timeout=None, scratch_dir=None):
+        self.workers = max(1, int(workers))
+        self.chunks = chunks or self.workers
+        self.preroll = int(preroll)
+        self.executable = executable
+        self.backend_name = backend_name
+        self.backend_options = backend_options or {}
+        self.timeout = timeout
+        self.scratch_dir = scratch_dir
+
+    """ Samples like VAT_Exporter.sample_frames() """
+    def sample_frames(self, mesh_list, time_stamps, backend=None, normal_source="mesh",
+                      base_positions=None, position_out=None, normal_out=None, progress_fn=None,
+                      context=None):
+        sampler = self.iter_sample_frames(mesh_list, time_stamps, backend, normal_source,
+                                          base_positions, position_out, normal_out, context)
+        while True:
+            try:
+                fraction = next(sampler)
+            except StopIteration as done:
+                return done.value
+            if progress_fn:
+                progress_fn(int(fraction * 100))
+
+    """ Samples like VAT_Exporter.iter_sample_frames(), yields the done fraction while the workers run """
+    def iter_sample_frames(self, mesh_list, time_stamps, backend=None, normal_source="mesh",
+                           base_positions=None, position_out=None, normal_out=None, context=None):
+        scene_path = backend.get_scene_path()
+        if not scene_path:
+            raise RuntimeError("Parallel sampling opens the scene file in every worker, please save the scene first.")
+        if backend.is_scene_modified():
+            # The workers would sample the scene as it was last saved
+            raise RuntimeError("The scene has unsaved changes the workers would not see, please save the scene first.")
+
+        time_stamps = list(time_stamps)
+        nr_of_frames = len(time_stamps)
+        if context is None:
+            context = MeshContext(mesh_list, backend)
+        nr_of_vtx = context.nr_of_vtx
+        if position_out is None:
+            position_out = np.empty((nr_of_frames, nr_of_vtx, 3), dtype=np.float64)
+        if normal_out is None:
+            normal_out = np.empty((nr_of_frames, nr_of_vtx, 3), dtype=np.float64)
+
+        temp_dir = tempfile.mkdtemp(prefix="vat_parallel_", dir=self.scratch_dir)
+        try:
+            shape = (nr_of_frames, nr_of_vtx, 3)
+            positions_path = os.path.join(temp_dir, "positions.npy")
+            normals_path = os.path.join(temp_dir, "normals.npy")
+            progress_path = os.path.join(temp_dir, "progress.npy")
+            base_path = None
+            chunks = split_frame_range(nr_of_frames, self.chunks)
+            # Created here, the workers open them read-write and fill their own rows
+            for path, dtype, array_shape in ((positions_path, np.float32, shape),
+                                             (normals_path, np.float32, shape),
+                                             (progress_path, np.int32, (len(chunks),))):
+                np.lib.format.open_memmap(path, "w+", dtype, array_shape)
+            if base_positions is not None:
+                base_path = os.path.join(temp_dir, "base.npy")
+                np.save(base_path, np.asarray(base_positions, dtype=np.float64))
+
+            jobs = []
+            for index, (row_start, row_end) in enumerate(chunks):
+                job = {
+                    "scene": scene_path,
+                    "meshes": list(mesh_list),
+                    "frames": time_stamps[row_start:row_end],
+                    "preroll_frames": get_preroll_frames(time_stamps, row_start, self.preroll),
+                    "row_start": row_start,
+                    "chunk_index": index,
+                    "positions": positions_path,
+                    "normals": normals_path,
+                    "progress": progress_path,
+                    "base_positions": base_path,
+                    "normal_source": normal_source,
+                    "backend": self.backend_name,
+                    "backend_options": self.backend_options,
+                }
+                job_path = os.path.join(temp_dir, f"chunk_{index}.json")
+                with open(job_path, "w") as f:
+                    json.dump(job, f)
+                jobs.append(job_path)
+
+            progress = np.load(progress_path, mmap_mode="r")
+            workers = WorkerProcesses()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = [pool.submit(self._run_chunk, job_path, workers) for job_path in jobs]
+                try:
+                    pending = set(futures)
+                    while pending:
+                        done, pending = concurrent.futures.wait(pending, timeout=0.05)
+                        # Raises the error of the first failed chunk
+                        for future in done:
+                            future.result()
+                        yield min(int(progress.sum()) / float(nr_of_frames), 1.0)
+                except BaseException:
+                    # Cancelled (GeneratorExit) or a chunk failed: the pool would wait for
+                    # every worker to finish its chunk, kill them instead
+                    for future in futures:
+                        future.cancel()
+                    workers.stop()
+                    raise
+            del progress
+
+            # Stitch the chunks into the buffers, a chunk at a time
+            positions = np.load(positions_path, mmap_mode="r")
+            normals = np.load(normals_path, mmap_mode="r")
+            for row_start, row_end in chunks:
+                position_out[row_start:row_end] = positions[row_start:row_end]
+                normal_out[row_start:row_end] = normals[row_start:row_end]
+            del positions, normals
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        return position_out, normal_out
+
+    def _run_chunk(self, job_path, workers):
+        command = [self.executable, "-m", __package__ + ".VAT_Parallel", job_path]
+        process = workers.start(command, get_worker_env())
+        try:
+            _, stderr = process.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise RuntimeError(f"Sampling chunk {job_path} took longer than {self.timeout} seconds")
+        if process.returncode != 0:
+            lines = stderr.strip().splitlines()
+            raise RuntimeError(f"Sampling chunk {job_path} failed: " + (lines[-1] if lines else str(process.returncode)))
+
+#----------------------------------------------------------------
+""" Worker entry point """
+#----------------------------------------------------------------
+
+""" Samples one chunk into the shared arrays """
+def sample_chunk(job, backend=None):
+    if backend is None:
+        backend = make_backend(job["backend"], **job["backend_options"])
+    backend.open_scene(job["scene"])
+
+    # Evaluated only to let simulations settle, the points are not kept
+    for frame in job["preroll_frames"]:
+        backend.set_frame(frame)
+        for mesh in job["meshes"]:
+            backend.get_points(mesh)
+
+    positions = np.load(job["positions"], mmap_mode="r+")
+    normals = np.load(job["normals"], mmap_mode="r+")
+    progress = np.load(job["progress"], mmap_mode="r+")
+    row_start = job["row_start"]
+    row_end = row_start + len(job["frames"])
+    base_positions = None
+    if job["base_positions"]:
+        base_positions = np.load(job["base_positions"])
+
+    sampler = vat.iter_sample_frames(job["meshes"], job["frames"], backend=backend,
+                                     normal_source=job["normal_source"], base_positions=base_positions,
+                                     position_out=positions[row_start:row_end],
+                                     normal_out=normals[row_start:row_end])
+    for i, _ in enumerate(sampler):
+        progress[job["chunk_index"]] = i + 1
+    positions.flush()
+    normals.flush()
+    progress.flush()
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    with open(argv[0]) as f:
+        job = json.load(f)
+    sample_chunk(job)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import tracemalloc
+
+#----------------------------------------------------------------
+
+""" Export profiling """
+""" Wall time, scene backend calls, bytes and peak memory per export stage
+        profile = ExportProfile()
+        make_dat_texture(..., profile=profile)
+        profile.print_report()
+        profile.save("profile.json")
+    Work done after an export yields a stage is counted to that stage.
+    Without a profile the exports still time themselves and print_summary().
+"""
+
+""" Peak resident memory of the current process in bytes """
+def get_peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+""" Forwards to a scene backend and counts every call against the current stage """
+class ProfiledBackend(object):
+    def __init__(self, backend, profile):
+        self.backend = backend
+        self.profile = profile
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            start_time = self.profile.clock()
+            result = attr(*args, **kwargs)
+            # Point queries return NumPy arrays, their size is what the scene produced
+            self.profile.add_call(name, self.profile.clock() - start_time, getattr(result, "nbytes", 0))
+            return result
+        return call
+
+class ExportProfile(object):
+    """
+    trace_memory: tracks the peak of Python and NumPy allocations per stage
+                  with tracemalloc, which slows down pure Python code a bit.
+    """
+    def __init__(self, trace_memory=True, clock=time.perf_counter):
+        self.trace_memory = trace_memory
+        self.clock = clock
+        self.stages = []
+        self.current = None
+        self.start_time = None
+        self.total_seconds = 0.0
+
+    def wrap_backend(self, backend):
+        return ProfiledBackend(backend, self)
+
+    def enter_stage(self, name):
+        self.leave_stage()
+        self.current = {
+            "name": name,
+            "seconds": 0.0,
+            "backend_calls": {},
+            "backend_seconds": 0.0,
+            "bytes": 0,
+            "peak_traced_bytes": None,
+            "peak_rss": None,
+        }
+        self.stage_start = self.clock()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    def leave_stage(self):
+        if self.current is None:
+            return
+        self.current["seconds"] = self.clock() - self.stage_start
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.current["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+        # Peak of the whole process so far, it never goes down
+        self.current["peak_rss"] = get_peak_rss()
+        self.stages.append(self.current)
+        self.current = None
+
+    def add_call(self, name, seconds, nr_of_bytes=0):
+        if self.current is None:
+            self.enter_stage("setup")
+        calls = self.current["backend_calls"]
+        calls[name] = calls.get(name, 0) + 1
+        self.current["backend_seconds"] += seconds
+        self.current["bytes"] += int(nr_of_bytes)
+
+    def add_bytes(self, nr_of_bytes):
+        if self.current is None:
+            self.enter_stage("setup")
+        self.current["bytes"] += int(nr_of_bytes)
+
+    """ Passes the (stage, fraction) of an export generator through and times its stages """
+    def track(self, export):
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        self.start_time = self.clock()
+        try:
+            while True:
+                try:
+                    stage, fraction = next(export)
+                except StopIteration as done:
+                    result = done.value
+                    break
+                if self.current is None or stage != self.current["name"]:
+                    self.enter_stage(stage)
+                yield stage, fraction
+
+            # The written files are the bytes of the last stage
+            if isinstance(result, dict):
+                for path in result.values():
+                    if isinstance(path, str) and os.path.isfile(path):
+                        self.add_bytes(os.path.getsize(path))
+            return result
+        finally:
+            export.close()
+            self.leave_stage()
+            self.total_seconds = self.clock() - self.start_time
+            if started_tracing:
+                tracemalloc.stop()
+
+    """ Returns the profile as a JSON friendly dict """
+    def get_report(self):
+        calls = {}
+        for stage in self.stages:
+            for name, count in stage["backend_calls"].items():
+                calls[name] = calls.get(name, 0) + count
+        return {
+            "total_seconds": self.total_seconds,
+            "peak_rss": get_peak_rss(),
+            "backend_calls": calls,
+            "stages": [dict(stage) for stage in self.stages],
+        }
+
+    def save(self, save_path):
+        with open(save_path, "w") as f:
+            json.dump(self.get_report(), f, indent=4)
+        print(f"[Success] Profile saved to: {save_path}")
+
+    def print_summary(self):
+        calls = sum(sum(stage["backend_calls"].values()) for stage in self.stages)
+        slowest = max(self.stages, key=lambda stage: stage["seconds"], default=None)
+        print(f"Export took {self.total_seconds:.3f} seconds, {calls} backend calls"
+              + (f", mostly {slowest['name']} ({slowest['seconds']:.3f} s)" if slowest else ""))
+
+    def print_report(self):
+        mb = 1024.0 * 1024.0
+        print(f"--- Profile, {self.total_seconds:.3f} seconds ---")
+        for stage in self.stages:
+            calls = sum(stage["backend_calls"].values())
+            peak = stage["peak_traced_bytes"]
+            print(f"{stage['name']:<10}: {stage['seconds']:8.3f} s, "
+                  f"{calls:7d} backend calls ({stage['backend_seconds']:.3f} s), "
+                  f"{stage['bytes'] / mb:8.1f} MB, "
+                  + ("peak n/a" if peak is None else f"peak {peak / mb:.1f} MB"))
@@ -0,0 +1,268 @@
+import os
+
+import numpy as np
+
+from . import VAT_Exporter as vat
+from .VAT_Backend import MayaBackend
+from .VAT_Layout import build_atlas_table, compute_layout, make_texture
+from .VAT_Job import ExportJob
+from .VAT_Profile import ExportProfile
+from .VAT_Tangent import QUATERNION_PACKING, pack_smallest_three, tangent_frames_to_quaternions
+
+#----------------------------------------------------------------
+
+""" Rigid export """
+""" Fractured and multi-part meshes move as rigid pieces, so one pivot and
+    one rotation per piece and frame replace a row of vertex offsets.
+        <name>_pivot   : piece layout, RGB = pivot offset from the rest pivot.
+        <name>_rotation: piece layout, quaternion (x, y, z, w) of the piece,
+                         smallest-three 16 bit PNG for the integer encodings.
+        <name>_piece   : one row in vertex layout, RGB = rest pivot, A = piece id,
+                         always a float32 EXR so the ids stay exact.
+    In the shader:
+        world = rotate(q, rest - rest_pivot) + rest_pivot + pivot_offset
+        normal = rotate(q, rest_normal)
+    Pieces come from
+        shells    : connected shells of the triangles, fitted from the points.
+        meshes    : every mesh is one piece, fitted from the points.
+        transforms: every mesh is one piece, read from the world matrices in
+                    one bulk query per frame, no points are read.
+"""
+
+PIECE_SOURCES = ("shells", "meshes", "transforms")
+
+""" Returns (verts,) shell ids, numbered 0..n-1 in the order of their first vertex """
+def find_shells(nr_of_vtx, triangles):
+    labels = np.arange(nr_of_vtx, dtype=np.int64)
+    edges = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]])
+    # Union-find by label propagation: every vertex takes the smallest label of its edges,
+    # then labels jump to the label of their label until nothing changes
+    while True:
+        a = labels[edges[:, 0]]
+        b = labels[edges[:, 1]]
+        low = np.minimum(a, b)
+        updated = labels.copy()
+        np.minimum.at(updated, a, low)
+        np.minimum.at(updated, b, low)
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    _, piece_ids = np.unique(labels, return_inverse=True)
+    return piece_ids.astype(np.int64)
+
+""" Returns the (verts,) piece id of every vertex of a mesh context """
+def get_piece_ids(context, piece_source):
+    if piece_source == "shells":
+        parts = []
+        nr_of_pieces = 0
+        for mesh, _, _, count in context.iter_meshes():
+            shells = find_shells(count, context.get_triangles(mesh))
+            parts.append(shells + nr_of_pieces)
+            nr_of_pieces += int(shells.max()) + 1 if count else 0
+        return np.concatenate(parts)
+    return np.repeat(np.arange(len(context.meshes), dtype=np.int64), context.vertex_counts)
+
+""" Returns the (pieces, 3) centroids of the points of every piece """
+def get_piece_centroids(points, piece_ids, nr_of_pieces):
+    sums = np.zeros((nr_of_pieces, 3), dtype=np.float64)
+    np.add.at(sums, piece_ids, points)
+    counts = np.bincount(piece_ids, minlength=nr_of_pieces).astype(np.float64)
+    return sums / np.maximum(counts, 1.0)[:, None]
+
+""" Best fitting rotations (pieces, 3, 3) and pivots (pieces, 3) moving the rest points onto the points """
+def fit_rigid_transforms(rest_points, points, piece_ids, rest_pivots):
+    """
+    Kabsch for all pieces at once. Pieces with less than three points that are
+    not on a line keep some valid rotation, their pivot is still exact.
+    """
+    nr_of_pieces = len(rest_pivots)
+    pivots = get_piece_centroids(points, piece_ids, nr_of_pieces)
+    local_rest = rest_points - rest_pivots[piece_ids]
+    local = points - pivots[piece_ids]
+
+    covariance = np.zeros((nr_of_pieces, 3, 3), dtype=np.float64)
+    np.add.at(covariance, piece_ids, local_rest[:, :, None] * local[:, None, :])
+    u, _, vt = np.linalg.svd(covariance)
+    # No reflections
+    d = np.sign(np.linalg.det(np.matmul(u, vt)))
+    d[d == 0] = 1.0
+    vt[:, 2, :] *= d[:, None]
+    rotations = np.matmul(vt.transpose(0, 2, 1), u.transpose(0, 2, 1))
+    return rotations, pivots
+
+""" Relative rotations and pivots of pieces from world matrices (row vector convention, like Maya) """
+def get_matrix_transforms(rest_matrices, matrices, rest_pivots):
+    relative = np.matmul(np.linalg.inv(rest_matrices), matrices)
+    # Rows are the images of the axes, transposed for column vectors; scale is removed
+    u, _, vt = np.linalg.svd(relative[:, :3, :3].transpose(0, 2, 1))
+    rotations = np.matmul(u, vt)
+    pivots = np.einsum("pi,pij->pj", rest_pivots, relative[:, :3, :3]) + relative[:, 3, :3]
+    return rotations, pivots
+
+""" Largest distance between the points and the rest points moved by the piece transforms """
+def get_fit_error(rest_points, points, piece_ids, rest_pivots, rotations, pivots):
+    local_rest = rest_points - rest_pivots[piece_ids]
+    moved = np.einsum("vij,vj->vi", rotations[piece_ids], local_rest) + pivots[piece_ids]
+    return float(np.sqrt(np.max(np.sum((moved - points) ** 2, axis=1)))) if len(points) else 0.0
+
+#----------------------------------------------------------------
+""" Main program """
+#----------------------------------------------------------------
+def make_rigid_texture(output_dir=None, base_filename="output", encoding="float32", mesh_list=None,
+                       backend=None, piece_source="shells", layout_mode=None, max_width=None,
+                       frame_range=None, profile=None, rest_source="bind_frame", rest_frame=None,
+                       progress_fn=None):
+    """
+    piece_source: "shells", "meshes" or "transforms", see the top of this module.
+                  All meshes of mesh_list go into one set of textures.
+    layout_mode / max_width: layout of the piece textures, see VAT_Layout.compute_layout().
+    frame_range / profile / rest_source / rest_frame: see VAT_Exporter.make_dat_texture().
+    The metadata "max_fit_error" is the largest distance between a vertex and its
+    rigidly moved rest position, large values mean the pieces are not rigid.
+    """
+    if profile is None:
+        # Always timed, tracing memory is left to callers that ask for a profile
+        profile = ExportProfile(trace_memory=False)
+    backend = profile.wrap_backend(backend or MayaBackend())
+    export = iter_rigid_export(output_dir, base_filename, encoding, mesh_list, backend, piece_source,
+                               layout_mode, max_width, frame_range, rest_source, rest_frame)
+    paths = ExportJob(profile.track(export)).run(progress_fn)
+    profile.print_summary()
+    return paths
+
+""" Generator version of make_rigid_texture(), see VAT_Job.ExportJob """
+def iter_rigid_export(output_dir=None, base_filename="output", encoding="float32", mesh_list=None,
+                      backend=None, piece_source="shells", layout_mode=None, max_width=None,
+                      frame_range=None, rest_source="bind_frame", rest_frame=None):
+    if encoding not in vat.ENCODINGS:
+        raise ValueError(f"Unknown encoding: {encoding}")
+    if piece_source not in PIECE_SOURCES:
+        raise ValueError(f"Unknown piece source: {piece_source}")
+
+    print("Start generating rigid VAT...")
+    yield "prepare", 0.0
+
+    # All meshes always go into one set of textures
+    setup = vat.prepare_export(output_dir, mesh_list, backend, True, frame_range, rest_source, rest_frame,
+                               layout_mode, max_width)
+    output_dir, backend, mesh_list = setup["output_dir"], setup["backend"], setup["mesh_list"]
+    context = setup["context"]
+    if piece_source == "transforms" and context.rest_frame is None:
+        raise ValueError("The transforms piece source reads the rest matrices at a frame, "
+                         "use the bind_frame or frame rest source.")
+    nr_of_vtx = context.nr_of_vtx
+
+    time_min, frame_range = setup["time_min"], setup["frame_range"]
+    nr_of_frames = len(frame_range)
+
+    rest_points = setup["base_positions"]
+    piece_ids = get_piece_ids(context, piece_source)
+    nr_of_pieces = int(piece_ids.max()) + 1 if nr_of_vtx else 0
+    rest_pivots = get_piece_centroids(rest_points, piece_ids, nr_of_pieces)
+    rest_matrices = None
+    if piece_source == "transforms":
+        backend.set_frame(context.rest_frame)
+        rest_matrices = backend.get_world_matrices(context.shapes)
+    yield "prepare", 1.0
+
+    layout_mode = setup["layout_mode"]
+    layout = compute_layout(nr_of_pieces, nr_of_frames, layout_mode, max_width)
+    vertex_layout = compute_layout(nr_of_vtx, 1, layout_mode, max_width)
+    full_layout = compute_layout(nr_of_vtx, nr_of_frames, layout_mode, max_width)
+    vertex_texels = full_layout["rows_per_frame"] * full_layout["width"]
+    print(f"{nr_of_pieces} pieces from {nr_of_vtx} vertices, {layout['rows_per_frame'] * layout['width']} "
+          f"texels per frame instead of {vertex_texels}")
+
+    # ピースごとのピボットと回転だけを保存する
+    pivot_texture, pivot_buffer = vat.make_float32_buffer(nr_of_frames, nr_of_pieces, layout)
+    rotations = np.empty((nr_of_frames, nr_of_pieces, 3, 3), dtype=np.float64)
+    max_fit_error = 0.0
+    yield "sample", 0.0
+    for i, frame in enumerate(frame_range):
+        backend.set_frame(frame)
+        if piece_source == "transforms":
+            frame_rotations, pivots = get_matrix_transforms(rest_matrices, backend.get_world_matrices(context.shapes),
+                                                            rest_pivots)
+        else:
+            points = np.concatenate([backend.get_points(shape) for shape in context.shapes])
+            frame_rotations, pivots = fit_rigid_transforms(rest_points, points, piece_ids, rest_pivots)
+            max_fit_error = max(max_fit_error, get_fit_error(rest_points, points, piece_ids, rest_pivots,
+                                                             frame_rotations, pivots))
+        rotations[i] = frame_rotations
+        pivot_buffer[i, :, :3] = pivots - rest_pivots
+        yield "sample", (i + 1) / float(nr_of_frames)
+
+    print("Normalizing pivots...")
+    yield "normalize", 0.0
+    offsets = pivot_buffer[:, :, :3]
+    scale_min, scale_max = vat.get_min_max_of_relative_positions_per_axis(offsets, 0.1)
+    position_remapped = encoding in vat.INTEGER_ENCODINGS
+    if position_remapped:
+        vat.remap_float32(offsets, scale_min, scale_max)
+
+    # 回転行列の列は x, y, z 軸の像
+    quaternions = tangent_frames_to_quaternions(rotations[..., :, 2], rotations[..., :, 0])
+    rotation_packing = QUATERNION_PACKING if position_remapped else None
+    if position_remapped:
+        rotation_texture, rotation_buffer = make_texture(layout, 4, np.uint16)
+        rotation_buffer[:] = pack_smallest_three(quaternions)
+    else:
+        rotation_texture, rotation_buffer = make_texture(layout, 4, np.float32)
+        rotation_buffer[:] = quaternions
+    del rotations, quaternions
+
+    piece_texture, piece_buffer = make_texture(vertex_layout, 4, np.float32)
+    piece_buffer[0, :, :3] = rest_pivots[piece_ids]
+    piece_buffer[0, :, 3] = piece_ids
+    yield "normalize", 1.0
+
+    metadata = {
+        "mode": "rigid",
+        "encoding": encoding,
+        "channels": "RGBA",
+        "fps": backend.get_fps(),
+        "frame_start": time_min,
+        "frame_count": nr_of_frames,
+        "vertex_count": nr_of_vtx,
+        "piece_source": piece_source,
+        "piece_count": nr_of_pieces,
+        "position_remapped": position_remapped,
+        "rest_source": context.rest_source,
+        "rest_frame": context.rest_frame,
+        "position_min": scale_min,
+        "position_max": scale_max,
+        "rotation_packing": rotation_packing,
+        "max_fit_error": max_fit_error if piece_source != "transforms" else None,
+        "layout": layout,
+        "vertex_layout": vertex_layout,
+        "meshes": build_atlas_table(mesh_list, context.vertex_counts.tolist()),
+        "frame_remap": None,
+    }
+
+    yield "write", 0.0
+    paths = write_rigid_textures(pivot_texture, rotation_texture, piece_texture, metadata,
+                                 output_dir, base_filename, encoding)
+    print("Done.")
+    return paths
+
+""" Writes the pivot, rotation and piece textures and the metadata, returns the written paths """
+def write_rigid_textures(pivot_texture, rotation_texture, piece_texture, metadata, output_dir,
+                         base_filename, encoding="float32"):
+    base_path = os.path.join(output_dir, base_filename)
+    paths = {"pivot": vat.save_texture(vat.encode_buffer(pivot_texture, encoding),
+                                       base_path + "_pivot", encoding, metadata)}
+    if metadata["rotation_packing"]:
+        paths["rotation"] = base_path + "_rotation.png"
+        vat.save_png(rotation_texture, paths["rotation"])
+    else:
+        paths["rotation"] = vat.save_texture(vat.encode_buffer(rotation_texture, encoding),
+                                             base_path + "_rotation", encoding, metadata)
+    paths["piece"] = vat.save_texture(piece_texture, base_path + "_piece", "float32", metadata)
+    paths["metadata"] = base_path + "_vat.json"
+    vat.save_metadata(metadata, paths["metadata"])
+    return paths
@@ -0,0 +1,215 @@
+import os
+import json
+
+from .VAT_Layout import ENCODINGS, LAYOUT_MODES, compute_layout
+from .VAT_Mesh import REST_SOURCES
+from .VAT_Tangent import FRAME_OUTPUTS
+
+#----------------------------------------------------------------
+
+""" Job specs """
+""" A job spec is a JSON or YAML file like
+    {
+        "output": "D:/vat",
+        "defaults": {"encoding": "float16", "max_width": 4096},
+        "jobs": [
+            {
+                "scene": "D:/shots/crowd_010.mb",
+                "meshes": ["|crowd|agentShape"],
+                "frame_range": [1, 240],
+                "vertex_counts": {"|crowd|agentShape": 5230}
+            }
+        ]
+    }
+    meshes      : all meshes of the scene when missing.
+    frame_range : the playback range of the scene when missing.
+    output      : <spec output>/<scene name> when missing.
+    vertex_counts: only read by the dry run, the scene is opened when missing.
+    Pure Python, nothing here imports Maya.
+"""
+
+NORMAL_SOURCES = ("mesh", "computed")
+
+""" Export options a job can set and their defaults """
+JOB_OPTIONS = {
+    "encoding": "float32",
+    "normal_source": "mesh",
+    "rgb_only": False,
+    "atlas": False,
+    "layout_mode": None,
+    "max_width": None,
+    "frame_tolerance": None,
+    "base_filename": None,
+    "rest_source": "bind_frame",
+    "rest_frame": None,
+    "frame_output": None,
+    "static_tolerance": None,
+    "validate": False,
+    "max_error": None,
+}
+JOB_KEYS = ("scene", "output", "meshes", "frame_range", "vertex_counts") + tuple(JOB_OPTIONS)
+
+""" Bytes per channel of the encodings """
+ENCODING_BYTES = {"float32": 4, "float16": 2, "uint16": 2, "uint8": 1}
+
+""" Reads a JSON or YAML job spec """
+def load_spec(spec_path):
+    extension = os.path.splitext(spec_path)[1].lower()
+    with open(spec_path) as f:
+        if extension in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("YAML job specs need PyYAML: mayapy -m pip install pyyaml")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+""" Returns the problems of one job, an empty list when it is fine """
+def _check_job(job):
+    errors = []
+    unknown = sorted(set(job) - set(JOB_KEYS))
+    if unknown:
+        errors.append(f"unknown keys {unknown}")
+
+    if not isinstance(job.get("scene"), str) or not job.get("scene"):
+        errors.append("'scene' must be a file path")
+    if not isinstance(job.get("output"), str) or not job.get("output"):
+        errors.append("'output' is missing, set it on the job or at the top of the spec")
+
+    meshes = job.get("meshes")
+    if meshes is not None and (not isinstance(meshes, list) or not meshes
+                               or not all(isinstance(m, str) for m in meshes)):
+        errors.append("'meshes' must be a non-empty list of mesh names")
+
+    frame_range = job.get("frame_range")
+    if frame_range is not None and (not isinstance(frame_range, (list, tuple)) or len(frame_range) != 2
+                                    or not all(_is_int(f) for f in frame_range)
+                                    or frame_range[0] > frame_range[1]):
+        errors.append("'frame_range' must be [start, end] with whole frames and start <= end")
+
+    counts = job.get("vertex_counts")
+    if counts is not None and (not isinstance(counts, dict)
+                               or not all(_is_int(c) and c > 0 for c in counts.values())):
+        errors.append("'vertex_counts' must map mesh names to vertex counts")
+
+    if job["encoding"] not in ENCODINGS:
+        errors.append(f"'encoding' must be one of {list(ENCODINGS)}")
+    if job["normal_source"] not in NORMAL_SOURCES:
+        errors.append(f"'normal_source' must be one of {list(NORMAL_SOURCES)}")
+    if job["layout_mode"] is not None and job["layout_mode"] not in LAYOUT_MODES:
+        errors.append(f"'layout_mode' must be one of {list(LAYOUT_MODES)}")
+    if job["max_width"] is not None and not (_is_int(job["max_width"]) and job["max_width"] > 0):
+        errors.append("'max_width' must be a positive whole number")
+    if job["frame_tolerance"] is not None and (not isinstance(job["frame_tolerance"], (int, float))
+                                               or job["frame_tolerance"] < 0):
+        errors.append("'frame_tolerance' must be a number >= 0")
+    if job["static_tolerance"] is not None and (not isinstance(job["static_tolerance"], (int, float))
+                                                or job["static_tolerance"] < 0):
+        errors.append("'static_tolerance' must be a number >= 0")
+    if job["max_error"] is not None and (not isinstance(job["max_error"], (int, float)) or job["max_error"] < 0):
+        errors.append("'max_error' must be a number >= 0")
+    if job["rest_source"] not in REST_SOURCES:
+        errors.append(f"'rest_source' must be one of {list(REST_SOURCES)}")
+    if job["rest_source"] == "frame" and not _is_int(job["rest_frame"]):
+        errors.append("'rest_frame' must be a whole frame when 'rest_source' is \"frame\"")
+    if job["frame_output"] is not None and job["frame_output"] not in FRAME_OUTPUTS:
+        errors.append(f"'frame_output' must be one of {list(FRAME_OUTPUTS)}")
+    for name in ("rgb_only", "atlas", "validate"):
+        if not isinstance(job[name], bool):
+            errors.append(f"'{name}' must be true or false")
+    if job["base_filename"] is not None and not job["atlas"]:
+        errors.append("'base_filename' is only used in atlas mode, other files are named after the mesh")
+    return errors
+
+""" Returns the jobs of a spec with all defaults filled in, raises ValueError listing every problem """
+def validate_spec(spec):
+    if not isinstance(spec, dict) or not isinstance(spec.get("jobs"), list) or not spec["jobs"]:
+        raise ValueError("A job spec needs a non-empty 'jobs' list.")
+    defaults = spec.get("defaults") or {}
+    if not isinstance(defaults, dict):
+        raise ValueError("'defaults' must be a mapping of export options.")
+
+    jobs = []
+    errors = []
+    for i, entry in enumerate(spec["jobs"]):
+        if not isinstance(entry, dict):
+            errors.append(f"job {i}: must be a mapping")
+            continue
+        job = dict(JOB_OPTIONS)
+        job.update(defaults)
+        job.update(entry)
+        if not job.get("output") and spec.get("output") and isinstance(job.get("scene"), str):
+            scene_name = os.path.splitext(os.path.basename(job["scene"]))[0]
+            job["output"] = os.path.join(spec["output"], scene_name)
+        errors.extend(f"job {i} ({job.get('scene')}): {error}" for error in _check_job(job))
+        jobs.append(job)
+
+    if errors:
+        raise ValueError("Invalid job spec:\n  " + "\n  ".join(errors))
+    return jobs
+
+""" Export options of a job, as make_dat_texture() keywords """
+def get_export_options(job):
+    options = {name: job[name] for name in JOB_OPTIONS if name not in ("atlas", "base_filename")}
+    options["frame_range"] = tuple(job["frame_range"]) if job.get("frame_range") else None
+    return options
+
+""" Estimates texture sizes and sampling cost of a job without evaluating the scene """
+def estimate_job(job, vertex_counts, frame_range, seconds_per_frame=None):
+    """
+    vertex_counts: [(mesh, count), ...] of the meshes the job exports.
+    The texture sizes are upper bounds, frame decimation can only shrink them.
+    All meshes of a job share one pass over the frames plus the rest frame: an
+    atlas samples them together, one texture per mesh reads them back from the
+    sample cache of VAT_Batch.export_all_meshes().
+    """
+    nr_of_frames = frame_range[1] - frame_range[0] + 1
+    channels = 3 if job["rgb_only"] else 4
+    layout_mode = job["layout_mode"] or ("wrap" if job["max_width"] else "raw")
+
+    if job["atlas"]:
+        groups = [(job["base_filename"] or "atlas", vertex_counts)]
+    else:
+        groups = [(mesh, [(mesh, count)]) for mesh, count in vertex_counts]
+
+    textures = []
+    peak_sample_bytes = 0
+    for name, group in groups:
+        nr_of_vtx = sum(count for _, count in group)
+        texture = {"name": name, "vertex_count": nr_of_vtx}
+        try:
+            layout = compute_layout(nr_of_vtx, nr_of_frames, layout_mode, job["max_width"])
+            texture["width"] = layout["width"]
+            texture["height"] = layout["height"]
+            # A position and a normal texture, packed quaternions replace the normals
+            texel_bytes = 2 * channels * ENCODING_BYTES[job["encoding"]]
+            if job["frame_output"] == "tangent":
+                texel_bytes += 4 * ENCODING_BYTES[job["encoding"]]
+            elif job["frame_output"] == "quaternion":
+                texel_bytes += 4 * 2 - channels * ENCODING_BYTES[job["encoding"]]
+            texture["bytes"] = layout["width"] * layout["height"] * texel_bytes
+            peak_sample_bytes = max(peak_sample_bytes, 2 * layout["width"] * layout["height"] * 4 * 4)
+        except ValueError as e:
+            texture["error"] = str(e)
+        textures.append(texture)
+
+    scene_evaluations = nr_of_frames + 1
+    reads_per_mesh = 2 if job["normal_source"] == "mesh" else 1
+    backend_calls = scene_evaluations * (1 + reads_per_mesh * len(vertex_counts))
+
+    estimate = {
+        "scene": job["scene"],
+        "frame_count": nr_of_frames,
+        "textures": textures,
+        "texture_bytes": sum(t.get("bytes", 0) for t in textures),
+        "peak_sample_bytes": peak_sample_bytes,
+        "scene_evaluations": scene_evaluations,
+        "backend_calls": backend_calls,
+        "seconds": None,
+    }
+    if seconds_per_frame is not None:
+        estimate["seconds"] = scene_evaluations * seconds_per_frame
+    return estimate
@@ -0,0 +1,323 @@
+import os
+import json
+import shutil
+import tempfile
+
+import numpy as np
+
+from . import VAT_Exporter as vat
+from .VAT_Backend import MayaBackend
+from .VAT_Layout import build_atlas_table, compute_layout
+from .VAT_Job import ExportJob
+from .VAT_Profile import ExportProfile
+
+#----------------------------------------------------------------
+
+""" Streaming export """
+""" For textures that do not fit in memory. The EXR is written a block of
+    frame rows at a time, so peak memory depends on the vertex count and
+    block_frames only, not on the number of frames.
+        direct   : every block is sampled, encoded and appended right away.
+                   Normals use the fixed unit range [-1, 1].
+        two_phase: every block of frames is sampled into its own scratch
+                   file first, which also gives the exact ranges, and the
+                   blocks are then read back, normalized, encoded and appended.
+    Only the EXR encodings can be streamed.
+"""
+
+STREAM_MODES = ("direct", "two_phase")
+DEFAULT_BLOCK_FRAMES = 16
+
+""" Range of unit normals, used when there is no pre-pass """
+UNIT_NORMAL_MIN = [-1.0, -1.0, -1.0]
+UNIT_NORMAL_MAX = [1.0, 1.0, 1.0]
+
+""" Appends scanlines to an EXR, top to bottom """
+class ExrStreamWriter(object):
+    """
+    Uses the scanline API of the OpenEXR bindings, rows go to the file as
+    they are written. Rows that were not written by close() are zero filled,
+    e.g. the padding rows of the pow2 layout.
+    """
+    def __init__(self, save_path, width, height, channels=4, dtype=np.float32, metadata=None):
+        import OpenEXR
+        import Imath
+
+        self.save_path = save_path
+        self.width = width
+        self.height = height
+        self.channel_names = "RGBA"[:channels]
+        self.dtype = np.dtype(dtype)
+        self.rows_written = 0
+
+        header = OpenEXR.Header(width, height)
+        header['compression'] = Imath.Compression(Imath.Compression.ZIP_COMPRESSION)
+        if self.dtype == np.float16:
+            pixel_type = Imath.PixelType(Imath.PixelType.HALF)
+        else:
+            pixel_type = Imath.PixelType(Imath.PixelType.FLOAT)
+        header['channels'] = {name: Imath.Channel(pixel_type) for name in self.channel_names}
+        if metadata:
+            header['vatMetadata'] = json.dumps(metadata).encode("utf-8")
+        self.out = OpenEXR.OutputFile(save_path, header)
+
+    """ Appends (rows, width, channels) to the image """
+    def write_rows(self, rows):
+        nr_of_rows = rows.shape[0]
+        if self.rows_written + nr_of_rows > self.height:
+            raise ValueError(f"Writing {nr_of_rows} rows overflows the image height of {self.height}.")
+        planes = {name: np.ascontiguousarray(rows[:, :, c], dtype=self.dtype).tobytes()
+                  for c, name in enumerate(self.channel_names)}
+        self.out.writePixels(planes, nr_of_rows)
+        self.rows_written += nr_of_rows
+
+    def close(self):
+        if self.out is None:
+            return
+        # Zero rows in blocks, the padding can be as tall as the image
+        padding = np.zeros((min(max(self.height - self.rows_written, 1), 256), self.width,
+                            len(self.channel_names)), dtype=self.dtype)
+        while self.rows_written < self.height:
+            self.write_rows(padding[:self.height - self.rows_written])
+        self.out.close()
+        self.out = None
+        print(f"[Success] EXR file saved to: {self.save_path}")
+
+    """ Closes the file without padding it and deletes it, for failed or cancelled exports """
+    def abort(self):
+        if self.out is None:
+            return
+        try:
+            self.out.close()
+        except Exception:
+            pass
+        self.out = None
+        if os.path.exists(self.save_path):
+            os.remove(self.save_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+""" Returns the layout of a block of frames, same width and rows per frame as the full layout """
+def get_block_layout(layout, nr_of_frames):
+    block_layout = dict(layout)
+    block_layout["frame_count"] = nr_of_frames
+    block_layout["height"] = nr_of_frames * layout["rows_per_frame"]
+    return block_layout
+
+#----------------------------------------------------------------
+""" Main program """
+#----------------------------------------------------------------
+def stream_dat_texture(output_dir=None, base_filename="output", normal_source="mesh",
+                       encoding="float32", rgb_only=False, mesh_list=None, backend=None,
+                       atlas=False, layout_mode=None, max_width=None, cache=None,
+                       mode="direct", block_frames=DEFAULT_BLOCK_FRAMES, scratch_dir=None,
+                       frame_range=None, profile=None, rest_source="bind_frame", rest_frame=None,
+                       progress_fn=None):
+    """
+    Same output as VAT_Exporter.make_dat_texture() with bounded memory.
+    mode: "direct" or "two_phase", see the top of this module.
+    block_frames: frames sampled, encoded and written at once.
+    scratch_dir: where two_phase keeps its scratch files, the cache folder or else the
+                 output folder by default. The system temp folder is often in RAM.
+    frame_range: (start, end) frames to export, the playback range by default.
+    profile / rest_source / rest_frame: see VAT_Exporter.make_dat_texture().
+    Frame decimation needs all frames at once and is not available here.
+    """
+    if profile is None:
+        # Always timed, tracing memory is left to callers that ask for a profile
+        profile = ExportProfile(trace_memory=False)
+    backend = profile.wrap_backend(backend or MayaBackend())
+    export = iter_stream_export(output_dir, base_filename, normal_source, encoding, rgb_only,
+                                mesh_list, backend, atlas, layout_mode, max_width, cache,
+                                mode, block_frames, scratch_dir, frame_range, rest_source, rest_frame)
+    paths = ExportJob(profile.track(export)).run(progress_fn)
+    profile.print_summary()
+    return paths
+
+""" Generator version of stream_dat_texture(), see VAT_Job.ExportJob """
+def iter_stream_export(output_dir=None, base_filename="output", normal_source="mesh",
+                       encoding="float32", rgb_only=False, mesh_list=None, backend=None,
+                       atlas=False, layout_mode=None, max_width=None, cache=None,
+                       mode="direct", block_frames=DEFAULT_BLOCK_FRAMES, scratch_dir=None,
+                       frame_range=None, rest_source="bind_frame", rest_frame=None):
+    if mode not in STREAM_MODES:
+        raise ValueError(f"Unknown stream mode: {mode}")
+    if encoding not in vat.FLOAT_ENCODINGS:
+        raise ValueError(f"Only {', '.join(vat.FLOAT_ENCODINGS)} can be streamed, got {encoding}")
+
+    print("Start streaming VAT...")
+    yield "prepare", 0.0
+
+    setup = vat.prepare_export(output_dir, mesh_list, backend, atlas, frame_range, rest_source, rest_frame,
+                               layout_mode, max_width, normal_source, cache)
+    output_dir, backend, mesh_list = setup["output_dir"], setup["backend"], setup["mesh_list"]
+    context = setup["context"]
+    vtx_counts = context.vertex_counts.tolist()
+    nr_of_vtx = context.nr_of_vtx
+
+    time_min, frame_range = setup["time_min"], setup["frame_range"]
+    nr_of_frames = len(frame_range)
+    base_positions = setup["base_positions"]
+    layout = compute_layout(nr_of_vtx, nr_of_frames, setup["layout_mode"], max_width)
+
+    metadata = {
+        "encoding": encoding,
+        "channels": "RGB" if rgb_only else "RGBA",
+        "fps": backend.get_fps(),
+        "frame_start": time_min,
+        "frame_count": nr_of_frames,
+        "vertex_count": nr_of_vtx,
+        "position_remapped": False,
+        "rest_source": context.rest_source,
+        "rest_frame": context.rest_frame,
+        "position_min": None,
+        "position_max": None,
+        "normal_min": UNIT_NORMAL_MIN,
+        "normal_max": UNIT_NORMAL_MAX,
+        "layout": layout,
+        "meshes": build_atlas_table(mesh_list, vtx_counts),
+        "frame_remap": None,
+    }
+    yield "prepare", 1.0
+
+    sample_args = dict(backend=backend, normal_source=normal_source,
+                       base_positions=base_positions, cache=cache, context=context)
+    paths = {
+        "position": os.path.join(output_dir, base_filename + "_position.exr"),
+        "normal": os.path.join(output_dir, base_filename + "_normal.exr"),
+        "metadata": os.path.join(output_dir, base_filename + "_vat.json"),
+    }
+
+    if scratch_dir is None:
+        scratch_dir = cache.cache_dir if cache is not None else output_dir
+
+    if mode == "direct":
+        yield from iter_direct_blocks(mesh_list, frame_range, layout, metadata, paths,
+                                      encoding, rgb_only, block_frames, sample_args)
+    else:
+        yield from iter_two_phase_blocks(mesh_list, frame_range, layout, metadata, paths,
+                                         encoding, rgb_only, block_frames, sample_args, scratch_dir)
+
+    vat.save_metadata(metadata, paths["metadata"])
+    print("Done.")
+    return paths
+
+""" Opens the position and normal writers of a layout """
+def open_writers(paths, layout, encoding, rgb_only, metadata=None):
+    channels = 3 if rgb_only else 4
+    dtype = np.float16 if encoding == "float16" else np.float32
+    return [ExrStreamWriter(paths[name], layout["width"], layout["height"], channels, dtype, metadata)
+            for name in ("position", "normal")]
+
+""" Closes the writers when the export got through, deletes their files when it failed or was cancelled """
+def close_writers(writers, completed):
+    for writer in writers:
+        if completed:
+            writer.close()
+        else:
+            writer.abort()
+
+""" Encodes the textures of a block and appends them to the writers """
+def write_block(writers, textures, encoding, rgb_only):
+    for writer, texture in zip(writers, textures):
+        writer.write_rows(vat.encode_buffer(texture, encoding, rgb_only))
+
+""" Samples, encodes and appends every block right away """
+def iter_direct_blocks(mesh_list, frame_range, layout, metadata, paths, encoding, rgb_only,
+                       block_frames, sample_args):
+    # The ranges are not known before the last frame, they only go to the json
+    writers = open_writers(paths, layout, encoding, rgb_only)
+    position_min = np.full(3, np.inf)
+    position_max = np.full(3, -np.inf)
+    yield "sample", 0.0
+    completed = False
+    try:
+        for start in range(0, len(frame_range), block_frames):
+            time_stamps = frame_range[start:start + block_frames]
+            block_layout = get_block_layout(layout, len(time_stamps))
+            position_texture, position_buffer = vat.make_float32_buffer(len(time_stamps), layout["vertex_count"], block_layout)
+            normal_texture, normal_buffer = vat.make_float32_buffer(len(time_stamps), layout["vertex_count"], block_layout)
+            offsets, normals = vat.sample_frames(mesh_list, time_stamps, position_out=position_buffer[:, :, :3],
+                                                 normal_out=normal_buffer[:, :, :3], **sample_args)
+
+            position_min = np.minimum(position_min, offsets.min(axis=(0, 1)))
+            position_max = np.maximum(position_max, offsets.max(axis=(0, 1)))
+            np.clip(normals, -1.0, 1.0, out=normals)
+            vat.remap_float32(normals, UNIT_NORMAL_MIN, UNIT_NORMAL_MAX)
+
+            write_block(writers, (position_texture, normal_texture), encoding, rgb_only)
+            yield "sample", (start + len(time_stamps)) / float(len(frame_range))
+        completed = True
+    finally:
+        # GeneratorExit (cancel) and errors leave no zero padded texture behind
+        close_writers(writers, completed)
+
+    metadata["position_min"] = (position_min - 0.1).tolist()
+    metadata["position_max"] = (position_max + 0.1).tolist()
+    yield "write", 1.0
+
+""" Samples block by block into scratch files, then normalizes, encodes and appends block by block """
+def iter_two_phase_blocks(mesh_list, frame_range, layout, metadata, paths, encoding, rgb_only,
+                          block_frames, sample_args, scratch_dir=None):
+    nr_of_frames = len(frame_range)
+    nr_of_vtx = layout["vertex_count"]
+    temp_dir = tempfile.mkdtemp(prefix="vat_scratch_", dir=scratch_dir)
+    try:
+        # Phase 1: one block in memory at a time, every block goes to its own file,
+        # so nothing of the finished blocks stays mapped or dirty
+        position_min = normal_min = np.full(3, np.inf)
+        position_max = normal_max = np.full(3, -np.inf)
+        block_paths = []
+        yield "sample", 0.0
+        for start in range(0, nr_of_frames, block_frames):
+            end = min(start + block_frames, nr_of_frames)
+            offsets = np.empty((end - start, nr_of_vtx, 3), dtype=np.float32)
+            normals = np.empty((end - start, nr_of_vtx, 3), dtype=np.float32)
+            for fraction in vat.iter_sample_frames(mesh_list, frame_range[start:end], position_out=offsets,
+                                                   normal_out=normals, **sample_args):
+                yield "sample", (start + fraction * (end - start)) / float(nr_of_frames)
+
+            position_min = np.minimum(position_min, offsets.min(axis=(0, 1)))
+            position_max = np.maximum(position_max, offsets.max(axis=(0, 1)))
+            normal_min = np.minimum(normal_min, normals.min(axis=(0, 1)))
+            normal_max = np.maximum(normal_max, normals.max(axis=(0, 1)))
+            block_path = os.path.join(temp_dir, f"block_{start}")
+            np.save(block_path + "_offsets.npy", offsets)
+            np.save(block_path + "_normals.npy", normals)
+            block_paths.append((start, end, block_path))
+            del offsets, normals
+
+        yield "normalize", 0.0
+        # Same ranges as VAT_Exporter.get_min_max_of_relative_normals()
+        metadata["position_min"] = (position_min - 0.1).tolist()
+        metadata["position_max"] = (position_max + 0.1).tolist()
+        metadata["normal_min"] = np.minimum(normal_min, -1.0).tolist()
+        metadata["normal_max"] = np.maximum(normal_max, 1.0).tolist()
+        yield "normalize", 1.0
+
+        # Phase 2: the ranges are known, so they also go to the EXR header
+        writers = open_writers(paths, layout, encoding, rgb_only, metadata)
+        completed = False
+        try:
+            for start, end, block_path in block_paths:
+                block_layout = get_block_layout(layout, end - start)
+                position_texture, position_buffer = vat.make_float32_buffer(end - start, nr_of_vtx, block_layout)
+                normal_texture, normal_buffer = vat.make_float32_buffer(end - start, nr_of_vtx, block_layout)
+                position_buffer[:, :, :3] = np.load(block_path + "_offsets.npy")
+                normal_buffer[:, :, :3] = np.load(block_path + "_normals.npy")
+                vat.remap_float32(normal_buffer[:, :, :3], metadata["normal_min"], metadata["normal_max"])
+
+                write_block(writers, (position_texture, normal_texture), encoding, rgb_only)
+                yield "write", end / float(nr_of_frames)
+            completed = True
+        finally:
+            close_writers(writers, completed)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
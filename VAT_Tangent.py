@@ -0,0 +1,146 @@
+import numpy as np
+
+#----------------------------------------------------------------
+
+""" Tangent frames """
+""" Per vertex tangents and rotations derived from the sampled normals,
+    the deformed positions and the UVs. Pure NumPy, every function takes
+    any leading axes (e.g. frames) in front of the vertex axis.
+        tangent   : RGBA = tangent xyz and handedness w (+1 or -1),
+                    bitangent = cross(normal, tangent) * w
+        quaternion: rotation of the frame (tangent, cross(normal, tangent), normal),
+                    it maps +X to the tangent and +Z to the normal.
+"""
+
+FRAME_OUTPUTS = ("tangent", "quaternion")
+
+""" Smallest-three packing of a quaternion into four 16 bit channels
+        RGB: the three smallest components c, stored as (c * sqrt(2) + 1) / 2 * 65535
+        A  : index of the dropped largest component + 4 when the handedness is -1
+    The dropped component is sqrt(1 - dot(c, c)), it is always >= 0.
+"""
+QUATERNION_PACKING = "smallest_three_16"
+SMALLEST_THREE_RANGE = 1.0 / np.sqrt(2.0)
+
+""" Returns (..., verts, 4) unit tangents with handedness from positions, normals, UVs and triangles """
+def compute_vertex_tangents(positions, normals, uvs, triangles):
+    """
+    positions / normals: (..., verts, 3)
+    uvs: (verts, 2), the same for every frame.
+    triangles: (tris, 3) vertex indices into the verts axis.
+    """
+    p0 = positions[..., triangles[:, 0], :]
+    e1 = positions[..., triangles[:, 1], :] - p0
+    e2 = positions[..., triangles[:, 2], :] - p0
+    uv0 = uvs[triangles[:, 0]]
+    duv1 = uvs[triangles[:, 1]] - uv0
+    duv2 = uvs[triangles[:, 2]] - uv0
+
+    # Faces without UV area do not contribute
+    det = duv1[:, 0] * duv2[:, 1] - duv2[:, 0] * duv1[:, 1]
+    inv_det = np.divide(1.0, det, out=np.zeros_like(det), where=np.abs(det) > 1e-12)[:, None]
+    face_tangents = (e1 * duv2[:, 1:2] - e2 * duv1[:, 1:2]) * inv_det
+    face_bitangents = (e2 * duv1[:, 0:1] - e1 * duv2[:, 0:1]) * inv_det
+
+    tangents = np.zeros(positions.shape, dtype=np.float64)
+    bitangents = np.zeros(positions.shape, dtype=np.float64)
+    for corner in range(3):
+        np.add.at(tangents, (Ellipsis, triangles[:, corner], slice(None)), face_tangents)
+        np.add.at(bitangents, (Ellipsis, triangles[:, corner], slice(None)), face_bitangents)
+
+    # Gram-Schmidt against the normal
+    normals = np.asarray(normals, dtype=np.float64)
+    tangents -= normals * np.sum(normals * tangents, axis=-1, keepdims=True)
+    length = np.linalg.norm(tangents, axis=-1, keepdims=True)
+    missing = length[..., 0] <= 1e-12
+    tangents = np.divide(tangents, length, out=np.zeros_like(tangents), where=~missing[..., None])
+
+    # Vertices without UV area get any tangent perpendicular to the normal
+    if np.any(missing):
+        fallback = np.cross(normals, [0.0, 1.0, 0.0])
+        parallel = np.linalg.norm(fallback, axis=-1) < 1e-6
+        fallback[parallel] = np.cross(normals[parallel], [1.0, 0.0, 0.0])
+        fallback /= np.maximum(np.linalg.norm(fallback, axis=-1, keepdims=True), 1e-12)
+        tangents[missing] = fallback[missing]
+
+    handedness = np.where(np.sum(np.cross(normals, tangents) * bitangents, axis=-1) < 0.0, -1.0, 1.0)
+    return np.concatenate([tangents, handedness[..., None]], axis=-1)
+
+""" Returns (..., 4) unit quaternions (x, y, z, w) of the frames (tangent, cross(normal, tangent), normal) """
+def tangent_frames_to_quaternions(normals, tangents):
+    n = np.asarray(normals, dtype=np.float64)
+    t = np.asarray(tangents, dtype=np.float64)[..., :3]
+    b = np.cross(n, t)
+
+    # Rotation matrix columns are t, b, n
+    m00, m10, m20 = t[..., 0], t[..., 1], t[..., 2]
+    m01, m11, m21 = b[..., 0], b[..., 1], b[..., 2]
+    m02, m12, m22 = n[..., 0], n[..., 1], n[..., 2]
+
+    quaternions = np.empty(n.shape[:-1] + (4,), dtype=np.float64)
+    quaternions[..., 3] = 0.5 * np.sqrt(np.maximum(0.0, 1.0 + m00 + m11 + m22))
+    quaternions[..., 0] = np.copysign(0.5 * np.sqrt(np.maximum(0.0, 1.0 + m00 - m11 - m22)), m21 - m12)
+    quaternions[..., 1] = np.copysign(0.5 * np.sqrt(np.maximum(0.0, 1.0 - m00 + m11 - m22)), m02 - m20)
+    quaternions[..., 2] = np.copysign(0.5 * np.sqrt(np.maximum(0.0, 1.0 - m00 - m11 + m22)), m10 - m01)
+    quaternions /= np.linalg.norm(quaternions, axis=-1, keepdims=True)
+    return quaternions
+
+""" Rotates vectors by quaternions, both with matching leading axes """
+def rotate_vectors(quaternions, vectors):
+    q = quaternions[..., :3]
+    w = quaternions[..., 3:4]
+    uv = np.cross(q, vectors)
+    return vectors + 2.0 * (w * uv + np.cross(q, uv))
+
+""" Packs (..., 4) quaternions and their handedness into (..., 4) uint16, see QUATERNION_PACKING """
+def pack_smallest_three(quaternions, handedness=None):
+    largest = np.argmax(np.abs(quaternions), axis=-1)
+    # q and -q are the same rotation, flip so the dropped component is positive
+    sign = np.where(np.take_along_axis(quaternions, largest[..., None], axis=-1) < 0.0, -1.0, 1.0)
+    flipped = quaternions * sign
+
+    # The three components that are kept, in x, y, z, w order
+    order = np.argsort(np.arange(4) == largest[..., None], axis=-1, kind="stable")[..., :3]
+    smallest = np.take_along_axis(flipped, order, axis=-1)
+
+    packed = np.empty(quaternions.shape[:-1] + (4,), dtype=np.uint16)
+    scaled = (np.clip(smallest / SMALLEST_THREE_RANGE, -1.0, 1.0) + 1.0) * 0.5 * 65535.0
+    packed[..., :3] = np.rint(scaled)
+    mirrored = 0 if handedness is None else (np.asarray(handedness) < 0.0)
+    packed[..., 3] = largest + 4 * mirrored
+    return packed
+
+""" Unpacks (..., 4) uint16 into quaternions and handedness, the shader does the same """
+def unpack_smallest_three(packed):
+    packed = np.asarray(packed)
+    largest = packed[..., 3].astype(np.int64) % 4
+    handedness = np.where(packed[..., 3] >= 4, -1.0, 1.0)
+    smallest = (packed[..., :3] / 65535.0 * 2.0 - 1.0) * SMALLEST_THREE_RANGE
+
+    dropped = np.sqrt(np.maximum(0.0, 1.0 - np.sum(smallest * smallest, axis=-1)))
+    quaternions = np.empty(packed.shape[:-1] + (4,), dtype=np.float64)
+    order = np.argsort(np.arange(4) == largest[..., None], axis=-1, kind="stable")
+    np.put_along_axis(quaternions, order[..., :3], smallest, axis=-1)
+    np.put_along_axis(quaternions, order[..., 3:], dropped[..., None], axis=-1)
+    return quaternions, handedness
+
+""" Fills out with tangents or packed quaternions, a block of frames at a time, yields the done fraction """
+def iter_tangent_frames(offsets, normals, base_positions, uvs, triangles, frame_output, out, block_frames=16):
+    """
+    offsets / normals: (frames, verts, 3) as sampled, before any remapping.
+    out: (frames, verts, 4) float32 view for "tangent", uint16 view for "quaternion".
+    """
+    if frame_output not in FRAME_OUTPUTS:
+        raise ValueError(f"Unknown frame output: {frame_output}")
+
+    nr_of_frames = offsets.shape[0]
+    for start in range(0, nr_of_frames, block_frames):
+        end = min(start + block_frames, nr_of_frames)
+        positions = offsets[start:end] + base_positions
+        tangents = compute_vertex_tangents(positions, normals[start:end], uvs, triangles)
+        if frame_output == "tangent":
+            out[start:end] = tangents
+        else:
+            quaternions = tangent_frames_to_quaternions(normals[start:end], tangents)
+            out[start:end] = pack_smallest_three(quaternions, tangents[..., 3])
+        yield end / float(nr_of_frames)
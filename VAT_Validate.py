@@ -0,0 +1,219 @@
+import json
+
+import numpy as np
+
+from .VAT_Tangent import rotate_vectors, unpack_smallest_three
+
+#----------------------------------------------------------------
+
+""" Export validation """
+""" Reads the written textures back a block of frames at a time, decodes
+    them with the ranges, layout, frame remap and column map of the metadata
+    and measures the distance to the animation as it was sampled, before
+    frame decimation and static vertex elimination. Quantization, decimation
+    and dropped vertices all show up as a number per original frame instead
+    of as swimming vertices in the engine.
+    Static vertices are checked for their position, the engine keeps their
+    rest normal, which is not known here.
+"""
+
+DEFAULT_BLOCK_FRAMES = 16
+
+""" Reads rows of an EXR without loading the whole image """
+class ExrRowReader(object):
+    def __init__(self, path):
+        import OpenEXR
+        import Imath
+
+        self.file = OpenEXR.InputFile(path)
+        header = self.file.header()
+        window = header["dataWindow"]
+        self.width = window.max.x - window.min.x + 1
+        self.height = window.max.y - window.min.y + 1
+        self.channel_names = [name for name in "RGBA" if name in header["channels"]]
+        # Half channels are converted to float by the library
+        self.pixel_type = Imath.PixelType(Imath.PixelType.FLOAT)
+
+    """ Returns rows start..end as (rows, width, channels) float32 """
+    def read_rows(self, start, end):
+        planes = [np.frombuffer(self.file.channel(name, self.pixel_type, start, end - 1), dtype=np.float32)
+                  for name in self.channel_names]
+        return np.stack(planes, axis=-1).reshape(end - start, self.width, len(planes))
+
+    def close(self):
+        self.file.close()
+
+""" Reads rows of a PNG, normalized to 0-1 """
+class PngRowReader(object):
+    def __init__(self, path, normalize=True):
+        import cv2
+
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise IOError(f"Could not read PNG file: {path}")
+        # OpenCV returns BGR(A), the whole PNG is decoded but stays in its integer type
+        self.image = image[:, :, [2, 1, 0, 3][:image.shape[2]]]
+        self.height, self.width = self.image.shape[:2]
+        self.scale = 1.0 / np.iinfo(self.image.dtype).max if normalize else 1.0
+
+    def read_rows(self, start, end):
+        return self.image[start:end].astype(np.float32) * np.float32(self.scale)
+
+    def close(self):
+        self.image = None
+
+""" Opens a row reader for a written texture """
+def open_texture(path, normalize=True):
+    if path.lower().endswith(".exr"):
+        return ExrRowReader(path)
+    return PngRowReader(path, normalize)
+
+""" Returns the (frames, verts, channels) texels of frames start..end of a layout """
+def read_frames(reader, layout, start, end):
+    rows_per_frame = layout["rows_per_frame"]
+    rows = reader.read_rows(start * rows_per_frame, end * rows_per_frame)
+    return rows.reshape(end - start, rows_per_frame * layout["width"], -1)[:, :layout["vertex_count"]]
+
+""" Scales 0-1 values back into their range, values without a range are returned as they are """
+def decode_values(values, value_min, value_max):
+    if value_min is None:
+        return values.astype(np.float64)
+    value_min = np.asarray(value_min, dtype=np.float64)
+    return values * (np.asarray(value_max, dtype=np.float64) - value_min) + value_min
+
+""" Collects per frame max and RMS error of a texture """
+class ErrorStats(object):
+    def __init__(self):
+        self.max_error = []
+        self.rms_error = []
+
+    def add(self, decoded, reference):
+        distance = np.linalg.norm(decoded - reference, axis=-1)
+        self.max_error.extend(distance.max(axis=1).tolist())
+        self.rms_error.extend(np.sqrt(np.mean(distance * distance, axis=1)).tolist())
+
+    def get_report(self):
+        if not self.max_error:
+            return None
+        worst_frame = int(np.argmax(self.max_error))
+        return {
+            "max": self.max_error[worst_frame],
+            "rms": float(np.sqrt(np.mean(np.square(self.rms_error)))),
+            "worst_frame": worst_frame,
+            "max_error": self.max_error,
+            "rms_error": self.rms_error,
+        }
+
+""" Returns for frames of the original animation the texture rows to blend and the blend weight """
+def get_frame_rows(frame_remap, nr_of_rows, start, end):
+    if frame_remap is None:
+        rows = np.arange(start, end, dtype=np.float64)
+    else:
+        rows = np.asarray(frame_remap[start:end], dtype=np.float64)
+    row0 = np.minimum(np.floor(rows).astype(np.int64), nr_of_rows - 1)
+    row1 = np.minimum(row0 + 1, nr_of_rows - 1)
+    return row0, row1, (rows - row0)[:, None, None]
+
+""" Decodes the texels of original frames start..end, blending the rows like the runtime """
+def read_original_frames(reader, layout, rows, decode_fn):
+    row0, row1, t = rows
+    first = int(row0.min())
+    values = decode_fn(read_frames(reader, layout, first, int(row1.max()) + 1))
+    return values[row0 - first] * (1.0 - t) + values[row1 - first] * t
+
+""" Compares the written textures to the sampled animation, yields the done fraction and returns the report """
+def iter_validate(paths, metadata, offsets, normals, max_error=None, block_frames=DEFAULT_BLOCK_FRAMES,
+                  reference_remapped=False):
+    """
+    paths: written files as returned by VAT_Exporter.write_textures().
+    offsets / normals: (frames, verts, 3) as sampled, every frame and every vertex.
+    reference_remapped: the samples were remapped into 0-1 in place like the texture,
+                        they are decoded with the ranges of the metadata first.
+    max_error: largest position or normal distance allowed, in scene units.
+    """
+    layout = metadata["layout"]
+    nr_of_rows = layout["frame_count"]
+    nr_of_frames = offsets.shape[0]
+    frame_remap = metadata.get("frame_remap")
+    position_min = metadata["position_min"] if metadata["position_remapped"] else None
+    position_max = metadata["position_max"]
+    normal_min = metadata["normal_min"]
+    normal_max = metadata["normal_max"]
+
+    # Texture column of every vertex, -1 for static vertices that keep their rest pose
+    moving = None
+    if paths.get("columns"):
+        column_map = np.fromfile(paths["columns"], dtype="<i4")
+        moving = np.flatnonzero(column_map >= 0)
+        columns = column_map[moving]
+
+    readers = {"position": open_texture(paths["position"])}
+    if paths.get("normal"):
+        readers["normal"] = open_texture(paths["normal"])
+    if paths.get("rotation"):
+        # Packed quaternions are decoded from their integer values
+        readers["rotation"] = open_texture(paths["rotation"], normalize=False)
+
+    def decode_rotations(texels):
+        quaternions, _ = unpack_smallest_three(texels)
+        return rotate_vectors(quaternions, np.broadcast_to([0.0, 0.0, 1.0], quaternions.shape[:-1] + (3,)))
+
+    decoders = {
+        "position": lambda texels: decode_values(texels[..., :3], position_min, position_max),
+        "normal": lambda texels: decode_values(texels[..., :3], normal_min, normal_max),
+        "rotation": decode_rotations,
+    }
+    stats = {"position": ErrorStats(), "normal": ErrorStats()}
+    try:
+        for start in range(0, nr_of_frames, block_frames):
+            end = min(start + block_frames, nr_of_frames)
+            rows = get_frame_rows(frame_remap, nr_of_rows, start, end)
+
+            reference = offsets[start:end]
+            if reference_remapped:
+                reference = decode_values(reference, position_min, position_max)
+            decoded = read_original_frames(readers["position"], layout, rows, decoders["position"])
+            if moving is not None:
+                expanded = np.zeros(reference.shape, dtype=np.float64)
+                expanded[:, moving] = decoded[:, columns]
+                decoded = expanded
+            stats["position"].add(decoded, reference)
+
+            for name in ("normal", "rotation"):
+                if name not in readers:
+                    continue
+                reference = normals[start:end]
+                if reference_remapped and name == "normal":
+                    reference = decode_values(reference, normal_min, normal_max)
+                decoded = read_original_frames(readers[name], layout, rows, decoders[name])
+                if moving is not None:
+                    reference = reference[:, moving]
+                    decoded = decoded[:, columns]
+                stats["normal"].add(decoded, np.asarray(reference, dtype=np.float64))
+            yield end / float(nr_of_frames)
+    finally:
+        for reader in readers.values():
+            reader.close()
+
+    report = {name: stat.get_report() for name, stat in stats.items()}
+    worst = max(r["max"] for r in report.values() if r)
+    report["frame_start"] = metadata["frame_start"]
+    report["max_error_allowed"] = max_error
+    report["passed"] = max_error is None or worst <= max_error
+    return report
+
+""" Prints a short summary of a validation report """
+def print_report(report):
+    for name in ("position", "normal"):
+        stat = report.get(name)
+        if stat:
+            print(f"{name:<8} error: max {stat['max']:.6g} (frame {report['frame_start'] + stat['worst_frame']}), "
+                  f"rms {stat['rms']:.6g}")
+    if report["max_error_allowed"] is not None:
+        print(("[Success]" if report["passed"] else "[Failed]")
+              + f" Validation with max error {report['max_error_allowed']}")
+
+def save_report(report, save_path):
+    with open(save_path, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"[Success] Validation report saved to: {save_path}")
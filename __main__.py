@@ -0,0 +1,5 @@
+import sys
+
+from .VAT_Cli import main
+
+sys.exit(main())
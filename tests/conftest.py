@@ -0,0 +1,26 @@
+import os
+import sys
+import importlib.util
+
+import pytest
+
+# The repository folder is the package, import it under its usual name
+# whatever the checkout is called
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "Maya_VAT_Exporter"
+
+if PACKAGE not in sys.modules:
+    spec = importlib.util.spec_from_file_location(PACKAGE, os.path.join(ROOT, "__init__.py"),
+                                                  submodule_search_locations=[ROOT])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = package
+    spec.loader.exec_module(package)
+
+
+@pytest.fixture
+def worker_pythonpath(tmp_path_factory, monkeypatch):
+    """ Lets worker processes (python -m Maya_VAT_Exporter...) import the package too """
+    folder = tmp_path_factory.mktemp("workers")
+    os.symlink(ROOT, os.path.join(str(folder), PACKAGE))
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join(filter(None, [str(folder), os.environ.get("PYTHONPATH")])))
+    return str(folder)
@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+import pytest
+
+from Maya_VAT_Exporter.VAT_Backend import SyntheticBackend
+from Maya_VAT_Exporter.VAT_Exporter import make_dat_texture, sample_frames
+from Maya_VAT_Exporter.VAT_Layout import build_atlas_table, get_texel
+
+MESHES = {"cloth": 30, "flag": 7, "rope": 12}
+FRAMES = [0, 1, 2, 5, 9]
+
+
+def test_atlas_table_offsets():
+    table = build_atlas_table(list(MESHES), list(MESHES.values()))
+    assert table == [
+        {"mesh": "cloth", "offset": 0, "length": 30},
+        {"mesh": "flag", "offset": 30, "length": 7},
+        {"mesh": "rope", "offset": 37, "length": 12},
+    ]
+
+
+def test_atlas_table_follows_mesh_list_order():
+    # Packing is the order of the mesh list, not sorted or by size
+    table = build_atlas_table(["rope", "cloth"], [12, 30])
+    assert [(row["mesh"], row["offset"]) for row in table] == [("rope", 0), ("cloth", 12)]
+    assert table == build_atlas_table(["rope", "cloth"], np.array([12, 30]))
+
+
+def test_atlas_samples_are_the_meshes_side_by_side():
+    backend = SyntheticBackend(MESHES)
+    positions, normals = sample_frames(list(MESHES), FRAMES, backend=backend)
+
+    table = build_atlas_table(list(MESHES), list(MESHES.values()))
+    for row in table:
+        mesh_positions, mesh_normals = sample_frames([row["mesh"]], FRAMES, backend=SyntheticBackend(MESHES))
+        span = slice(row["offset"], row["offset"] + row["length"])
+        np.testing.assert_array_equal(positions[:, span], mesh_positions)
+        np.testing.assert_array_equal(normals[:, span], mesh_normals)
+
+
+def test_texel_with_offset():
+    # Vertex 3 of a mesh at offset 30 is texel 33 of the atlas
+    assert get_texel(3, 2, 16, 3, offset=30) == get_texel(33, 2, 16, 3)
+    assert get_texel(3, 2, 16, 3, offset=30) == (1, 2 * 3 + 2)
+
+
+def test_atlas_export_places_every_mesh_at_its_offset(tmp_path):
+    pytest.importorskip("OpenEXR")
+    from Maya_VAT_Exporter.VAT_Validate import ExrRowReader
+
+    backend = SyntheticBackend(MESHES, playback_range=(0, 9))
+    paths = make_dat_texture(str(tmp_path), "atlas", mesh_list=list(MESHES), backend=backend,
+                             atlas=True, max_width=16)
+    with open(paths["metadata"]) as f:
+        metadata = json.load(f)
+    layout = metadata["layout"]
+    assert metadata["meshes"] == build_atlas_table(list(MESHES), list(MESHES.values()))
+    assert layout["rows_per_frame"] == 4
+
+    reader = ExrRowReader(paths["position"])
+    texture = reader.read_rows(0, layout["height"])
+    reader.close()
+
+    frames = list(range(10))
+    for row in metadata["meshes"]:
+        mesh_backend = SyntheticBackend(MESHES)
+        points, _ = sample_frames([row["mesh"]], frames, backend=mesh_backend)
+        offsets = points - points[0]
+        for frame in (0, 4, 9):
+            for vertex in (0, row["length"] - 1):
+                x, y = get_texel(vertex, frame, layout["width"], layout["rows_per_frame"], row["offset"])
+                np.testing.assert_allclose(texture[y, x, :3], offsets[frame, vertex], atol=1e-6)
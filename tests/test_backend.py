@@ -0,0 +1,134 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from Maya_VAT_Exporter import VAT_Backend
+from Maya_VAT_Exporter.VAT_Mesh import MeshContext
+
+
+class FakeDagCmds(object):
+    """ A transform |body with a deformed shape and its Orig intermediate shape """
+    NODES = {
+        "|body": ("transform", None),
+        "|body|bodyShape": ("mesh", "|body"),
+        "|body|bodyShapeOrig": ("mesh", "|body"),
+    }
+    INTERMEDIATE = {"|body|bodyShapeOrig"}
+    POINTS = {
+        "|body|bodyShape": [[0.0, 1.0, 0.0], [1.0, 1.0, 0.0]],
+        "|body|bodyShapeOrig": [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]],
+    }
+
+    def nodeType(self, node):
+        return self.NODES[node][0]
+
+    def listRelatives(self, node, shapes=False, parent=False, noIntermediate=False, fullPath=False):
+        if parent:
+            return [self.NODES[node][1]] if self.NODES[node][1] else None
+        if self.NODES[node][0] != "transform":
+            # Like Maya, a shape has no shapes below it
+            return None
+        children = [name for name, (_, owner) in self.NODES.items() if owner == node]
+        if noIntermediate:
+            children = [name for name in children if name not in self.INTERMEDIATE]
+        return children or None
+
+    def getAttr(self, plug):
+        return plug.split(".")[0] in self.INTERMEDIATE
+
+    def polyEvaluate(self, mesh, vertex=False):
+        return len(self.POINTS[mesh])
+
+    def xform(self, query, **kwargs):
+        return np.ravel(self.POINTS[query.split(".vtx")[0]]).tolist()
+
+
+@pytest.fixture
+def maya_backend(monkeypatch):
+    monkeypatch.setattr(VAT_Backend, "cmds", FakeDagCmds())
+    return VAT_Backend.MayaBackend()
+
+
+@pytest.mark.parametrize("mesh", ["|body", "|body|bodyShape"])
+def test_intermediate_shape_of_transform_or_shape(maya_backend, mesh):
+    assert maya_backend.get_intermediate_shape(mesh) == "|body|bodyShapeOrig"
+
+
+def test_intermediate_rest_source_with_shape_nodes(maya_backend):
+    # What list_meshes() hands to a batch export
+    context = MeshContext(["|body|bodyShape"], maya_backend, rest_source="intermediate")
+    np.testing.assert_array_equal(context.get_rest_points(), [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]])
+
+
+FRAMES = range(5, 9)
+
+
+def cache_points(frame):
+    """ Three vertices shifted by the frame number """
+    return np.arange(9, dtype=np.float32).reshape(3, 3) + frame
+
+
+def write_archive(path):
+    path = path / "cloth.npz"
+    np.savez(str(path), **{
+        "cloth.points": np.stack([cache_points(f) for f in FRAMES]),
+        "cloth.triangles": np.array([[0, 1, 2]]),
+        "fps": 30.0,
+        "frame_start": FRAMES[0],
+    })
+    return str(path)
+
+
+def write_folder(path, frames=FRAMES):
+    os.makedirs(str(path / "cloth"))
+    for f in frames:
+        np.save(str(path / "cloth" / f"points.{f}.npy"), cache_points(f))
+    np.save(str(path / "cloth" / "triangles.npy"), np.array([[0, 1, 2]]))
+    with open(str(path / "cache.json"), "w") as f:
+        json.dump({"fps": 30.0}, f)
+    return str(path)
+
+
+@pytest.mark.parametrize("write", [write_archive, write_folder])
+def test_point_cache_formats(tmp_path, write):
+    backend = VAT_Backend.PointCacheBackend(write(tmp_path))
+
+    assert backend.list_meshes() == ["cloth"]
+    assert backend.get_playback_range() == (5, 8)
+    assert backend.get_fps() == 30.0
+    assert backend.get_vertex_count("cloth") == 3
+    np.testing.assert_array_equal(backend.get_triangles("cloth"), [[0, 1, 2]])
+    for f in FRAMES:
+        backend.set_frame(f)
+        np.testing.assert_array_equal(backend.get_points("cloth"), cache_points(f))
+    with pytest.raises(RuntimeError):
+        backend.get_normals("cloth")
+
+
+@pytest.mark.parametrize("write", [write_archive, write_folder])
+def test_point_cache_holds_first_and_last_frame(tmp_path, write):
+    backend = VAT_Backend.PointCacheBackend(write(tmp_path))
+
+    backend.set_frame(-10)
+    np.testing.assert_array_equal(backend.get_points("cloth"), cache_points(5))
+    backend.set_frame(7.4)
+    np.testing.assert_array_equal(backend.get_points("cloth"), cache_points(7))
+    backend.set_frame(100)
+    np.testing.assert_array_equal(backend.get_points("cloth"), cache_points(8))
+
+
+def test_point_cache_folder_with_missing_frame(tmp_path):
+    write_folder(tmp_path, frames=[5, 6, 8])
+    with pytest.raises(ValueError, match="are not the same unbroken range"):
+        VAT_Backend.PointCacheBackend(str(tmp_path))
+
+
+def test_point_cache_folder_with_mismatched_meshes(tmp_path):
+    write_folder(tmp_path)
+    os.makedirs(str(tmp_path / "cape"))
+    for f in range(6, 10):
+        np.save(str(tmp_path / "cape" / f"points.{f}.npy"), cache_points(f))
+    with pytest.raises(ValueError, match="are not the same unbroken range"):
+        VAT_Backend.PointCacheBackend(str(tmp_path))
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import types
+
+import pytest
+
+from Maya_VAT_Exporter import VAT_Backend, VAT_Batch
+from Maya_VAT_Exporter.VAT_Backend import SyntheticBackend
+from Maya_VAT_Exporter.VAT_Batch import batch_export_scenes, export_all_meshes
+from Maya_VAT_Exporter.VAT_Cache import SampleCache
+
+MESHES = {"body": 16, "cape": 9, "hair": 4}
+
+
+class CountingBackend(SyntheticBackend):
+    """ Remembers every frame it was set to """
+    def __init__(self, *args, **kwargs):
+        super(CountingBackend, self).__init__(*args, **kwargs)
+        self.set_frames = []
+
+    def set_frame(self, frame):
+        self.set_frames.append(frame)
+        super(CountingBackend, self).set_frame(frame)
+
+
+@pytest.fixture(autouse=True)
+def needs_openexr():
+    pytest.importorskip("OpenEXR")
+
+
+def test_timeline_is_scrubbed_once_for_all_meshes(tmp_path):
+    backend = CountingBackend(MESHES, playback_range=(1, 6))
+    results = export_all_meshes(str(tmp_path), backend=backend)
+
+    assert [result["status"] for result in results] == ["ok"] * len(MESHES)
+    # The bind frame and the playback range, once each
+    assert sorted(backend.set_frames) == [0, 1, 2, 3, 4, 5, 6]
+    for mesh in MESHES:
+        assert os.path.exists(os.path.join(str(tmp_path), mesh + "_position.exr"))
+
+
+def test_given_cache_is_filled_and_kept(tmp_path):
+    cache = SampleCache(str(tmp_path / "cache"))
+    backend = CountingBackend(MESHES, playback_range=(0, 3))
+    export_all_meshes(str(tmp_path / "out"), backend=backend, cache=cache)
+    assert sorted(backend.set_frames) == [0, 1, 2, 3]
+
+    # A second batch finds everything in the cache
+    backend.set_frames = []
+    export_all_meshes(str(tmp_path / "out"), backend=backend, cache=cache)
+    assert backend.set_frames == []
+
+
+def test_broken_mesh_falls_back_to_one_export_per_mesh(tmp_path):
+    backend = CountingBackend(MESHES, playback_range=(0, 2))
+    results = export_all_meshes(str(tmp_path), backend=backend, mesh_list=["body", "missing", "hair"])
+
+    assert [result["status"] for result in results] == ["ok", "failed", "ok"]
+    # Each good mesh scrubbed the timeline on its own
+    assert sorted(backend.set_frames) == [0, 0, 1, 1, 2, 2]
+
+
+def test_temporary_cache_is_deleted(tmp_path, monkeypatch):
+    temp_dir = str(tmp_path / "temp")
+    monkeypatch.setattr(VAT_Batch.tempfile, "mkdtemp", lambda prefix: temp_dir)
+    export_all_meshes(str(tmp_path / "out"), backend=CountingBackend(MESHES, playback_range=(0, 2)))
+    assert not os.path.exists(temp_dir)
+
+
+def test_maya_lists_deformed_and_referenced_shapes(monkeypatch):
+    shapes = ["|body|bodyShape", "|ref:rig|ref:rigShape"]
+    calls = []
+
+    def ls(**kwargs):
+        calls.append(kwargs)
+        return list(shapes)
+
+    cmds = types.SimpleNamespace(ls=ls, referenceQuery=lambda node, isNodeReferenced: node.startswith("|ref:"))
+    monkeypatch.setattr(VAT_Backend, "cmds", cmds)
+    backend = VAT_Backend.MayaBackend()
+
+    assert backend.list_meshes() == shapes
+    assert calls[0] == {"type": "mesh", "noIntermediate": True, "long": True}
+    assert backend.list_meshes(referenced=False) == ["|body|bodyShape"]
+
+
+def test_scheduler_runs_a_worker_per_scene(tmp_path, worker_pythonpath):
+    report_path = str(tmp_path / "report.json")
+    report = batch_export_scenes(["shot_010.ma", "shot_020.ma"], str(tmp_path), workers=2, timeout=60,
+                                 executable=sys.executable, backend_name="synthetic", report_path=report_path)
+
+    assert (report["succeeded"], report["failed"], report["timed_out"]) == (2, 0, 0)
+    for job, name in zip(report["jobs"], ("shot_010", "shot_020")):
+        assert job["output_dir"] == os.path.join(str(tmp_path), name)
+        assert [mesh["status"] for mesh in job["meshes"]] == ["ok"]
+        assert os.path.exists(os.path.join(job["output_dir"], "synthetic_position.exr"))
+    with open(report_path) as f:
+        assert json.load(f)["succeeded"] == 2
+
+
+def test_scheduler_counts_failed_and_timed_out_workers(tmp_path, worker_pythonpath):
+    if sys.platform.startswith("win"):
+        pytest.skip("Uses a shell script as the worker")
+    # Runs the real worker, except for scenes named broken (crashes) or slow (hangs)
+    worker = tmp_path / "worker"
+    worker.write_text("#!/bin/sh\n"
+                      "case \"$*\" in\n"
+                      "    *broken*) echo \"RuntimeError: scene is broken\" >&2; exit 1;;\n"
+                      "    *slow*) exec sleep 60;;\n"
+                      "esac\n"
+                      f"exec \"{sys.executable}\" \"$@\"\n")
+    os.chmod(str(worker), 0o755)
+
+    scenes = ["good.ma", "broken.ma", "slow.ma"]
+    report = batch_export_scenes(scenes, str(tmp_path), workers=3, timeout=10, executable=str(worker),
+                                 backend_name="synthetic")
+
+    assert (report["succeeded"], report["failed"], report["timed_out"]) == (1, 1, 1)
+    jobs = {os.path.basename(job["scene"]): job for job in report["jobs"]}
+    assert jobs["good.ma"]["status"] == "ok"
+    assert jobs["broken.ma"]["error"] == "RuntimeError: scene is broken"
+    assert jobs["slow.ma"]["status"] == "timeout"
@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+
+from Maya_VAT_Exporter.VAT_Cache import SampleCache, hash_topology
+
+
+def make_frame(value, count=4):
+    points = np.full((count, 3), value, dtype=np.float64)
+    normals = np.zeros((count, 3), dtype=np.float64)
+    normals[:, 1] = 1.0
+    return points, normals
+
+
+def age_files(cache, seconds):
+    # File mtimes are the access times, move them into the past
+    for name in os.listdir(cache.cache_dir):
+        path = os.path.join(cache.cache_dir, name)
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+
+
+def test_round_trip(tmp_path):
+    cache = SampleCache(str(tmp_path))
+    key = cache.make_key("|body|bodyShape", "topology", "animation")
+    points, normals = make_frame(2.5)
+    cache.put(key, 12, points, normals)
+
+    cached_points, cached_normals = cache.get(key, 12)
+    np.testing.assert_array_equal(cached_points, points)
+    np.testing.assert_array_equal(cached_normals, normals)
+    assert cache.get(key, 13) is None
+    # A new cache on the same folder finds the files
+    assert SampleCache(str(tmp_path)).total_bytes == cache.total_bytes > 0
+
+
+def test_keys_tell_mesh_states_apart(tmp_path):
+    cache = SampleCache(str(tmp_path))
+    triangles = np.array([[0, 1, 2]])
+    base = ("mesh", hash_topology(3, triangles), "animation", "mesh")
+    variants = [
+        ("other", base[1], base[2], base[3]),
+        (base[0], hash_topology(4, triangles), base[2], base[3]),
+        (base[0], hash_topology(3, triangles[:, ::-1]), base[2], base[3]),
+        (base[0], base[1], "new keys", base[3]),
+        (base[0], base[1], base[2], "computed"),
+    ]
+    keys = [cache.make_key(*base)] + [cache.make_key(*variant) for variant in variants]
+    assert len(set(keys)) == len(keys)
+    assert cache.make_key(*base) == keys[0]
+
+    cache.put(keys[0], 0, *make_frame(1.0))
+    assert all(cache.get(key, 0) is None for key in keys[1:])
+
+
+def test_large_frames_get_their_own_files(tmp_path):
+    cache = SampleCache(str(tmp_path))
+    key = cache.make_key("mesh", "topology", "animation")
+    cache.put(key, 1000000, *make_frame(1.0))
+    cache.put(key, 1000001, *make_frame(2.0))
+    cache.put(key, 2.5, *make_frame(3.0))
+
+    assert cache.get(key, 1000000)[0][0, 0] == 1.0
+    assert cache.get(key, 1000001)[0][0, 0] == 2.0
+    assert cache.get(key, 2.5)[0][0, 0] == 3.0
+    assert len(os.listdir(str(tmp_path))) == 6
+
+
+def test_least_recently_used_frames_are_evicted(tmp_path):
+    cache = SampleCache(str(tmp_path))
+    key = cache.make_key("mesh", "topology", "animation")
+    cache.put(key, 0, *make_frame(0.0))
+    frame_bytes = cache.total_bytes
+    cache.max_bytes = 3 * frame_bytes
+    cache.put(key, 1, *make_frame(1.0))
+    cache.put(key, 2, *make_frame(2.0))
+    age_files(cache, 100)
+
+    # Reading frame 0 makes frame 1 the oldest
+    assert cache.get(key, 0) is not None
+    cache.put(key, 3, *make_frame(3.0))
+
+    assert cache.get(key, 1) is None
+    assert all(cache.get(key, frame) is not None for frame in (0, 2, 3))
+    assert cache.total_bytes == 3 * frame_bytes
+
+
+def test_clear(tmp_path):
+    cache = SampleCache(str(tmp_path))
+    key = cache.make_key("mesh", "topology", "animation")
+    for frame in range(3):
+        cache.put(key, frame, *make_frame(frame))
+    cache.clear()
+
+    assert cache.total_bytes == 0
+    assert os.listdir(str(tmp_path)) == []
+    assert cache.get(key, 0) is None
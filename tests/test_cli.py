@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pytest
+
+from Maya_VAT_Exporter.VAT_Backend import make_grid_triangles
+from Maya_VAT_Exporter.VAT_Cli import main
+
+
+def write_point_cache(path, nr_of_frames=4):
+    points = np.zeros((nr_of_frames, 9, 3), dtype=np.float32)
+    points[:, :, 0] = np.arange(9) % 3
+    points[:, :, 2] = np.arange(9) // 3
+    points[:, :, 1] = np.arange(nr_of_frames)[:, None] * 0.1
+    normals = np.zeros_like(points)
+    normals[..., 1] = 1.0
+    np.savez(path, **{"cloth.points": points, "cloth.normals": normals,
+                      "cloth.triangles": make_grid_triangles(9, 3), "fps": 24.0})
+
+
+@pytest.fixture
+def spec_path(tmp_path):
+    write_point_cache(str(tmp_path / "good.npz"))
+    spec = {
+        "output": str(tmp_path / "out"),
+        "jobs": [{"scene": str(tmp_path / "missing.npz")}, {"scene": str(tmp_path / "good.npz")}],
+    }
+    path = tmp_path / "spec.json"
+    path.write_text(json.dumps(spec))
+    return str(path)
+
+
+def test_missing_scene_fails_only_its_job(tmp_path, spec_path):
+    pytest.importorskip("OpenEXR")
+    report_path = str(tmp_path / "report.json")
+    assert main([spec_path, "--backend", "cache", "--report", report_path]) == 1
+
+    with open(report_path) as f:
+        report = json.load(f)
+    assert [entry["scene"] for entry in report] == [str(tmp_path / "missing.npz"), str(tmp_path / "good.npz")]
+    assert report[0]["results"][0]["status"] == "failed"
+    assert "missing.npz" in report[0]["results"][0]["error"]
+    assert [result["status"] for result in report[1]["results"]] == ["ok"]
+    assert (tmp_path / "out" / "good" / "cloth_position.exr").exists()
+
+
+def test_dry_run_reports_the_missing_scene(tmp_path, spec_path):
+    report_path = str(tmp_path / "report.json")
+    assert main([spec_path, "--backend", "cache", "--dry-run", "--report", report_path]) == 1
+
+    with open(report_path) as f:
+        report = json.load(f)
+    assert "error" in report[0]
+    assert report[1]["frame_count"] == 4
+    assert report[1]["textures"][0]["vertex_count"] == 9
+
+
+def test_estimate_counts_one_pass_for_all_meshes():
+    from Maya_VAT_Exporter.VAT_Spec import estimate_job, validate_spec
+
+    counts = [("body", 100), ("cape", 50), ("hair", 20)]
+    for atlas in (False, True):
+        job = validate_spec({"jobs": [{"scene": "shot.mb", "output": "out", "atlas": atlas}]})[0]
+        estimate = estimate_job(job, counts, (1, 10), seconds_per_frame=0.5)
+
+        assert len(estimate["textures"]) == (1 if atlas else 3)
+        assert estimate["scene_evaluations"] == 11
+        # A frame change and points and normals of every mesh per evaluation
+        assert estimate["backend_calls"] == 11 * (1 + 2 * 3)
+        assert estimate["seconds"] == 5.5
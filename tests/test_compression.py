@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+from Maya_VAT_Exporter.VAT_Backend import make_grid_triangles
+from Maya_VAT_Exporter.VAT_Compression import decimate_frames, find_key_frames, find_moving_vertices, get_max_offsets
+
+
+def make_offsets(max_offsets, nr_of_frames=13):
+    """ Offsets along x that reach max_offsets[v] at the middle frame """
+    ramp = np.sin(np.linspace(0.0, np.pi, nr_of_frames))[:, None]
+    offsets = np.zeros((nr_of_frames, len(max_offsets), 3), dtype=np.float32)
+    offsets[:, :, 0] = ramp * np.asarray(max_offsets, dtype=np.float32)
+    return offsets
+
+
+def test_max_offsets_over_chunks():
+    offsets = make_offsets([0.0, 1.0, 3.0], nr_of_frames=101)
+    np.testing.assert_allclose(get_max_offsets(offsets, chunk_frames=7), [0.0, 1.0, 3.0], atol=1e-6)
+
+
+def test_tolerance_boundary():
+    offsets = np.zeros((4, 3, 3), dtype=np.float64)
+    offsets[2, 0, 1] = 0.5
+    offsets[2, 1, 1] = 0.5 + 1e-9
+    sparse = find_moving_vertices(offsets, 0.5)
+
+    # Exactly at the tolerance is still static
+    np.testing.assert_array_equal(sparse["moving_vertices"], [1])
+    assert sparse["max_static_offset"] == 0.5
+
+
+def test_column_map():
+    offsets = make_offsets([0.0, 2.0, 0.0, 0.0, 1.0, 3.0])
+    sparse = find_moving_vertices(offsets, 0.1)
+
+    np.testing.assert_array_equal(sparse["moving_vertices"], [1, 4, 5])
+    assert sparse["column_map"].dtype == np.int32
+    np.testing.assert_array_equal(sparse["column_map"], [-1, 0, -1, -1, 1, 2])
+    assert sparse["moving_ratio"] == 0.5
+    assert sparse["max_static_offset"] == 0.0
+
+
+def test_neighbours_of_moving_vertices_are_kept():
+    # 4 x 4 grid, only the corner vertex 0 moves
+    triangles = make_grid_triangles(16, 4)
+    max_offsets = np.zeros(16)
+    max_offsets[0] = 1.0
+    sparse = find_moving_vertices(make_offsets(max_offsets), 0.1, triangles)
+
+    neighbours = np.unique(triangles[(triangles == 0).any(axis=1)])
+    np.testing.assert_array_equal(sparse["moving_vertices"], neighbours)
+    assert 15 not in sparse["moving_vertices"]
+    np.testing.assert_array_equal(sparse["column_map"][neighbours], np.arange(len(neighbours)))
+
+
+def test_max_static_offset():
+    offsets = make_offsets([0.02, 0.05, 1.0, 0.0], nr_of_frames=9)
+    sparse = find_moving_vertices(offsets, 0.1)
+    assert sparse["max_static_offset"] == pytest.approx(0.05, rel=1e-6)
+
+
+def test_all_static_mesh():
+    offsets = make_offsets([0.01, 0.0, 0.03])
+    sparse = find_moving_vertices(offsets, 0.1, np.array([[0, 1, 2]]))
+
+    assert len(sparse["moving_vertices"]) == 0
+    np.testing.assert_array_equal(sparse["column_map"], [-1, -1, -1])
+    assert sparse["moving_ratio"] == 0.0
+    assert sparse["max_static_offset"] == pytest.approx(0.03, rel=1e-6)
+
+
+def test_all_moving_mesh():
+    sparse = find_moving_vertices(make_offsets([1.0, 2.0]), 0.1)
+    np.testing.assert_array_equal(sparse["column_map"], [0, 1])
+    assert sparse["max_static_offset"] == 0.0
+
+
+def make_holds_and_moves():
+    """ Two vertices over 21 frames: hold, move, hold, move back, every 5 frames """
+    x = np.interp(np.arange(21), [0, 5, 10, 15, 20], [0.0, 0.0, 5.0, 5.0, 0.0])
+    offsets = np.zeros((21, 2, 3), dtype=np.float32)
+    offsets[:, 0, 0] = x
+    offsets[:, 1, 1] = -x
+    return offsets
+
+
+def reconstruct(rows, frame_remap):
+    """ What the runtime does: blend row floor(r) and the next one by the fraction of r """
+    row = np.floor(frame_remap).astype(np.int64)
+    next_row = np.minimum(row + 1, len(rows) - 1)
+    t = (frame_remap - row)[:, None, None]
+    return rows[row] * (1.0 - t) + rows[next_row] * t
+
+
+def test_key_frames_of_holds_and_moves():
+    offsets = make_holds_and_moves()
+    np.testing.assert_array_equal(find_key_frames(offsets, 0.01), [0, 5, 10, 15, 20])
+
+
+def test_decimated_holds_and_moves():
+    offsets = make_holds_and_moves()
+    compression = decimate_frames(offsets, 0.01)
+
+    np.testing.assert_array_equal(compression["kept_frames"], [0, 5, 10, 15, 20])
+    # Every kept frame lands on its own row, the frames between blend linearly
+    np.testing.assert_allclose(compression["frame_remap"], np.arange(21) / 5.0)
+    assert compression["compression_ratio"] == pytest.approx(21 / 5.0)
+    assert compression["max_error"] == pytest.approx(0.0, abs=1e-6)
+
+    restored = reconstruct(offsets[compression["kept_frames"]], compression["frame_remap"])
+    np.testing.assert_allclose(restored, offsets, atol=1e-6)
+
+
+@pytest.mark.parametrize("tolerance", [0.001, 0.01, 0.1])
+def test_decimated_curve_stays_within_tolerance(tolerance):
+    offsets = make_offsets([1.0, 0.5, 2.0], nr_of_frames=61)
+    compression = decimate_frames(offsets, tolerance)
+    kept_frames = compression["kept_frames"]
+
+    assert kept_frames[0] == 0 and kept_frames[-1] == 60
+    assert 1 < len(kept_frames) < 61
+    np.testing.assert_allclose(compression["frame_remap"][kept_frames], np.arange(len(kept_frames)))
+
+    restored = reconstruct(offsets[kept_frames], compression["frame_remap"])
+    error = np.linalg.norm(restored - offsets, axis=-1).max()
+    assert error <= tolerance + 1e-6
+    assert compression["max_error"] == pytest.approx(error, abs=1e-6)
+
+
+def test_static_offsets_keep_first_and_last_frame():
+    compression = decimate_frames(np.zeros((8, 3, 3), dtype=np.float32), 0.01)
+    np.testing.assert_array_equal(compression["kept_frames"], [0, 7])
+    np.testing.assert_allclose(compression["frame_remap"], np.arange(8) / 7.0)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from Maya_VAT_Exporter import VAT_Exporter as vat
+from Maya_VAT_Exporter.VAT_Backend import SyntheticBackend
+from Maya_VAT_Exporter.VAT_Cache import SampleCache
+from Maya_VAT_Exporter.VAT_Stream import stream_dat_texture
+
+MESHES = {"cloth": 12, "flag": 6}
+
+
+def test_prepare_export(tmp_path):
+    backend = SyntheticBackend(MESHES, playback_range=(2, 7))
+    output_dir = str(tmp_path / "new")
+    setup = vat.prepare_export(output_dir, list(MESHES), backend, atlas=True, max_width=8)
+
+    assert (tmp_path / "new").is_dir()
+    assert setup["frame_range"] == [2, 3, 4, 5, 6, 7]
+    assert setup["time_min"] == 2
+    assert setup["layout_mode"] == "wrap"
+    assert setup["context"].nr_of_vtx == 18
+    # The bind frame is the rest pose
+    backend.set_frame(0)
+    expected = np.concatenate([backend.get_points(mesh) for mesh in MESHES])
+    np.testing.assert_array_equal(setup["base_positions"], expected)
+
+
+def test_prepare_export_reads_the_rest_frame_through_the_cache(tmp_path):
+    cache = SampleCache(str(tmp_path / "cache"))
+    setup = vat.prepare_export(str(tmp_path), ["cloth"], SyntheticBackend(MESHES), cache=cache,
+                               rest_source="frame", rest_frame=5, frame_range=(0, 3))
+    key = vat.get_cache_keys(setup["context"], cache)["cloth"]
+
+    points, _ = cache.get(key, 5)
+    np.testing.assert_array_equal(setup["base_positions"], points)
+
+
+def test_prepare_export_needs_meshes(tmp_path):
+    backend = SyntheticBackend(MESHES)
+    with pytest.raises(RuntimeError, match="select a mesh"):
+        vat.prepare_export(str(tmp_path), [], backend)
+    with pytest.raises(RuntimeError, match="atlas"):
+        vat.prepare_export(str(tmp_path), list(MESHES), backend)
+
+
+@pytest.mark.parametrize("mode", ["direct", "two_phase"])
+def test_stream_matches_in_memory_export(tmp_path, mode):
+    pytest.importorskip("OpenEXR")
+    from Maya_VAT_Exporter.VAT_Validate import ExrRowReader
+
+    def read_positions(path):
+        reader = ExrRowReader(path)
+        rows = reader.read_rows(0, reader.height)
+        reader.close()
+        return rows
+
+    options = dict(mesh_list=list(MESHES), atlas=True, max_width=8, frame_range=(0, 9))
+    paths = vat.make_dat_texture(str(tmp_path), "memory", backend=SyntheticBackend(MESHES), **options)
+    streamed = stream_dat_texture(str(tmp_path), "stream", backend=SyntheticBackend(MESHES), mode=mode,
+                                  block_frames=3, **options)
+
+    np.testing.assert_allclose(read_positions(streamed["position"]), read_positions(paths["position"]), atol=1e-6)
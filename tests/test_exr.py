@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+import pytest
+
+from Maya_VAT_Exporter.VAT_Exporter import save_exr
+from Maya_VAT_Exporter.VAT_Stream import ExrStreamWriter
+
+OpenEXR = pytest.importorskip("OpenEXR")
+
+METADATA = {"encoding": "float32", "frame_count": 3, "position_min": [-1.5, 0.0, 2.25]}
+
+
+def read_metadata(path):
+    value = OpenEXR.InputFile(path).header()["vatMetadata"]
+    if isinstance(value, bytes):
+        value = value.decode("utf-8")
+    return json.loads(value)
+
+
+def make_buffer():
+    return np.arange(3 * 5 * 4, dtype=np.float32).reshape(3, 5, 4)
+
+
+def test_metadata_of_the_file_api(tmp_path):
+    if not hasattr(OpenEXR, "File"):
+        pytest.skip("OpenEXR 3.x bindings only")
+    path = str(tmp_path / "new.exr")
+    save_exr(make_buffer(), path, METADATA)
+    assert read_metadata(path) == METADATA
+
+
+def test_metadata_of_the_legacy_api(tmp_path, monkeypatch):
+    # The OpenEXR 3.x bindings still have the legacy API, hide the new one
+    monkeypatch.delattr(OpenEXR, "File", raising=False)
+    path = str(tmp_path / "legacy.exr")
+    save_exr(make_buffer(), path, METADATA)
+    assert read_metadata(path) == METADATA
+
+
+def test_metadata_of_the_stream_writer(tmp_path):
+    path = str(tmp_path / "stream.exr")
+    writer = ExrStreamWriter(path, 5, 3, metadata=METADATA)
+    writer.write_rows(make_buffer())
+    writer.close()
+    assert read_metadata(path) == METADATA
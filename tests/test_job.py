@@ -0,0 +1,77 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from Maya_VAT_Exporter import VAT_Exporter as vat
+from Maya_VAT_Exporter.VAT_Backend import SyntheticBackend
+from Maya_VAT_Exporter.VAT_Job import CANCELLED, ExportJob
+
+
+class GatedExecutor(ThreadPoolExecutor):
+    """ Runs submitted work only once the gate is opened """
+    def __init__(self):
+        super(GatedExecutor, self).__init__(max_workers=1)
+        self.gate = threading.Event()
+        self.futures = []
+
+    def submit(self, fn, *args, **kwargs):
+        def gated():
+            self.gate.wait()
+            return fn(*args, **kwargs)
+        future = super(GatedExecutor, self).submit(gated)
+        self.futures.append(future)
+        return future
+
+
+def start_export(tmp_path, executor):
+    backend = SyntheticBackend({"cloth": 25}, playback_range=(0, 5))
+    export = vat.iter_export(str(tmp_path), "cloth", mesh_list=["cloth"], backend=backend, executor=executor)
+    job = ExportJob(export)
+    while job.stage != "write":
+        assert job.step(None)
+    # Let the worker reach the write
+    job.step(None)
+    return job
+
+
+def test_cancel_while_writing_removes_the_files(tmp_path):
+    pytest.importorskip("OpenEXR")
+    executor = GatedExecutor()
+    try:
+        job = start_export(tmp_path, executor)
+        # The write gets to finish while the job waits for it
+        threading.Timer(0.05, executor.gate.set).start()
+        job.cancel()
+
+        assert job.status == CANCELLED
+        assert all(future.done() for future in executor.futures)
+        assert os.listdir(str(tmp_path)) == []
+    finally:
+        executor.gate.set()
+        executor.shutdown()
+
+
+def test_cancel_before_the_write_started(tmp_path):
+    executor = GatedExecutor()
+    executor.submit(lambda: None)
+    try:
+        # The worker is busy, the write is still queued and never runs
+        job = start_export(tmp_path, executor)
+        job.cancel()
+
+        assert executor.futures[-1].cancelled()
+        assert os.listdir(str(tmp_path)) == []
+    finally:
+        executor.gate.set()
+        executor.shutdown()
+
+
+def test_remove_textures_only_touches_its_own_files(tmp_path):
+    for name in ("cloth_position.png", "cloth_normal.png", "cloth_vat.json", "cloth_columns.bin", "other_vat.json"):
+        (tmp_path / name).write_text("")
+    removed = vat.remove_textures(str(tmp_path), "cloth", "uint16")
+
+    assert len(removed) == 4
+    assert os.listdir(str(tmp_path)) == ["other_vat.json"]
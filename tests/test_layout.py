@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from Maya_VAT_Exporter.VAT_Layout import compute_layout, get_texel, get_uv, make_texture
+
+
+def test_raw_is_one_row_per_frame():
+    layout = compute_layout(300, 24, "raw")
+    assert (layout["width"], layout["height"], layout["rows_per_frame"]) == (300, 24, 1)
+
+
+def test_pow2_pads_both_sides():
+    layout = compute_layout(300, 24, "pow2")
+    assert (layout["width"], layout["height"], layout["rows_per_frame"]) == (512, 32, 1)
+    # Already a power of two stays as it is
+    layout = compute_layout(256, 16, "pow2")
+    assert (layout["width"], layout["height"]) == (256, 16)
+
+
+def test_wrap_splits_long_frame_rows():
+    layout = compute_layout(10000, 24, "wrap", max_width=4096)
+    assert layout["width"] == 4096
+    assert layout["rows_per_frame"] == 3
+    assert layout["height"] == 24 * 3
+
+
+def test_wrap_keeps_short_rows():
+    layout = compute_layout(1000, 24, "wrap", max_width=4096)
+    assert (layout["width"], layout["height"], layout["rows_per_frame"]) == (1000, 24, 1)
+
+
+@pytest.mark.parametrize("mode", ["raw", "pow2"])
+def test_too_wide_needs_wrap(mode):
+    with pytest.raises(ValueError, match="wrap"):
+        compute_layout(5000, 10, mode, max_width=4096)
+
+
+def test_invalid_layouts():
+    with pytest.raises(ValueError):
+        compute_layout(10, 10, "spiral")
+    with pytest.raises(ValueError):
+        compute_layout(0, 10)
+    with pytest.raises(ValueError):
+        compute_layout(10, 0)
+
+
+def test_texel_size_and_frame_step():
+    layout = compute_layout(10000, 24, "wrap", max_width=4096)
+    assert layout["texel_size"] == [1.0 / 4096, 1.0 / 72]
+    assert layout["frame_v_step"] == pytest.approx(3.0 / 72)
+
+    layout = compute_layout(300, 24, "pow2")
+    assert layout["texel_size"] == [1.0 / 512, 1.0 / 32]
+    assert layout["frame_v_step"] == pytest.approx(1.0 / 32)
+
+
+def test_texel_of_wrapped_vertex():
+    layout = compute_layout(10000, 24, "wrap", max_width=4096)
+    assert get_texel(5000, 2, layout["width"], layout["rows_per_frame"]) == (5000 - 4096, 2 * 3 + 1)
+    u, v = get_uv(0, 0, layout)
+    assert (u, v) == (0.5 / 4096, 0.5 / 72)
+
+
+@pytest.mark.parametrize("mode", ["raw", "pow2", "wrap"])
+def test_texture_view_shares_memory(mode):
+    layout = compute_layout(300, 5, mode, max_width=128 if mode == "wrap" else None)
+    texture, view = make_texture(layout, 4, np.float32)
+
+    assert texture.shape == (layout["height"], layout["width"], 4)
+    assert view.shape == (5, 300, 4)
+    assert np.shares_memory(texture, view)
+
+    view[...] = 1.0
+    # Every vertex lands on its texel, all other texels stay padding
+    for frame, vertex in [(0, 0), (2, 150), (4, 299)]:
+        x, y = get_texel(vertex, frame, layout["width"], layout["rows_per_frame"])
+        texture[y, x] = 2.0
+        assert view[frame, vertex, 0] == 2.0
+    assert texture.sum() == view.sum()
+    assert np.count_nonzero(texture[..., 0]) == 5 * 300
+
+
+def test_texture_dtype_and_channels():
+    layout = compute_layout(10, 3)
+    texture, view = make_texture(layout, 3, np.uint16)
+    assert texture.dtype == np.uint16
+    assert view.shape == (3, 10, 3)
@@ -0,0 +1,87 @@
+import numpy as np
+
+from Maya_VAT_Exporter.VAT_Backend import SyntheticBackend, make_grid_triangles
+from Maya_VAT_Exporter.VAT_Exporter import compute_vertex_normals, sample_frames
+
+
+def make_grid(side):
+    idx = np.arange(side * side)
+    points = np.zeros((side * side, 3), dtype=np.float64)
+    points[:, 0] = idx % side
+    points[:, 2] = idx // side
+    return points, make_grid_triangles(side * side, side)
+
+
+def get_inner_vertices(side):
+    # Border vertices only see half of their neighbourhood
+    x, z = np.meshgrid(np.arange(1, side - 1), np.arange(1, side - 1))
+    return (z * side + x).ravel()
+
+
+def test_flat_grid_points_up():
+    points, triangles = make_grid(4)
+    np.testing.assert_allclose(compute_vertex_normals(points, triangles), [[0.0, 1.0, 0.0]] * 16, atol=1e-12)
+
+    # Flipping the winding flips the normals
+    normals = compute_vertex_normals(points, triangles[:, ::-1])
+    np.testing.assert_allclose(normals, [[0.0, -1.0, 0.0]] * 16, atol=1e-12)
+
+
+def test_area_weighting():
+    # A big and a small triangle at right angles share the edge 0-1
+    points = np.array([[0, 0, 0], [1, 0, 0], [0, 0, 10], [0, 1, 0]], dtype=np.float64)
+    triangles = np.array([[0, 2, 1], [0, 1, 3]])
+    normals = compute_vertex_normals(points, triangles)
+
+    expected = np.array([0.0, 10.0, 1.0]) / np.sqrt(101.0)
+    np.testing.assert_allclose(normals[0], expected, atol=1e-12)
+    np.testing.assert_allclose(normals[1], expected, atol=1e-12)
+    np.testing.assert_allclose(np.linalg.norm(normals, axis=-1), 1.0)
+
+
+def test_vertices_without_faces_fall_back_to_z():
+    points, triangles = make_grid(3)
+    # Vertex 9 belongs to no triangle, triangle 0-0-1 has no area
+    points = np.vstack([points, [[5.0, 5.0, 5.0]]])
+    triangles = np.vstack([triangles, [[0, 0, 1]]])
+    normals = compute_vertex_normals(points, triangles)
+
+    np.testing.assert_array_equal(normals[9], [0.0, 0.0, 1.0])
+    np.testing.assert_allclose(normals[0], [0.0, 1.0, 0.0], atol=1e-12)
+
+
+def test_frames_axis():
+    points, triangles = make_grid(3)
+    flipped = points[:, [0, 2, 1]]
+    normals = compute_vertex_normals(np.stack([points, flipped]), triangles)
+
+    assert normals.shape == (2, 9, 3)
+    np.testing.assert_allclose(normals[0], compute_vertex_normals(points, triangles))
+    np.testing.assert_allclose(normals[1], compute_vertex_normals(flipped, triangles))
+
+
+def test_matches_synthetic_ripple():
+    side = 20
+    backend = SyntheticBackend({"grid": side * side})
+    backend.set_frame(5)
+    normals = compute_vertex_normals(backend.get_points("grid"), backend.get_triangles("grid"))
+    analytic = backend.get_normals("grid")
+
+    inner = get_inner_vertices(side)
+    cosines = np.sum(normals[inner] * analytic[inner], axis=-1)
+    assert cosines.min() > 0.999
+
+
+def test_computed_source_matches_mesh_source():
+    side = 12
+    backend = SyntheticBackend({"a": side * side, "b": side * side})
+    frames = [0, 3, 7]
+    positions, mesh_normals = sample_frames(["a", "b"], frames, backend=backend, normal_source="mesh")
+    computed_positions, computed_normals = sample_frames(["a", "b"], frames, backend=backend,
+                                                         normal_source="computed")
+
+    np.testing.assert_array_equal(computed_positions, positions)
+    inner = get_inner_vertices(side)
+    inner = np.concatenate([inner, inner + side * side])
+    cosines = np.sum(computed_normals[:, inner] * mesh_normals[:, inner], axis=-1)
+    assert cosines.min() > 0.99
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from Maya_VAT_Exporter.VAT_Backend import SyntheticBackend
+from Maya_VAT_Exporter.VAT_Exporter import sample_frames
+from Maya_VAT_Exporter.VAT_Parallel import ParallelSampling, get_preroll_frames, sample_chunk, split_frame_range
+
+# A simulation: every frame depends on the frames evaluated before it
+SCENE = {"vertex_counts": {"cloth": 16}, "playback_range": [0, 29], "lag": 0.5}
+FRAMES = list(range(30))
+
+
+class EditedBackend(SyntheticBackend):
+    """ A saved scene with edits that are not saved yet """
+    def is_scene_modified(self):
+        return True
+
+
+def test_unsaved_changes_are_refused(tmp_path):
+    backend = EditedBackend({"cloth": 9})
+    backend.open_scene(str(tmp_path / "shot.ma"))
+    parallel = ParallelSampling(workers=2, backend_name="synthetic")
+
+    with pytest.raises(RuntimeError, match="unsaved"):
+        parallel.sample_frames(["cloth"], range(4), backend=backend)
+
+
+def test_unsaved_scene_is_refused():
+    with pytest.raises(RuntimeError, match="save the scene"):
+        ParallelSampling().sample_frames(["cloth"], range(4), backend=SyntheticBackend({"cloth": 9}))
+
+
+def test_chunks_cover_the_range_in_order():
+    chunks = split_frame_range(10, 3)
+    assert chunks[0][0] == 0 and chunks[-1][1] == 10
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    assert split_frame_range(2, 5) == [(0, 1), (1, 2)]
+
+
+def sample_in_chunks(tmp_path, nr_of_chunks, preroll):
+    """ Samples every chunk like a worker would, each with a fresh backend """
+    shape = (len(FRAMES), 16, 3)
+    paths = {name: str(tmp_path / (name + ".npy")) for name in ("positions", "normals", "progress")}
+    np.lib.format.open_memmap(paths["positions"], "w+", np.float32, shape)
+    np.lib.format.open_memmap(paths["normals"], "w+", np.float32, shape)
+    np.lib.format.open_memmap(paths["progress"], "w+", np.int32, (nr_of_chunks,))
+
+    chunks = split_frame_range(len(FRAMES), nr_of_chunks)
+    for index, (row_start, row_end) in enumerate(chunks):
+        job = dict(paths, scene="shot.ma", meshes=["cloth"], frames=FRAMES[row_start:row_end],
+                   preroll_frames=get_preroll_frames(FRAMES, row_start, preroll), row_start=row_start,
+                   chunk_index=index, base_positions=None, normal_source="mesh")
+        sample_chunk(job, backend=SyntheticBackend(**SCENE))
+
+    progress = np.load(paths["progress"])
+    assert progress.tolist() == [end - start for start, end in chunks]
+    return np.load(paths["positions"])
+
+
+def test_preroll_makes_chunks_match_serial_sampling(tmp_path):
+    serial, _ = sample_frames(["cloth"], FRAMES, backend=SyntheticBackend(**SCENE))
+
+    stitched = sample_in_chunks(tmp_path, 3, preroll=24)
+    np.testing.assert_allclose(stitched, serial, atol=1e-5)
+
+    # Without pre-roll every chunk but the first starts cold
+    (tmp_path / "cold").mkdir()
+    cold = sample_in_chunks(tmp_path / "cold", 3, preroll=0)
+    np.testing.assert_allclose(cold[:10], serial[:10], atol=1e-5)
+    assert np.abs(cold[10] - serial[10]).max() > 0.01
+
+
+def test_workers_match_serial_sampling(worker_pythonpath):
+    serial, serial_normals = sample_frames(["cloth"], FRAMES, backend=SyntheticBackend(**SCENE))
+
+    backend = SyntheticBackend(**SCENE)
+    backend.open_scene("shot.ma")
+    parallel = ParallelSampling(workers=3, preroll=24, executable=sys.executable, backend_name="synthetic",
+                                backend_options=SCENE, timeout=60)
+    positions, normals = parallel.sample_frames(["cloth"], FRAMES, backend=backend)
+
+    np.testing.assert_allclose(positions, serial, atol=1e-5)
+    np.testing.assert_allclose(normals, serial_normals, atol=1e-5)
+
+
+def test_cancel_kills_the_workers(tmp_path):
+    if sys.platform.startswith("win"):
+        pytest.skip("Uses a shell script as the worker")
+    sleeper = tmp_path / "sleeper"
+    sleeper.write_text("#!/bin/sh\nexec sleep 60\n")
+    os.chmod(str(sleeper), 0o755)
+
+    backend = SyntheticBackend(**SCENE)
+    backend.open_scene(str(tmp_path / "shot.ma"))
+    parallel = ParallelSampling(workers=2, executable=str(sleeper), backend_name="synthetic",
+                                scratch_dir=str(tmp_path))
+    sampler = parallel.iter_sample_frames(["cloth"], FRAMES, backend=backend)
+    next(sampler)
+    next(sampler)
+
+    start_time = time.time()
+    sampler.close()
+    assert time.time() - start_time < 10
+    # The scratch folder is gone too
+    assert [name for name in os.listdir(str(tmp_path)) if name.startswith("vat_parallel_")] == []
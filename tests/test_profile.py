@@ -0,0 +1,46 @@
+import pytest
+
+from Maya_VAT_Exporter.VAT_Backend import SyntheticBackend
+from Maya_VAT_Exporter.VAT_Exporter import make_dat_texture
+from Maya_VAT_Exporter.VAT_Profile import ExportProfile
+from Maya_VAT_Exporter.VAT_Rigid import make_rigid_texture
+from Maya_VAT_Exporter.VAT_Stream import stream_dat_texture
+
+EXPORTS = {
+    "full": (make_dat_texture, False),
+    "stream": (stream_dat_texture, False),
+    "rigid": (make_rigid_texture, True),
+}
+
+
+def run_export(name, tmp_path, **kwargs):
+    export, rigid = EXPORTS[name]
+    backend = SyntheticBackend({"body": 16}, playback_range=(0, 7), rigid=rigid)
+    return export(output_dir=str(tmp_path), base_filename=name, mesh_list=["body"], backend=backend,
+                  **kwargs)
+
+
+@pytest.mark.parametrize("name", sorted(EXPORTS))
+def test_exports_print_a_summary_without_a_profile(tmp_path, capsys, name):
+    run_export(name, tmp_path)
+    out = capsys.readouterr().out
+
+    assert "It'sa done" not in out
+    summary = [line for line in out.splitlines() if line.startswith("Export took")]
+    assert len(summary) == 1
+    assert "backend calls" in summary[0] and " 0 backend calls" not in summary[0]
+
+
+@pytest.mark.parametrize("name", sorted(EXPORTS))
+def test_exports_record_stages_in_the_profile(tmp_path, name):
+    profile = ExportProfile(trace_memory=False)
+    paths = run_export(name, tmp_path, profile=profile)
+    report = profile.get_report()
+
+    stages = [stage["name"] for stage in report["stages"]]
+    assert stages[0] == "prepare" and "sample" in stages and stages[-1] == "write"
+    assert report["total_seconds"] >= sum(stage["seconds"] for stage in report["stages"]) > 0.0
+    assert report["backend_calls"]["set_frame"] >= 8
+    # The written files are counted to the write stage
+    assert report["stages"][-1]["bytes"] >= sum(
+        len(open(path, "rb").read()) for path in paths.values() if isinstance(path, str))
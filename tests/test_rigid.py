@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+from Maya_VAT_Exporter.VAT_Backend import SyntheticBackend
+from Maya_VAT_Exporter.VAT_Mesh import MeshContext
+from Maya_VAT_Exporter.VAT_Rigid import (find_shells, fit_rigid_transforms, get_matrix_transforms,
+                                         get_piece_centroids, get_piece_ids, make_rigid_texture)
+
+MESHES = {"door": 16, "wheel": 9}
+
+
+def test_synthetic_points_follow_the_world_matrices():
+    backend = SyntheticBackend(MESHES, rigid=True)
+    backend.set_frame(7)
+    matrix = backend.get_world_matrices(["wheel"])[0]
+
+    rest = backend.get_rest_points("wheel")
+    np.testing.assert_allclose(backend.get_points("wheel"), rest @ matrix[:3, :3] + matrix[3, :3])
+    # Without rigid the grids deform in place
+    np.testing.assert_array_equal(SyntheticBackend(MESHES).get_world_matrices(["door", "wheel"]),
+                                  np.tile(np.eye(4), (2, 1, 1)))
+
+
+def test_matrices_and_fit_agree():
+    backend = SyntheticBackend(MESHES, rigid=True)
+    context = MeshContext(list(MESHES), backend)
+    rest_points = context.get_rest_points()
+    piece_ids = get_piece_ids(context, "meshes")
+    rest_pivots = get_piece_centroids(rest_points, piece_ids, 2)
+    backend.set_frame(0)
+    rest_matrices = backend.get_world_matrices(context.shapes)
+
+    for frame in (3, 11, 20):
+        backend.set_frame(frame)
+        points = np.concatenate([backend.get_points(shape) for shape in context.shapes])
+        fit_rotations, fit_pivots = fit_rigid_transforms(rest_points, points, piece_ids, rest_pivots)
+        rotations, pivots = get_matrix_transforms(rest_matrices, backend.get_world_matrices(context.shapes),
+                                                  rest_pivots)
+        np.testing.assert_allclose(rotations, fit_rotations, atol=1e-9)
+        np.testing.assert_allclose(pivots, fit_pivots, atol=1e-9)
+
+
+def test_shells_of_separate_grids():
+    backend = SyntheticBackend({"a": 9})
+    triangles = backend.get_triangles("a")
+    shells = find_shells(18, np.concatenate([triangles, triangles + 9]))
+    np.testing.assert_array_equal(shells, [0] * 9 + [1] * 9)
+
+
+def test_transforms_export_matches_fitted_export(tmp_path):
+    pytest.importorskip("OpenEXR")
+    from Maya_VAT_Exporter.VAT_Validate import ExrRowReader
+
+    textures = {}
+    for piece_source in ("transforms", "meshes"):
+        backend = SyntheticBackend(MESHES, playback_range=(0, 12), rigid=True)
+        paths = make_rigid_texture(str(tmp_path), piece_source, mesh_list=list(MESHES), backend=backend,
+                                   piece_source=piece_source)
+        with open(paths["metadata"]) as f:
+            metadata = json.load(f)
+        assert metadata["piece_count"] == 2
+        for name in ("pivot", "rotation"):
+            reader = ExrRowReader(paths[name])
+            textures[piece_source, name] = reader.read_rows(0, metadata["layout"]["height"])
+            reader.close()
+        if piece_source == "meshes":
+            assert metadata["max_fit_error"] < 1e-5
+
+    np.testing.assert_allclose(textures["transforms", "pivot"], textures["meshes", "pivot"], atol=1e-5)
+    # q and -q are the same rotation
+    dots = np.abs(np.sum(textures["transforms", "rotation"] * textures["meshes", "rotation"], axis=-1))
+    np.testing.assert_allclose(dots, 1.0, atol=1e-5)
@@ -0,0 +1,105 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from Maya_VAT_Exporter import VAT_Backend
+from Maya_VAT_Exporter import VAT_Exporter as vat
+
+MESHES = {"|body|bodyShape": 5, "|prop|propShape": 3}
+
+
+class FakeCmds(object):
+    """ Records every call, points move by the current frame along x """
+    def __init__(self, meshes):
+        self.meshes = meshes
+        self.frame = 0
+        self.calls = []
+
+    def listRelatives(self, node, **kwargs):
+        self.calls.append(("listRelatives", node))
+        return [node]
+
+    def polyEvaluate(self, mesh, vertex=False):
+        self.calls.append(("polyEvaluate", mesh))
+        return self.meshes[mesh]
+
+    def currentTime(self, frame):
+        self.calls.append(("currentTime", frame))
+        self.frame = frame
+
+    def xform(self, query, **kwargs):
+        mesh = query.split(".vtx")[0]
+        self.calls.append(("xform", mesh))
+        points = get_rest_points(self.meshes[mesh])
+        points[:, 0] += self.frame
+        return points.ravel().tolist()
+
+    def count(self, name):
+        return sum(1 for call in self.calls if call[0] == name)
+
+
+class FakeMFnMesh(object):
+    def __init__(self, count):
+        self.count = count
+
+    def getVertexNormals(self, angle_weighted, space):
+        return [(0.0, 1.0, 0.0)] * self.count
+
+
+def get_rest_points(count):
+    points = np.zeros((count, 3), dtype=np.float64)
+    points[:, 1] = np.arange(count)
+    return points
+
+
+@pytest.fixture
+def fake_cmds(monkeypatch):
+    cmds = FakeCmds(MESHES)
+    maya = types.ModuleType("maya")
+    maya.cmds = cmds
+    monkeypatch.setitem(sys.modules, "maya", maya)
+    monkeypatch.setitem(sys.modules, "maya.cmds", cmds)
+    # The backend imported maya.cmds when it was loaded, point it at the fake too
+    monkeypatch.setattr(VAT_Backend, "cmds", cmds)
+    monkeypatch.setattr(VAT_Backend, "om", types.SimpleNamespace(MSpace=types.SimpleNamespace(kWorld=4)))
+    monkeypatch.setattr(VAT_Backend, "get_mfn_mesh", lambda mesh: FakeMFnMesh(MESHES[mesh]))
+    return cmds
+
+
+def test_every_frame_is_set_once(fake_cmds):
+    frames = [3, 4, 5, 6, 7, 8]
+    vat.sample_frames(list(MESHES), frames, backend=VAT_Backend.MayaBackend())
+
+    set_frames = [call[1] for call in fake_cmds.calls if call[0] == "currentTime"]
+    assert set_frames == frames
+
+
+def test_every_mesh_is_read_once_per_frame(fake_cmds):
+    frames = list(range(4))
+    vat.sample_frames(list(MESHES), frames, backend=VAT_Backend.MayaBackend())
+
+    assert fake_cmds.count("xform") == len(frames) * len(MESHES)
+    # Vertex counts are static and asked for once per mesh
+    assert fake_cmds.count("polyEvaluate") == len(MESHES)
+
+
+def test_samples_go_to_their_frame_and_mesh(fake_cmds):
+    frames = [10, 11, 12]
+    positions, normals = vat.sample_frames(list(MESHES), frames, backend=VAT_Backend.MayaBackend())
+
+    assert positions.shape == (3, sum(MESHES.values()), 3)
+    expected = np.concatenate([get_rest_points(count) for count in MESHES.values()])
+    for i, frame in enumerate(frames):
+        np.testing.assert_array_equal(positions[i, :, 0], frame)
+        np.testing.assert_array_equal(positions[i, :, 1], expected[:, 1])
+    np.testing.assert_array_equal(normals[..., 1], 1.0)
+
+
+def test_offsets_from_base_positions(fake_cmds):
+    base = np.concatenate([get_rest_points(count) for count in MESHES.values()])
+    offsets, _ = vat.sample_frames(list(MESHES), [2, 5], backend=VAT_Backend.MayaBackend(), base_positions=base)
+
+    np.testing.assert_array_equal(offsets[0], [[2.0, 0.0, 0.0]] * len(base))
+    np.testing.assert_array_equal(offsets[1], [[5.0, 0.0, 0.0]] * len(base))
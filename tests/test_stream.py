@@ -0,0 +1,112 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from Maya_VAT_Exporter import VAT_Stream
+from Maya_VAT_Exporter.VAT_Backend import SyntheticBackend
+from Maya_VAT_Exporter.VAT_Cache import SampleCache
+from Maya_VAT_Exporter.VAT_Job import CANCELLED, ExportJob
+from Maya_VAT_Exporter.VAT_Stream import iter_stream_export, stream_dat_texture
+
+MESHES = {"cloth": 40}
+
+
+@pytest.fixture(autouse=True)
+def needs_openexr():
+    pytest.importorskip("OpenEXR")
+
+
+class BrokenBackend(SyntheticBackend):
+    """ The rig stops evaluating at one frame """
+    def __init__(self, vertex_counts, broken_frame, **kwargs):
+        super(BrokenBackend, self).__init__(vertex_counts, **kwargs)
+        self.broken_frame = broken_frame
+
+    def get_points(self, mesh):
+        if self.frame == self.broken_frame:
+            raise RuntimeError(f"Evaluation failed at frame {self.frame}")
+        return super(BrokenBackend, self).get_points(mesh)
+
+
+@pytest.mark.parametrize("mode", ["direct", "two_phase"])
+def test_failed_stream_leaves_no_files(tmp_path, mode):
+    backend = BrokenBackend(MESHES, 40, playback_range=(0, 99))
+    with pytest.raises(RuntimeError, match="frame 40"):
+        stream_dat_texture(str(tmp_path), "cloth", mesh_list=["cloth"], backend=backend, mode=mode, block_frames=8)
+    assert os.listdir(str(tmp_path)) == []
+
+
+@pytest.mark.parametrize("mode, stage", [("direct", "sample"), ("two_phase", "sample"), ("two_phase", "write")])
+def test_cancelled_stream_leaves_no_files(tmp_path, mode, stage):
+    backend = SyntheticBackend(MESHES, playback_range=(0, 99))
+    job = ExportJob(iter_stream_export(str(tmp_path), "cloth", mesh_list=["cloth"], backend=backend,
+                                       mode=mode, block_frames=8))
+    while job.stage != stage or job.progress.stage_fraction < 0.3:
+        assert job.step(None)
+    job.cancel()
+
+    assert job.status == CANCELLED
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_finished_stream_is_padded(tmp_path):
+    from Maya_VAT_Exporter.VAT_Validate import ExrRowReader
+
+    backend = SyntheticBackend(MESHES, playback_range=(0, 9))
+    paths = stream_dat_texture(str(tmp_path), "cloth", mesh_list=["cloth"], backend=backend,
+                               layout_mode="pow2", block_frames=3)
+    reader = ExrRowReader(paths["position"])
+    assert (reader.width, reader.height) == (64, 16)
+    assert reader.read_rows(10, 16).max() == 0.0
+    reader.close()
+
+
+def test_scratch_goes_next_to_the_output(tmp_path, monkeypatch):
+    scratch_dirs = []
+    mkdtemp = VAT_Stream.tempfile.mkdtemp
+    monkeypatch.setattr(VAT_Stream.tempfile, "mkdtemp",
+                        lambda prefix, dir=None: scratch_dirs.append(dir) or mkdtemp(prefix=prefix, dir=dir))
+    backend = SyntheticBackend(MESHES, playback_range=(0, 4))
+    stream_dat_texture(str(tmp_path / "out"), "cloth", mesh_list=["cloth"], backend=backend, mode="two_phase")
+    cache = SampleCache(str(tmp_path / "cache"))
+    stream_dat_texture(str(tmp_path / "out"), "cloth", mesh_list=["cloth"], backend=backend, mode="two_phase",
+                       cache=cache)
+
+    assert scratch_dirs == [str(tmp_path / "out"), str(tmp_path / "cache")]
+    assert sorted(os.listdir(str(tmp_path / "out"))) == ["cloth_normal.exr", "cloth_position.exr", "cloth_vat.json"]
+
+
+MEMORY_SCRIPT = """
+import io, sys, contextlib, resource, importlib.util
+root, output_dir, nr_of_frames = sys.argv[1], sys.argv[2], int(sys.argv[3])
+spec = importlib.util.spec_from_file_location("Maya_VAT_Exporter", root + "/__init__.py",
+                                              submodule_search_locations=[root])
+package = importlib.util.module_from_spec(spec)
+sys.modules["Maya_VAT_Exporter"] = package
+spec.loader.exec_module(package)
+from Maya_VAT_Exporter.VAT_Backend import SyntheticBackend
+from Maya_VAT_Exporter.VAT_Stream import stream_dat_texture
+backend = SyntheticBackend({"cloth": 10000}, playback_range=(0, nr_of_frames - 1))
+with contextlib.redirect_stdout(io.StringIO()):
+    stream_dat_texture(output_dir, "cloth", mesh_list=["cloth"], backend=backend, mode="two_phase")
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def get_peak_kilobytes(tmp_path, nr_of_frames):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output_dir = str(tmp_path / str(nr_of_frames))
+    completed = subprocess.run([sys.executable, "-c", MEMORY_SCRIPT, root, output_dir, str(nr_of_frames)],
+                               capture_output=True, text=True, check=True)
+    return int(completed.stdout.split()[-1])
+
+
+def test_two_phase_memory_does_not_grow_with_frames(tmp_path):
+    pytest.importorskip("resource")
+    if not sys.platform.startswith("linux"):
+        pytest.skip("ru_maxrss is in kilobytes on Linux only")
+    # 8x the frames: the samples alone would be 84 MB more if they stayed in memory
+    growth = get_peak_kilobytes(tmp_path, 800) - get_peak_kilobytes(tmp_path, 100)
+    assert growth < 20 * 1024